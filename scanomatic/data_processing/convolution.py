@@ -5,6 +5,7 @@ from collections.abc import Callable
 
 import numpy as np
 import numpy.typing as npt
+from numpy.lib.stride_tricks import sliding_window_view
 from scipy.stats import norm  # type: ignore
 
 
@@ -17,6 +18,12 @@ class EdgeCondition(Enum):
 
 FilterArray = npt.NDArray[np.bool_]
 
+_PAD_MODES = {
+    EdgeCondition.Reflect: 'reflect',
+    EdgeCondition.Symmetric: 'symmetric',
+    EdgeCondition.Nearest: 'edge',
+}
+
 
 def edge_condition(
     arr: np.ndarray,
@@ -128,6 +135,59 @@ def merge_convolve(
     ))
 
 
+def get_time_based_gaussian_weighted_means(
+    data: np.ndarray,
+    times: np.ndarray,
+    sigma: float = 1,
+    edge_condition_mode: EdgeCondition = EdgeCondition.Reflect,
+    kernel_size: int = 5,
+) -> np.ndarray:
+    """Time based gaussian weighted means along the last axis of data
+
+    Same as `merge_convolve` with `time_based_gaussian_weighted_mean`
+    for every curve of data, but for all curves at once.
+
+    Args:
+        data: The curves, time along the last axis
+        times: The times of the curves
+        sigma: Width of the gaussian, in the unit of times
+        edge_condition_mode: How curves are extended at the edges
+        kernel_size: Number of values in each mean, must be odd
+
+    Returns:
+        The means, NaN where the value itself isn't finite. With
+        `EdgeCondition.Valid` the edges are left out.
+    """
+    if not kernel_size % 2 == 1:
+        raise ValueError("Only odd-size kernels supported")
+
+    origin = (kernel_size - 1) // 2
+    if edge_condition_mode is not EdgeCondition.Valid:
+        pad_mode = _PAD_MODES[edge_condition_mode]
+        data = np.pad(
+            data,
+            [(0, 0)] * (data.ndim - 1) + [(origin, origin)],
+            mode=pad_mode,
+        )
+        times = np.pad(times, origin, mode=pad_mode)
+
+    times_windows = sliding_window_view(times, kernel_size)
+    kernels = norm.pdf(
+        np.abs(times_windows - times_windows[:, origin, None]),
+        loc=0,
+        scale=sigma,
+    )
+    data_windows = sliding_window_view(data, kernel_size, axis=-1)
+    finite = np.isfinite(data_windows)
+    weights = np.where(finite, kernels, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = (
+            np.where(finite, data_windows, 0) * weights
+        ).sum(axis=-1) / weights.sum(axis=-1)
+    means[~finite[..., origin]] = np.nan
+    return means
+
+
 def get_edge_condition_timed_filter(
     times: np.ndarray,
     half_window: float,
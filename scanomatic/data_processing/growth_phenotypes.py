@@ -1,42 +1,94 @@
 from collections.abc import Sequence
 from enum import Enum
-from typing import Any
+from typing import Any, Optional
 
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from scipy.optimize import leastsq  # type: ignore
-from scipy.stats import linregress  # type: ignore
 
 from scanomatic.io.logger import get_logger
 
 _logger = get_logger("Growth Phenotypes")
 
 
-def _linreg_helper(X, Y):
-    return linregress(X, Y)[0::4]
+def _center_windows(
+    values: np.ndarray,
+    filters: np.ndarray,
+    count: np.ndarray,
+) -> np.ndarray:
+    """Values minus the mean of the included values of their window
+
+    Excluded values are set to 0.
+    """
+    values = np.where(filters, values, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(
+            filters,
+            values - (values.sum(axis=-1) / count)[..., None],
+            0.0,
+        )
 
 
 def get_derivative(curve_strided, times_strided):
-    linreg_values = []
+    """Slopes and slope standard errors of the log2 of curve windows
 
-    log2_strided_curve = np.log2(curve_strided)
+    Same values as `scipy.stats.linregress` gives on the finite values of
+    each window. Windows missing more than one value get NaN.
+
+    The values are centred per window and the errors are summed from the
+    residuals themselves, so nearly straight windows keep precise errors.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log2_strided_curve = np.log2(curve_strided)
     filters = np.isfinite(log2_strided_curve)
-    min_size = curve_strided.shape[-1] - 1
+    count = filters.sum(axis=-1)
 
-    for times, value_segment, filt in zip(
-        times_strided,
-        log2_strided_curve,
+    x = _center_windows(
+        np.broadcast_to(times_strided, filters.shape),
         filters,
-    ):
-        if filt.sum() >= min_size:
-            linreg_values.append(
-                _linreg_helper(times[filt], value_segment[filt]),
-            )
-        else:
-            linreg_values.append((np.nan, np.nan))
+        count,
+    )
+    y = _center_windows(log2_strided_curve, filters, count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_squares = (x * x).sum(axis=-1)
+        slopes = (x * y).sum(axis=-1) / x_squares
+        residuals = y - slopes[..., None] * x
+        errors = np.sqrt(
+            (residuals * residuals).sum(axis=-1)
+            / x_squares
+            / (count - 2),
+        )
+    errors = np.where(count == 2, 0.0, errors)
+    too_few = count < curve_strided.shape[-1] - 1
+    return (
+        np.where(too_few, np.nan, slopes),
+        np.where(too_few, np.nan, errors),
+    )
+
 
-    derivative_values_log2, derivative_errors = np.array(linreg_values).T
+def get_derivatives(
+    curves: np.ndarray,
+    times: np.ndarray,
+    regression_size: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Sliding window log2 derivatives of many curves at once
+
+    Same as `get_derivative` on the strided curves, with all windows of
+    all curves in one pass.
+
+    Args:
+        curves: The growth curves, time along the last axis
+        times: The times of the curves
+        regression_size: Number of points in each window
 
-    return derivative_values_log2, derivative_errors
+    Returns:
+        The derivatives and their standard errors, of the shape of the
+        curves with `regression_size - 1` fewer times.
+    """
+    return get_derivative(
+        sliding_window_view(curves, regression_size, axis=-1),
+        sliding_window_view(times, regression_size),
+    )
 
 
 def get_preprocessed_data_for_phenotypes(
@@ -46,17 +98,19 @@ def get_preprocessed_data_for_phenotypes(
     times_strided,
     index_for_48h,
     position_offset,
+    chapman_richards_fit: Optional[tuple[float, np.ndarray]] = None,
+    derivative: Optional[tuple[np.ndarray, np.ndarray]] = None,
 ) -> dict[str, Any]:
-    curve_logged = np.log2(curve)
-    derivative_values_log2, derivative_errors = get_derivative(
-        curve_strided,
-        times_strided,
-    )
+    if chapman_richards_fit is None:
+        chapman_richards_fit = get_fit_r_square(flat_times, np.log2(curve))
+    if derivative is None:
+        derivative = get_derivative(curve_strided, times_strided)
+    derivative_values_log2, derivative_errors = derivative
 
     return {
         'curve_smooth_growth_data': np.ma.masked_invalid(curve),
         'index48h': index_for_48h,
-        'chapman_richards_fit': get_fit_r_square(flat_times, curve_logged),
+        'chapman_richards_fit': chapman_richards_fit,
         'derivative_values_log2': np.ma.masked_invalid(derivative_values_log2),
         'derivative_errors': np.ma.masked_invalid(derivative_errors),
         'linregress_extent': position_offset,
@@ -290,6 +344,20 @@ def get_chapman_richards_4parameter_extended_curve(
     return d + b0 * np.power(1.0 - b1 * np.exp(-b2 * x_data), 1.0 / (1.0 - b3))
 
 
+def _get_r_square(
+    x_data: np.ndarray,
+    y_data: np.ndarray,
+    p: np.ndarray,
+) -> float:
+    y_hat_vector = get_chapman_richards_4parameter_extended_curve(x_data, *p)
+
+    if y_data.any():
+        return (1.0 - np.square(y_hat_vector - y_data).sum() /
+                np.square(y_hat_vector - y_data.mean()).sum())
+    else:
+        return np.nan
+
+
 def get_fit_r_square(
     x_data: np.ndarray,
     y_data: np.ndarray,
@@ -310,13 +378,627 @@ def get_fit_r_square(
     except TypeError:
         return np.inf, p0
 
-    y_hat_vector = get_chapman_richards_4parameter_extended_curve(x_data, *p)
+    return _get_r_square(x_data, y_data, p), p
 
-    if y_data.any():
-        return (1.0 - np.square(y_hat_vector - y_data).sum() /
-                np.square(y_hat_vector - y_data.mean()).sum()), p
-    else:
-        return np.nan, p
+
+# The machine precision and smallest magnitude as MINPACK, which `leastsq`
+# wraps, has them. They are not quite those of the float type.
+_MINPACK_EPSILON = 2.22044604926e-16
+_MINPACK_DWARF = 2.22507385852e-308
+# The default tolerances of `leastsq`
+_LEASTSQ_TOLERANCE = 1.49012e-08
+# The slowest curves of a batch are left to `leastsq` when this few remain
+_LEASTSQ_TAIL = 16
+
+
+def _sum(values: np.ndarray) -> np.ndarray:
+    """Sums along the last axis, adding the values in order as MINPACK does
+    """
+    if values.shape[-1] == 0:
+        return np.zeros(values.shape[:-1])
+    return np.cumsum(values, axis=-1)[..., -1]
+
+
+def _get_norms(vectors: np.ndarray) -> np.ndarray:
+    return np.sqrt(_sum(np.square(vectors)))
+
+
+def _get_chapman_richards_residuals_batch(
+    x_data: np.ndarray,
+    y_data: np.ndarray,
+    finite_y: np.ndarray,
+    params: np.ndarray,
+) -> np.ndarray:
+    return np.where(
+        finite_y,
+        y_data - get_chapman_richards_4parameter_extended_curve(
+            x_data,
+            *(params[:, [i]] for i in range(params.shape[1])),
+        ),
+        0.0,
+    )
+
+
+def _qr_factorize_batch(
+    a: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Householder QR factorizations with column pivoting, as MINPACK qrfac
+
+    Args:
+        a: The matrices by column, shape (count, n, m) with m >= n. Their
+            Householder vectors replace them on and below the diagonals, and
+            the strict upper triangles of R above them.
+
+    Returns:
+        The diagonals of R, the norms of the columns of the matrices and the
+        column permutations, all of shape (count, n).
+    """
+    count, n, _ = a.shape
+    rows = np.arange(count)
+    column_norms = _get_norms(a)
+    r_diagonals = column_norms.copy()
+    norms = column_norms.copy()
+    permutations = np.tile(np.arange(n), (count, 1))
+    for j in range(n):
+        pivots = np.full(count, j)
+        for k in range(j + 1, n):
+            pivots = np.where(
+                r_diagonals[:, k] > r_diagonals[rows, pivots],
+                k,
+                pivots,
+            )
+        column = a[:, j].copy()
+        a[:, j] = a[rows, pivots]
+        a[rows, pivots] = column
+        r_diagonals[rows, pivots] = r_diagonals[:, j]
+        norms[rows, pivots] = norms[:, j]
+        permutation = permutations[:, j].copy()
+        permutations[:, j] = permutations[rows, pivots]
+        permutations[rows, pivots] = permutation
+
+        a_norms = _get_norms(a[:, j, j:])
+        reflect = a_norms != 0
+        a_norms = np.where(a[:, j, j] < 0, -a_norms, a_norms)
+        a[:, j, j:] /= np.where(reflect, a_norms, 1.0)[:, None]
+        a[:, j, j] += reflect
+        if j + 1 < n:
+            temps = np.where(
+                reflect[:, None],
+                _sum(a[:, None, j, j:] * a[:, j + 1:, j:])
+                / a[:, j, j, None],
+                0.0,
+            )
+            a[:, j + 1:, j:] -= temps[:, :, None] * a[:, None, j, j:]
+
+            # Downdate the norms of the remaining columns while it is exact
+            update = reflect[:, None] & (r_diagonals[:, j + 1:] != 0)
+            ratios = a[:, j + 1:, j] / r_diagonals[:, j + 1:]
+            downdated = r_diagonals[:, j + 1:] * np.sqrt(
+                np.maximum(0, 1 - np.square(ratios)),
+            )
+            recompute = update & ~(
+                0.05 * np.square(downdated / norms[:, j + 1:])
+                > _MINPACK_EPSILON
+            )
+            if recompute.any():
+                downdated = np.where(
+                    recompute,
+                    _get_norms(a[:, j + 1:, j + 1:]),
+                    downdated,
+                )
+                norms[:, j + 1:] = np.where(
+                    recompute,
+                    downdated,
+                    norms[:, j + 1:],
+                )
+            r_diagonals[:, j + 1:] = np.where(
+                update,
+                downdated,
+                r_diagonals[:, j + 1:],
+            )
+        r_diagonals[:, j] = -a_norms
+    return r_diagonals, column_norms, permutations
+
+
+def _solve_qr_batch(
+    r: np.ndarray,
+    permutations: np.ndarray,
+    diagonals: np.ndarray,
+    qtb: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Solve damped least squares problems from their QR, as MINPACK qrsolv
+
+    Args:
+        r: The R of the factorizations, shape (count, n, n). Their strict
+            lower triangles are replaced by those of S transposed.
+        permutations: The column permutations, shape (count, n)
+        diagonals: The diagonal damping matrices, shape (count, n)
+        qtb: Q transposed times the right hand sides, shape (count, n)
+
+    Returns:
+        The solutions and the diagonals of S, shape (count, n).
+    """
+    count, n = qtb.shape
+    rows = np.arange(count)
+    for j in range(n):
+        r[:, j:, j] = r[:, j, j:]
+    r_diagonals = np.diagonal(r, axis1=1, axis2=2).copy()
+    wa = qtb.copy()
+    s_diagonals = np.zeros_like(qtb)
+    for j in range(n):
+        damping = diagonals[rows, permutations[:, j]]
+        eliminate = damping != 0
+        s_diagonals[:, j:] = 0
+        s_diagonals[:, j] = damping
+        qtbpj = np.zeros(count)
+        for k in range(j, n):
+            rotate = eliminate & (s_diagonals[:, k] != 0)
+            r_kk = r[:, k, k].copy()
+            s_k = s_diagonals[:, k].copy()
+            cotan = r_kk / s_k
+            sin_cotan = 0.5 / np.sqrt(0.25 + 0.25 * np.square(cotan))
+            tan = s_k / r_kk
+            cos_tan = 0.5 / np.sqrt(0.25 + 0.25 * np.square(tan))
+            use_cotan = ~(np.abs(r_kk) >= np.abs(s_k))
+            cos = np.where(use_cotan, sin_cotan * cotan, cos_tan)
+            sin = np.where(use_cotan, sin_cotan, cos_tan * tan)
+
+            r[:, k, k] = np.where(rotate, cos * r_kk + sin * s_k, r_kk)
+            temp = cos * wa[:, k] + sin * qtbpj
+            qtbpj = np.where(rotate, -sin * wa[:, k] + cos * qtbpj, qtbpj)
+            wa[:, k] = np.where(rotate, temp, wa[:, k])
+            if k + 1 < n:
+                r_ik = r[:, k + 1:, k].copy()
+                s_i = s_diagonals[:, k + 1:].copy()
+                rotate_i = rotate[:, None]
+                r[:, k + 1:, k] = np.where(
+                    rotate_i,
+                    cos[:, None] * r_ik + sin[:, None] * s_i,
+                    r_ik,
+                )
+                s_diagonals[:, k + 1:] = np.where(
+                    rotate_i,
+                    -sin[:, None] * r_ik + cos[:, None] * s_i,
+                    s_i,
+                )
+        s_diagonals[:, j] = r[:, j, j]
+        r[:, j, j] = r_diagonals[:, j]
+
+    singular = np.cumsum(s_diagonals == 0, axis=1) > 0
+    wa[singular] = 0
+    for j in reversed(range(n)):
+        solved = (
+            wa[:, j] - _sum(r[:, j + 1:, j] * wa[:, j + 1:])
+        ) / s_diagonals[:, j]
+        wa[:, j] = np.where(singular[:, j], 0, solved)
+    x = np.empty_like(wa)
+    x[rows[:, None], permutations] = wa
+    return x, s_diagonals
+
+
+def _get_levenberg_marquardt_steps_batch(
+    r: np.ndarray,
+    permutations: np.ndarray,
+    diagonals: np.ndarray,
+    qtb: np.ndarray,
+    deltas: np.ndarray,
+    pars: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Steps within trust regions and their damping, as MINPACK lmpar
+
+    Args:
+        r: The R of the QR factorizations of the jacobians, shape
+            (count, n, n). Their strict lower triangles are overwritten.
+        permutations: The column permutations, shape (count, n)
+        diagonals: The scaling of the parameters, shape (count, n)
+        qtb: Q transposed times the residuals, shape (count, n)
+        deltas: The trust region radii, shape (count,)
+        pars: The initial estimates of the damping, shape (count,)
+
+    Returns:
+        The steps, shape (count, n), and their damping, shape (count,).
+    """
+    count, n = qtb.shape
+    rows = np.arange(count)[:, None]
+    r_diagonals = np.diagonal(r, axis1=1, axis2=2).copy()
+
+    # The Gauss-Newton step, least squares solution if r is singular
+    singular = np.cumsum(r_diagonals == 0, axis=1) > 0
+    full_rank = ~singular[:, -1]
+    wa1 = np.where(singular, 0, qtb)
+    for j in reversed(range(n)):
+        solved = wa1[:, j] / r_diagonals[:, j]
+        wa1[:, j] = np.where(singular[:, j], wa1[:, j], solved)
+        wa1[:, :j] -= np.where(
+            singular[:, j, None],
+            0,
+            r[:, :j, j] * solved[:, None],
+        )
+    x = np.empty_like(wa1)
+    x[rows, permutations] = wa1
+
+    wa2 = diagonals * x
+    dx_norms = _get_norms(wa2)
+    fps = dx_norms - deltas
+    done = fps <= 0.1 * deltas
+    iterated = np.zeros(count, dtype=bool)
+
+    # Lower bound from the Newton step, unless r is singular
+    wa1 = diagonals[rows, permutations] * (
+        wa2[rows, permutations] / dx_norms[:, None]
+    )
+    for j in range(n):
+        wa1[:, j] = (
+            wa1[:, j] - _sum(r[:, :j, j] * wa1[:, :j])
+        ) / r_diagonals[:, j]
+    norms = _get_norms(wa1)
+    lower = np.where(full_rank, ((fps / deltas) / norms) / norms, 0)
+
+    # Upper bound from the gradient
+    for j in range(n):
+        wa1[:, j] = (
+            _sum(r[:, :j + 1, j] * qtb[:, :j + 1])
+            / diagonals[rows[:, 0], permutations[:, j]]
+        )
+    gradient_norms = _get_norms(wa1)
+    upper = gradient_norms / deltas
+    upper = np.where(
+        upper == 0,
+        _MINPACK_DWARF / np.minimum(deltas, 0.1),
+        upper,
+    )
+
+    pars = np.minimum(np.maximum(pars, lower), upper)
+    pars = np.where(pars == 0, gradient_norms / dx_norms, pars)
+
+    for iteration in range(1, 11):
+        iterating = ~done
+        if not iterating.any():
+            break
+        iterated |= iterating
+        pars = np.where(
+            iterating & (pars == 0),
+            np.maximum(_MINPACK_DWARF, 0.001 * upper),
+            pars,
+        )
+        solved, s_diagonals = _solve_qr_batch(
+            r,
+            permutations,
+            np.sqrt(pars)[:, None] * diagonals,
+            qtb,
+        )
+        x = np.where(iterating[:, None], solved, x)
+        wa2 = diagonals * x
+        dx_norms = np.where(iterating, _get_norms(wa2), dx_norms)
+        previous_fps = fps
+        fps = np.where(iterating, dx_norms - deltas, fps)
+        finished = (
+            (np.abs(fps) <= 0.1 * deltas)
+            | ((lower == 0) & (fps <= previous_fps) & (previous_fps < 0))
+            | (iteration == 10)
+        )
+        done |= iterating & finished
+        update = iterating & ~finished
+
+        # Newton correction
+        wa1 = diagonals[rows, permutations] * (
+            wa2[rows, permutations] / dx_norms[:, None]
+        )
+        for j in range(n):
+            wa1[:, j] /= s_diagonals[:, j]
+            wa1[:, j + 1:] -= r[:, j + 1:, j] * wa1[:, j, None]
+        norms = _get_norms(wa1)
+        corrections = ((fps / deltas) / norms) / norms
+
+        lower = np.where(update & (fps > 0), np.maximum(lower, pars), lower)
+        upper = np.where(update & (fps < 0), np.minimum(upper, pars), upper)
+        pars = np.where(update, np.maximum(lower, pars + corrections), pars)
+
+    return x, np.where(iterated, pars, 0)
+
+
+def get_fit_r_square_batch(
+    x_data: np.ndarray,
+    y_data: np.ndarray,
+    p0: np.ndarray = np.array([1.64, -0.1, -2.46, 0.1, 15.18], dtype=float),
+) -> tuple[np.ndarray, np.ndarray]:
+    """Fit Chapman-Richards curves to many growth curves at once
+
+    Same as calling `get_fit_r_square` on each curve, but the curves are
+    solved together. The Levenberg-Marquardt of MINPACK, which `leastsq`
+    wraps, is followed operation by operation, with its forward difference
+    jacobians, trust regions and termination tests, so that the parameters
+    are those of `leastsq` also along the flat valleys of the model. The
+    last few curves to converge are handed to `leastsq` itself.
+
+    Args:
+        x_data: The X-data, shape (times,)
+        y_data: The log2 curves, shape (curves, times), non-finite values
+            are ignored.
+
+    Returns:
+        The r-squares, shape (curves,), and the fitted parameters, shape
+        (curves, 5). As with `get_fit_r_square` curves with fewer finite
+        values than parameters get infinite r-square and `p0`.
+    """
+    y_data = np.asarray(y_data, dtype=float)
+    finite_y = np.isfinite(y_data)
+    params = np.tile(np.asarray(p0, dtype=float), (y_data.shape[0], 1))
+    r_square = np.full(y_data.shape[0], np.inf)
+    n = params.shape[1]
+    fitted = np.flatnonzero(finite_y.sum(axis=1) >= n)
+    max_evaluations = 200 * (n + 1)
+    step_size = np.sqrt(_MINPACK_EPSILON)
+
+    # As `leastsq` only sees the finite values, they are moved first
+    order = np.argsort(~finite_y[fitted], axis=1, kind='stable')
+    finite_ys = np.take_along_axis(finite_y[fitted], order, axis=1)
+    xs = np.where(
+        finite_ys,
+        np.take_along_axis(
+            np.broadcast_to(x_data, y_data.shape)[fitted],
+            order,
+            axis=1,
+        ),
+        0.0,
+    )
+    ys = np.where(
+        finite_ys,
+        np.take_along_axis(y_data[fitted], order, axis=1),
+        0.0,
+    )
+
+    count = fitted.size
+    x = params[fitted]
+    r = np.zeros((count, n, n))
+    permutations = np.tile(np.arange(n), (count, 1))
+    qtf = np.zeros((count, n))
+    diagonals = np.ones((count, n))
+    deltas = np.zeros(count)
+    pars = np.zeros(count)
+    x_norms = np.zeros(count)
+    gradient_norms = np.zeros(count)
+    first_iteration = np.ones(count, dtype=bool)
+    needs_jacobian = np.ones(count, dtype=bool)
+    done = np.zeros(count, dtype=bool)
+
+    with np.errstate(all='ignore'):
+        residuals = _get_chapman_richards_residuals_batch(xs, ys, finite_ys, x)
+        evaluations = np.ones(count, dtype=int)
+        residual_norms = _get_norms(residuals)
+
+        while True:
+            active = np.flatnonzero(~done)
+            if active.size <= min(_LEASTSQ_TAIL, count // 10):
+                break
+
+            # Jacobians by forward differences and their QR factorizations
+            update = active[needs_jacobian[active]]
+            if update.size:
+                u_x = x[update]
+                u_residuals = residuals[update]
+                u_norms = residual_norms[update]
+                jacobians = np.empty((update.size, n, ys.shape[1]))
+                for i in range(n):
+                    steps = step_size * np.abs(u_x[:, i])
+                    steps[steps == 0] = step_size
+                    x_step = u_x.copy()
+                    x_step[:, i] += steps
+                    jacobians[:, i] = (
+                        _get_chapman_richards_residuals_batch(
+                            xs[update],
+                            ys[update],
+                            finite_ys[update],
+                            x_step,
+                        ) - u_residuals
+                    ) / steps[:, None]
+                evaluations[update] += n
+                r_diagonals, column_norms, u_permutations = (
+                    _qr_factorize_batch(jacobians)
+                )
+
+                # Scaling and trust regions from the first jacobians
+                first = first_iteration[update]
+                u_diagonals = np.where(
+                    first[:, None],
+                    np.where(column_norms == 0, 1.0, column_norms),
+                    diagonals[update],
+                )
+                initial_x_norms = _get_norms(u_diagonals * u_x)
+                x_norms[update] = np.where(
+                    first,
+                    initial_x_norms,
+                    x_norms[update],
+                )
+                initial_deltas = 100 * initial_x_norms
+                deltas[update] = np.where(
+                    first,
+                    np.where(initial_deltas == 0, 100, initial_deltas),
+                    deltas[update],
+                )
+
+                # Q transposed times the residuals
+                wa4 = u_residuals.copy()
+                u_qtf = np.empty((update.size, n))
+                for j in range(n):
+                    a_jj = jacobians[:, j, j]
+                    temps = np.where(
+                        a_jj != 0,
+                        -_sum(jacobians[:, j, j:] * wa4[:, j:]) / a_jj,
+                        0.0,
+                    )
+                    wa4[:, j:] += jacobians[:, j, j:] * temps[:, None]
+                    jacobians[:, j, j] = r_diagonals[:, j]
+                    u_qtf[:, j] = wa4[:, j]
+                u_r = jacobians[:, :, :n].transpose(0, 2, 1)
+
+                # Norms of the scaled gradients
+                u_gradient_norms = np.zeros(update.size)
+                for j in range(n):
+                    norm = column_norms[
+                        np.arange(update.size),
+                        u_permutations[:, j],
+                    ]
+                    gradient = _sum(
+                        u_r[:, :j + 1, j]
+                        * (u_qtf[:, :j + 1] / u_norms[:, None]),
+                    )
+                    u_gradient_norms = np.where(
+                        norm != 0,
+                        np.fmax(u_gradient_norms, np.abs(gradient / norm)),
+                        u_gradient_norms,
+                    )
+
+                r[update] = u_r
+                qtf[update] = u_qtf
+                permutations[update] = u_permutations
+                diagonals[update] = np.maximum(u_diagonals, column_norms)
+                gradient_norms[update] = np.where(
+                    u_norms != 0,
+                    u_gradient_norms,
+                    0,
+                )
+                done[update] = gradient_norms[update] <= 0
+                needs_jacobian[update] = False
+                active = np.flatnonzero(~done)
+
+            # Steps within the trust regions
+            a_x = x[active]
+            a_r = r[active]
+            a_permutations = permutations[active]
+            a_diagonals = diagonals[active]
+            a_deltas = deltas[active]
+            a_norms = residual_norms[active]
+            steps, a_pars = _get_levenberg_marquardt_steps_batch(
+                a_r,
+                a_permutations,
+                a_diagonals,
+                qtf[active],
+                a_deltas,
+                pars[active],
+            )
+            r[active] = a_r
+            steps = -steps
+            new_x = a_x + steps
+            step_norms = _get_norms(a_diagonals * steps)
+            a_deltas = np.where(
+                first_iteration[active],
+                np.minimum(a_deltas, step_norms),
+                a_deltas,
+            )
+            new_residuals = _get_chapman_richards_residuals_batch(
+                xs[active],
+                ys[active],
+                finite_ys[active],
+                new_x,
+            )
+            evaluations[active] += 1
+            new_norms = _get_norms(new_residuals)
+
+            # Actual and predicted reductions
+            actual_reductions = np.where(
+                0.1 * new_norms < a_norms,
+                1 - np.square(new_norms / a_norms),
+                -1.0,
+            )
+            wa3 = np.zeros((active.size, n))
+            a_rows = np.arange(active.size)
+            for j in range(n):
+                wa3[:, :j + 1] += (
+                    a_r[:, :j + 1, j]
+                    * steps[a_rows, a_permutations[:, j], None]
+                )
+            temp1 = _get_norms(wa3) / a_norms
+            temp2 = (np.sqrt(a_pars) * step_norms) / a_norms
+            predicted_reductions = (
+                np.square(temp1) + np.square(temp2) / 0.5
+            )
+            directional_derivatives = -(np.square(temp1) + np.square(temp2))
+            ratios = np.where(
+                predicted_reductions != 0,
+                actual_reductions / predicted_reductions,
+                0.0,
+            )
+
+            # Trust region updates
+            shrink = ~(ratios > 0.25)
+            temp = np.where(
+                actual_reductions >= 0,
+                0.5,
+                0.5 * directional_derivatives / (
+                    directional_derivatives + 0.5 * actual_reductions
+                ),
+            )
+            temp = np.where(
+                (0.1 * new_norms >= a_norms) | (temp < 0.1),
+                0.1,
+                temp,
+            )
+            grow = ~shrink & ~((a_pars != 0) & (ratios < 0.75))
+            a_deltas = np.where(
+                shrink,
+                temp * np.minimum(a_deltas, step_norms / 0.1),
+                np.where(grow, step_norms / 0.5, a_deltas),
+            )
+            a_pars = np.where(
+                shrink,
+                a_pars / temp,
+                np.where(grow, 0.5 * a_pars, a_pars),
+            )
+
+            success = ~(ratios < 0.0001)
+            a_x = np.where(success[:, None], new_x, a_x)
+            a_x_norms = np.where(
+                success,
+                _get_norms(a_diagonals * a_x),
+                x_norms[active],
+            )
+            x[active] = a_x
+            residuals[active] = np.where(
+                success[:, None],
+                new_residuals,
+                residuals[active],
+            )
+            residual_norms[active] = np.where(success, new_norms, a_norms)
+            x_norms[active] = a_x_norms
+            deltas[active] = a_deltas
+            pars[active] = a_pars
+            first_iteration[active] &= ~success
+            needs_jacobian[active] = success
+
+            # Convergence and termination tests
+            done[active] = (
+                (
+                    (np.abs(actual_reductions) <= _LEASTSQ_TOLERANCE)
+                    & (predicted_reductions <= _LEASTSQ_TOLERANCE)
+                    & (0.5 * ratios <= 1)
+                )
+                | (a_deltas <= _LEASTSQ_TOLERANCE * a_x_norms)
+                | (evaluations[active] >= max_evaluations)
+                | (
+                    (np.abs(actual_reductions) <= _MINPACK_EPSILON)
+                    & (predicted_reductions <= _MINPACK_EPSILON)
+                    & (0.5 * ratios <= 1)
+                )
+                | (a_deltas <= _MINPACK_EPSILON * a_x_norms)
+                | (gradient_norms[active] <= _MINPACK_EPSILON)
+            )
+
+    params[fitted] = x
+    for index in fitted[active]:
+        r_square[index], params[index] = get_fit_r_square(
+            x_data,
+            y_data[index],
+            p0,
+        )
+    for index in fitted[done]:
+        finite = finite_y[index]
+        r_square[index] = _get_r_square(
+            x_data[finite],
+            y_data[index, finite],
+            params[index],
+        )
+    return r_square, params
 
 
 def get_chapman_richards_residuals(
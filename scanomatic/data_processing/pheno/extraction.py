@@ -0,0 +1,208 @@
+"""Extraction of the curve phenotypes of blocks of curves.
+
+A block is a range of rows of a plate. Blocks don't depend on each other,
+so they can be extracted in worker processes. The workers read their
+curves from plates in shared memory, and only the phenotypes of the block
+travel back.
+"""
+from collections.abc import Generator
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from scanomatic.data_processing.growth_phenotypes import (
+    Phenotypes,
+    get_derivatives,
+    get_fit_r_square_batch,
+    get_preprocessed_data_for_phenotypes
+)
+from scanomatic.data_processing.phases.analysis import get_phase_analysis
+from scanomatic.data_processing.phases.features import VectorPhenotypes
+from scanomatic.data_processing.pheno.state import PhenotyperSettings
+from scanomatic.data_processing.phenotypes import PhenotypeDataType
+from scanomatic.io.logger import get_logger
+from scanomatic.io.shared_arrays import SharedArray, read_shared_array
+
+_logger = get_logger("Phenotype Extraction")
+
+CurvePhenotypes = tuple[
+    dict[Phenotypes, np.ndarray],
+    dict[VectorPhenotypes, np.ndarray],
+]
+
+
+class _CurvesView:
+    """What phase analysis needs of a phenotyper, for a block of curves"""
+
+    def __init__(
+        self,
+        curves: np.ndarray,
+        times: np.ndarray,
+        derivatives: np.ndarray,
+    ):
+        self.smooth_growth_data = [curves]
+        self.times = times
+        self._derivatives = derivatives
+
+    def get_derivative(self, plate: int, position) -> np.ndarray:
+        return self._derivatives[position]
+
+
+def get_empty_phenotypes(
+    shape: tuple[int, ...],
+    phenotypes_inclusion: PhenotypeDataType,
+) -> CurvePhenotypes:
+    """Phenotype arrays filled with NaN for the included phenotypes"""
+    return (
+        {
+            p: np.zeros(shape, dtype=float) * np.nan
+            for p in Phenotypes if phenotypes_inclusion(p)
+        },
+        {
+            p: np.zeros(shape, dtype=object) * np.nan
+            for p in VectorPhenotypes if phenotypes_inclusion(p)
+        },
+    )
+
+
+def iterate_curve_phenotypes(
+    curves: np.ndarray,
+    times: np.ndarray,
+    settings: PhenotyperSettings,
+    phenotypes: CurvePhenotypes,
+    id_plate: int,
+    row_offset: int = 0,
+) -> Generator[int, None, None]:
+    """Extract the phenotypes of a block of curves
+
+    Derivatives and Chapman-Richards fits are made for the whole block at
+    once, the other phenotypes curve by curve.
+
+    Args:
+        curves: The smooth growth curves, shape (rows, columns, times)
+        times: The times of the curves
+        settings: The settings of the phenotyper
+        phenotypes: The scalar and vector phenotype arrays of the block,
+            as made by `get_empty_phenotypes`, which are filled in.
+        id_plate: Index of the plate, for logging
+        row_offset: Plate row of the first row of the block, for logging
+
+    Yields:
+        The number of curves done, after each row.
+    """
+    assert settings.phenotypes_inclusion is not None
+    phenotypes_inclusion = settings.phenotypes_inclusion
+    scalar_phenotypes, vector_phenotypes = phenotypes
+    regression_size = settings.linear_regression_size
+    position_offset = (regression_size - 1) // 2
+    index_for_48h = np.abs(np.subtract.outer(times, [48])).argmin()
+    times_strided = sliding_window_view(times, regression_size)
+    curves_strided = sliding_window_view(curves, regression_size, axis=-1)
+
+    derivatives, derivative_errors = get_derivatives(
+        curves,
+        times,
+        regression_size,
+    )
+    r_squares, params = get_fit_r_square_batch(
+        times,
+        np.log2(curves.reshape(-1, curves.shape[-1])),
+    )
+    r_squares = r_squares.reshape(curves.shape[:2])
+    params = params.reshape(curves.shape[:2] + params.shape[-1:])
+    curves_view = _CurvesView(curves, times, derivatives)
+    include_phases = (
+        phenotypes_inclusion(VectorPhenotypes.PhasesClassifications)
+        or phenotypes_inclusion(VectorPhenotypes.PhasesPhenotypes)
+    )
+
+    for id0 in range(curves.shape[0]):
+        for id1 in range(curves.shape[1]):
+            curve_data = get_preprocessed_data_for_phenotypes(
+                curve=curves[id0, id1],
+                curve_strided=curves_strided[id0, id1],
+                flat_times=times,
+                times_strided=times_strided,
+                index_for_48h=index_for_48h,
+                position_offset=position_offset,
+                chapman_richards_fit=(r_squares[id0, id1], params[id0, id1]),
+                derivative=(
+                    derivatives[id0, id1],
+                    derivative_errors[id0, id1],
+                ),
+            )
+
+            if curve_data['curve_smooth_growth_data'].mask.all():
+                _logger.warning(
+                    "Position ({0}, {1}) on plate {2} seems void of data".format(  # noqa: E501
+                        row_offset + id0,
+                        id1,
+                        id_plate + 1,
+                    ),
+                )
+                continue
+
+            for phenotype in scalar_phenotypes:
+                if PhenotypeDataType.Scalar(phenotype):
+                    scalar_phenotypes[phenotype][id0, id1] = phenotype(
+                        **curve_data,
+                    )
+
+            if include_phases:
+                phases, phases_phenotypes = get_phase_analysis(
+                    curves_view,
+                    0,
+                    (id0, id1),
+                    experiment_doublings=scalar_phenotypes[
+                        Phenotypes.ExperimentPopulationDoublings
+                    ][id0, id1]
+                )
+
+                if VectorPhenotypes.PhasesClassifications in vector_phenotypes:
+                    vector_phenotypes[
+                        VectorPhenotypes.PhasesClassifications
+                    ][id0, id1] = phases
+                if VectorPhenotypes.PhasesPhenotypes in vector_phenotypes:
+                    vector_phenotypes[
+                        VectorPhenotypes.PhasesPhenotypes
+                    ][id0, id1] = phases_phenotypes
+
+        yield (id0 + 1) * curves.shape[1]
+
+
+def extract_shared_curve_phenotypes(
+    shared_plate: SharedArray,
+    rows: tuple[int, int],
+    times: np.ndarray,
+    settings: PhenotyperSettings,
+    id_plate: int,
+) -> CurvePhenotypes:
+    """Extract the phenotypes of some rows of a plate in shared memory
+
+    Args:
+        shared_plate: Where the plate is in shared memory
+        rows: First and end row of the block
+        times: The times of the curves
+        settings: The settings of the phenotyper
+        id_plate: Index of the plate, for logging
+
+    Returns:
+        The scalar and vector phenotype arrays of the block.
+    """
+    curves = read_shared_array(shared_plate, slice(*rows))
+
+    assert settings.phenotypes_inclusion is not None
+    phenotypes = get_empty_phenotypes(
+        curves.shape[:2],
+        settings.phenotypes_inclusion,
+    )
+    for _ in iterate_curve_phenotypes(
+        curves,
+        times,
+        settings,
+        phenotypes,
+        id_plate,
+        row_offset=rows[0],
+    ):
+        pass
+    return phenotypes
@@ -0,0 +1,228 @@
+"""Polynomial smoothing of all growth curves of a plate at once.
+
+Each time point has a window of the time points within a time delta of it.
+A polynomial is fitted to the finite log2 values of every window of every
+curve. Windows where all values are finite share their design matrix, so
+their fits are a single product with its pseudo-inverse, the same way
+Savitzky-Golay kernels work. Windows with missing values are solved as a
+batch of weighted least squares problems. Only windows with too few values
+to determine the polynomial are fitted one by one with `np.polyfit`, so
+their minimum norm solutions stay the same.
+
+Polynomials are kept in the centered and scaled time of their window,
+which keeps the fits well conditioned.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.stats import norm  # type: ignore
+
+
+@dataclass
+class WindowPolynomials:
+    # Coefficients per curve and window, lowest power first, shape
+    # (curves, windows, power + 1)
+    coefficients: np.ndarray
+    # Center and scale of the time of each window
+    centers: np.ndarray
+    scales: np.ndarray
+    # Number of finite values in each window of each curve
+    counts: np.ndarray
+    # Mean squared residual and variance of the values of each fit, the
+    # residual is 0 and variance 1 for fits that go through all values.
+    residuals: np.ndarray
+    variances: np.ndarray
+
+    def evaluate(self, windows: np.ndarray, times: np.ndarray) -> np.ndarray:
+        """Evaluate the polynomials of some windows for all curves
+
+        Args:
+            windows: Indices of the windows
+            times: The times to evaluate at, broadcastable to
+                (curves, len(windows))
+        """
+        x = (times - self.centers[windows]) / self.scales[windows]
+        coefficients = self.coefficients[:, windows]
+        values = coefficients[..., -1]
+        for power in range(coefficients.shape[-1] - 2, -1, -1):
+            values = values * x + coefficients[..., power]
+        return values
+
+
+def _get_polyfit_coefficients(
+    x: np.ndarray,
+    y: np.ndarray,
+    power: int,
+    center: float,
+    scale: float,
+) -> np.ndarray:
+    """`np.polyfit` coefficients in the centered and scaled time"""
+    polynomial = np.poly1d(np.polyfit(x, y, power))(np.poly1d([scale, center]))
+    coefficients = np.zeros(power + 1)
+    coefficients[:polynomial.order + 1] = polynomial.coeffs[::-1]
+    return coefficients
+
+
+def fit_window_polynomials(
+    times: np.ndarray,
+    log2_curves: np.ndarray,
+    filt: np.ndarray,
+    power: int,
+) -> WindowPolynomials:
+    """Fit polynomials to every window of every curve
+
+    Args:
+        times: The times of the curves
+        log2_curves: The log2 curves, shape (curves, times)
+        filt: Boolean matrix, row i marks the times in the window of time i
+        power: The degree of the polynomials
+
+    Returns:
+        The polynomials of every window. Windows without finite values
+        have NaN coefficients.
+    """
+    curves, windows = log2_curves.shape[0], filt.shape[0]
+    terms = power + 1
+    finite = np.isfinite(log2_curves)
+    polynomials = WindowPolynomials(
+        coefficients=np.full((curves, windows, terms), np.nan),
+        centers=np.zeros(windows),
+        scales=np.ones(windows),
+        counts=np.zeros((curves, windows), dtype=int),
+        residuals=np.full((curves, windows), np.nan),
+        variances=np.full((curves, windows), np.nan),
+    )
+
+    for window, window_filt in enumerate(filt):
+        indices = np.flatnonzero(window_filt)
+        window_times = times[indices]
+        center = window_times.mean()
+        scale = np.abs(window_times - center).max()
+        if not scale > 0:
+            scale = 1.0
+        polynomials.centers[window] = center
+        polynomials.scales[window] = scale
+        design = np.power.outer((window_times - center) / scale, range(terms))
+
+        window_finite = finite[:, indices]
+        counts = window_finite.sum(axis=1)
+        polynomials.counts[:, window] = counts
+        y = np.where(window_finite, log2_curves[:, indices], 0.0)
+        coefficients = polynomials.coefficients[:, window]
+
+        complete = counts == indices.size
+        if indices.size >= terms and complete.any():
+            coefficients[complete] = y[complete] @ np.linalg.pinv(design).T
+
+        partial = ~complete & (counts >= terms)
+        if partial.any():
+            weighted_design = design * window_finite[partial, :, None]
+            coefficients[partial] = (
+                np.linalg.pinv(weighted_design) @ y[partial, :, None]
+            )[..., 0]
+
+        for curve in np.flatnonzero((counts > 0) & (counts < terms)):
+            curve_finite = window_finite[curve]
+            coefficients[curve] = _get_polyfit_coefficients(
+                window_times[curve_finite],
+                y[curve, curve_finite],
+                power,
+                center,
+                scale,
+            )
+
+        fitted = counts > 0
+        residuals = np.where(
+            window_finite,
+            y - coefficients @ design.T,
+            0.0,
+        )
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = y.sum(axis=1) / counts
+            polynomials.residuals[:, window] = np.where(
+                counts > terms,
+                np.square(residuals).sum(axis=1) / counts,
+                np.where(fitted, 0.0, np.nan),
+            )
+            polynomials.variances[:, window] = np.where(
+                counts > terms,
+                np.where(
+                    window_finite,
+                    np.square(y - means[:, None]),
+                    0.0,
+                ).sum(axis=1) / counts,
+                np.where(fitted, 1.0, np.nan),
+            )
+
+    return polynomials
+
+
+def get_polynomial_smoothing(
+    times: np.ndarray,
+    polynomials: WindowPolynomials,
+) -> np.ndarray:
+    """Each window's polynomial at the time of the window, linear scale"""
+    windows = np.arange(times.size)
+    with np.errstate(over='ignore'):
+        return np.power(2, polynomials.evaluate(windows, times))
+
+
+def get_weighted_polynomial_smoothing(
+    times: np.ndarray,
+    polynomials: WindowPolynomials,
+    filt: np.ndarray,
+    gauss_sigma: float,
+) -> np.ndarray:
+    """Weighted average of the polynomials of the windows around each time
+
+    For each time, the polynomials of all windows in its own window are
+    evaluated at the mean time of those windows. The values are averaged,
+    weighted by a gaussian in time and by how much better than the mean
+    each polynomial fits its window.
+
+    Args:
+        times: The times of the curves
+        polynomials: The polynomials of every window
+        filt: Boolean matrix, row i marks the times in the window of time i
+        gauss_sigma: Width of the gaussian weights, in hours
+
+    Returns:
+        The smoothed curves, linear scale, shape (curves, times). Times
+        without any fitted window nearby are NaN.
+    """
+    curves = polynomials.counts.shape[0]
+    smoothed = np.full((curves, filt.shape[0]), np.nan)
+    included = polynomials.counts > 0
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        fit_weights = 1 - polynomials.residuals / polynomials.variances
+        for window, window_filt in enumerate(filt):
+            indices = np.flatnonzero(window_filt)
+            window_included = included[:, indices]
+            window_times = np.broadcast_to(
+                times[indices],
+                window_included.shape,
+            )
+            mean_times = (
+                np.where(window_included, window_times, 0).sum(axis=1)
+                / window_included.sum(axis=1)
+            )
+            weights = np.where(
+                window_included,
+                norm.pdf(
+                    window_times,
+                    loc=mean_times[:, None],
+                    scale=gauss_sigma,
+                ) * fit_weights[:, indices],
+                0.0,
+            )
+            values = np.power(
+                2,
+                polynomials.evaluate(indices, mean_times[:, None]),
+            )
+            smoothed[:, window] = (
+                np.where(window_included, weights * values, 0.0).sum(axis=1)
+                / weights.sum(axis=1)
+            )
+
+    return smoothed
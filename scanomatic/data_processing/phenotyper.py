@@ -3,6 +3,7 @@ import pickle
 import os
 from collections import deque
 from collections.abc import Callable, Generator
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
 from enum import Enum
 from io import BytesIO
 from itertools import chain, product
@@ -11,7 +12,6 @@ from typing import Any, Optional, Union
 import numpy as np
 from scipy.ndimage import median_filter  # type: ignore
 from scipy.signal import convolve  # type: ignore
-from scipy.stats import norm  # type: ignore
 
 import scanomatic.io.image_data as image_data
 import scanomatic.io.jsonizer as jsonizer
@@ -20,13 +20,12 @@ from scanomatic.data_processing.convolution import (
     EdgeCondition,
     filter_edge_condition,
     get_edge_condition_timed_filter,
-    merge_convolve
+    get_time_based_gaussian_weighted_means
 )
 from scanomatic.data_processing.growth_phenotypes import (
     Phenotypes,
     get_chapman_richards_4parameter_extended_curve,
-    get_derivative,
-    get_preprocessed_data_for_phenotypes
+    get_derivatives
 )
 from scanomatic.data_processing.norm import (
     NormState,
@@ -37,16 +36,24 @@ from scanomatic.data_processing.norm import (
     norm_by_log2_diff_corr_scaled,
     norm_by_signal_to_noise
 )
-from scanomatic.data_processing.phases.analysis import (
-    CurvePhasePhenotypes,
-    get_phase_analysis
-)
+from scanomatic.data_processing.phases.analysis import CurvePhasePhenotypes
 from scanomatic.data_processing.phases.features import (
     CurvePhaseMetaPhenotypes,
     VectorPhenotypes,
     extract_phenotypes
 )
+from scanomatic.data_processing.pheno.extraction import (
+    extract_shared_curve_phenotypes,
+    get_empty_phenotypes,
+    iterate_curve_phenotypes
+)
 from scanomatic.data_processing.pheno.save import save_state, save_state_to_zip
+from scanomatic.data_processing.pheno.smoothing import (
+    WindowPolynomials,
+    fit_window_polynomials,
+    get_polynomial_smoothing,
+    get_weighted_polynomial_smoothing
+)
 from scanomatic.data_processing.pheno.state import (
     DEFAULT_NO_GROWTH_THRESHOLD,
     DEFAULT_DOUBLING_THRESHOLD,
@@ -59,6 +66,7 @@ from scanomatic.generics.phenotype_filter import Filter, FilterArray
 from scanomatic.io.logger import get_logger
 from scanomatic.io.meta_data import MetaData2
 from scanomatic.io.pickler import safe_load
+from scanomatic.io.shared_arrays import SharedArray, SharedArrays
 from . import mock_numpy_interface
 
 # TODO: Something is wrong with phase features again
@@ -625,7 +633,18 @@ class Phenotyper(mock_numpy_interface.NumpyArrayInterface):
     def iterate_extraction(
         self,
         keep_filter=False,
+        workers: int = 1,
     ) -> Generator[float, None, None]:
+        """Extract phenotypes, yielding the progress as it goes
+
+        Args:
+            keep_filter:
+                Optional, if previous log2_curve marks on phenotypes should
+                be kept or not.
+            workers:
+                Optional, number of processes that extract the curve
+                phenotypes. Default is to extract them in this process.
+        """
         self._logger.info(
             "Iteration started, will extract {0} phenotypes".format(
                 self.get_number_of_phenotypes(),
@@ -641,7 +660,7 @@ class Phenotyper(mock_numpy_interface.NumpyArrayInterface):
 
         self.wipe_extracted_phenotypes(keep_filter)
 
-        for x in self._calculate_phenotypes():
+        for x in self._calculate_phenotypes(workers=workers):
             self._logger.debug("Phenotype extraction iteration")
             yield x
 
@@ -745,14 +764,10 @@ class Phenotyper(mock_numpy_interface.NumpyArrayInterface):
                 np.prod(plate.shape[:2]),
                 plate.shape[-1],
             )
-            smooth_plate = np.array(tuple(
-                tuple(self._poly_smoothen_raw_growth_curve(
-                    times,
-                    log2_curve,
-                    power,
-                    filt,
-                )) for log2_curve in log2_data
-            ))
+            smooth_plate = get_polynomial_smoothing(
+                times,
+                fit_window_polynomials(times, log2_data, filt, power),
+            )
 
             self._logger.info("Plate {0} data polynomial smoothed".format(
                 id_plate + 1,
@@ -833,143 +848,92 @@ class Phenotyper(mock_numpy_interface.NumpyArrayInterface):
                     mode='reflect',
                 )
 
-            smooth_plate = [None] * log2_data.shape[0]
-            for id_curve, log2_curve in enumerate(log2_data):
-
-                log2_curve = filter_edge_condition(
+            log2_data = np.array([
+                filter_edge_condition(
                     log2_curve,
                     left_filt,
                     right_filt,
                     edge_condition,
                     logger=self._logger,
-                )
-                p, r, r0 = zip(*self._poly_estimate_raw_growth_curve(
-                    times,
-                    log2_curve,
-                    power,
-                    filt,
-                ))
-
-                if any(r0val < epsilon for r0val in r0):
-
-                    self._logger.warning(
-                        "Curve {0} has long stretches of (near) identical data and is probably corrupt".format(  # noqa: E501
-                            np.unravel_index(id_curve, plate.shape[:2]),
-                        ),
-                    )
-
-                if any(rval == 0 for rval in r):
-                    self._logger.warning(
-                        "Curve {0} is probably overfitted somewhere because polynomial residual was 0".format(  # noqa: E501
-                            np.unravel_index(id_curve, plate.shape[:2]),
-                        ),
-                    )
+                ) for log2_curve in log2_data
+            ])
+            polynomials = fit_window_polynomials(
+                times,
+                log2_data,
+                filt,
+                power,
+            )
+            self._log_poly_fit_problems(polynomials, plate.shape, epsilon)
 
-                smooth_plate[id_curve] = tuple(self._multi_poly_smooth(
-                    times,
-                    p,
-                    np.array(r),
-                    np.array(r0),
-                    filt,
-                    gauss_sigma,
-                ))[left: -right if right else None]
+            smooth_plate = get_weighted_polynomial_smoothing(
+                times,
+                polynomials,
+                filt,
+                gauss_sigma,
+            )[:, left: -right if right else None]
 
             self._logger.info(
                 "Plate {0} data polynomial smoothed ({1} curves, {2} data-points per curve)".format(  # noqa: E501
                     id_plate + 1,
-                    len(smooth_plate),
-                    len(smooth_plate[0])
+                    smooth_plate.shape[0],
+                    smooth_plate.shape[1],
                 ),
             )
 
-            smooth_data.append(np.array(smooth_plate).reshape(plate.shape))
+            smooth_data.append(smooth_plate.reshape(plate.shape))
 
         self._state.smooth_growth_data = np.array(smooth_data)
 
         self._logger.info("Completed Weighted Multi-Polynomial smoothing")
 
-    @staticmethod
-    def _multi_poly_smooth(times, polys, r, r0, filt, gauss_sigma: float):
-        included = [v is not None for v in r]
-        for f in filt:
-
-            f2 = f & included
-            t = times[f2].mean()
-            w1 = norm.pdf(times[f2], loc=t, scale=gauss_sigma)
-            w2 = 1 - r[f2] / r0[f2]
-            w = w1 * w2
-            yield (
-                w * tuple(np.power(2, p(t)) for p, i in zip(polys, f2) if i)
-            ).sum() / w.sum()
-
-    def _poly_estimate_raw_growth_curve(self, times, log2_data, power, filt):
-        finites = np.isfinite(log2_data)
-
-        for _, f in zip(times, filt):
-            f2 = f & finites
-            x = times[f2]
-            y = log2_data[f2]
-            p = None
-            yielded = False
-            for pwr in range(power, -1, -1):
-                try:
-                    p, r, _, _, _ = np.polyfit(x, y, power, full=True)
-                except TypeError:
-                    yielded = True
-                    yield None, None, None
-                    break
-                else:
-                    if r.size > 1:
-                        break
-
-            if not yielded:
-                try:
-                    yield np.poly1d(p), r[0] / f2.sum(), np.var(y)
-                except IndexError:
-                    # This is invoked if only two measurements have finite
-                    # data for the entire interval and the values of these are
-                    # identical. Heuristically the residuals are set so we
-                    # have absolute confidence in this result
-                    self._logger.warning(
-                        "Encountered large gap in data ({0}/{1} have values)".format(  # noqa: E501
-                            f2.sum(),
-                            f.sum(),
-                        ),
-                    )
-                    yield np.poly1d(p),  0, 1
-
-    @staticmethod
-    def _poly_smoothen_raw_growth_curve(times, log2_data, power: int, filt):
-
-        finites = np.isfinite(log2_data)
+    def _log_poly_fit_problems(
+        self,
+        polynomials: WindowPolynomials,
+        plate_shape: tuple[int, ...],
+        epsilon: float,
+    ) -> None:
+        fitted = polynomials.counts > 0
+        terms = polynomials.coefficients.shape[-1]
+        gaps = fitted & (polynomials.counts <= terms)
+        for id_curve in np.flatnonzero(gaps.any(axis=1)):
+            self._logger.warning(
+                "Curve {0} has large gaps in data ({1} windows with too few values)".format(  # noqa: E501
+                    np.unravel_index(id_curve, plate_shape[:2]),
+                    gaps[id_curve].sum(),
+                ),
+            )
 
-        for t, f in zip(times, filt):
-            x = times[f]
-            y = log2_data[f]
-            fin = finites[f]
+        for id_curve in np.flatnonzero(
+            (fitted & (polynomials.variances < epsilon)).any(axis=1),
+        ):
+            self._logger.warning(
+                "Curve {0} has long stretches of (near) identical data and is probably corrupt".format(  # noqa: E501
+                    np.unravel_index(id_curve, plate_shape[:2]),
+                ),
+            )
 
-            try:
-                p = np.polyfit(x[fin], y[fin], power)
-            except TypeError:
-                yield np.nan
-            else:
-                yield np.power(2, np.poly1d(p)(t))
+        for id_curve in np.flatnonzero(
+            (fitted & (polynomials.residuals == 0)).any(axis=1),
+        ):
+            self._logger.warning(
+                "Curve {0} is probably overfitted somewhere because polynomial residual was 0".format(  # noqa: E501
+                    np.unravel_index(id_curve, plate_shape[:2]),
+                ),
+            )
 
     def _smoothen(self) -> None:
         self.set("smooth_growth_data", self._state.raw_growth_data.copy())
         self._logger.info("Smoothing Started")
-        median_kernel = np.ones((1, self._settings.median_kernel_size))
+        median_kernel = np.ones((1, 1, self._settings.median_kernel_size))
         times = self.times
 
         # This conversion is done to reflect that previous filter worked on
         # indices and expected ratio to hours is 1:3.
-        gauss_kwargs = {
-            'sigma': (
-                self._settings.gaussian_filter_sigma / 3.0
-                if self._settings.gaussian_filter_sigma == 5
-                else self._settings.gaussian_filter_sigma
-            ),
-        }
+        sigma = (
+            self._settings.gaussian_filter_sigma / 3.0
+            if self._settings.gaussian_filter_sigma == 5
+            else self._settings.gaussian_filter_sigma
+        )
 
         for plate_id, plate in enumerate(self._state.smooth_growth_data):
             if plate is None:
@@ -978,21 +942,15 @@ class Phenotyper(mock_numpy_interface.NumpyArrayInterface):
                 ))
                 continue
 
-            plate_as_flat = np.lib.stride_tricks.as_strided(
+            plate[...] = median_filter(
                 plate,
-                shape=(plate.shape[0] * plate.shape[1], plate.shape[2]),
-                strides=(plate.strides[1], plate.strides[2]),
-            )
-
-            plate_as_flat[...] = median_filter(
-                plate_as_flat,
                 footprint=median_kernel,
                 mode='reflect',
             )
-
-            plate_as_flat[...] = tuple(
-                merge_convolve(v, times, func_kwargs=gauss_kwargs)
-                for v in plate_as_flat
+            plate[...] = get_time_based_gaussian_weighted_means(
+                plate,
+                times,
+                sigma=sigma,
             )
 
             self._logger.info("Smoothing of plate {0} done".format(
@@ -1001,7 +959,7 @@ class Phenotyper(mock_numpy_interface.NumpyArrayInterface):
 
         self._logger.info("Smoothing Done")
 
-    def _calculate_phenotypes(self):
+    def _calculate_phenotypes(self, workers=1):
         if (
             self._state.times_data.shape[0]
             - (self._settings.linear_regression_size - 1)
@@ -1012,18 +970,10 @@ class Phenotyper(mock_numpy_interface.NumpyArrayInterface):
             )
             return
 
-        times_strided = self.times_strided
-        flat_times = self._state.times_data
-        index_for_48h = np.abs(
-            np.subtract.outer(self._state.times_data, [48]),
-        ).argmin()
-
         all_phenotypes = []
         all_vector_phenotypes = []
         all_vector_meta_phenotypes = []
 
-        regression_size = self._settings.linear_regression_size
-        position_offset = (regression_size - 1) // 2
         phenotypes_count = self.get_number_of_phenotypes()
 
         total_curves = float(self.number_of_curves)
@@ -1035,7 +985,6 @@ class Phenotyper(mock_numpy_interface.NumpyArrayInterface):
             ),
         )
 
-        curves_in_completed_plates = 0
         phenotypes_inclusion = self._settings.phenotypes_inclusion
 
         if phenotypes_inclusion is not PhenotypeDataType.Trusted:
@@ -1044,125 +993,40 @@ class Phenotyper(mock_numpy_interface.NumpyArrayInterface):
                 " It is your responsibility to verify the validity of those phenotypes!"  # noqa: E501
             )
 
-        for id_plate, plate in enumerate(self._state.smooth_growth_data):
+        for plate in self._state.smooth_growth_data:
             if plate is None:
                 all_phenotypes.append(None)
                 all_vector_phenotypes.append(None)
                 all_vector_meta_phenotypes.append(None)
                 continue
 
-            plate_flat_regression_strided = (
-                self._get_plate_linear_regression_strided(plate)
+            phenotypes, vector_phenotypes = get_empty_phenotypes(
+                plate.shape[:2],
+                phenotypes_inclusion,
             )
-
-            phenotypes = {
-                p: np.zeros(plate.shape[:2], dtype=float) * np.nan
-                for p in Phenotypes if phenotypes_inclusion(p)}
-
-            plate_size = np.prod(plate.shape[:2])
-            self._logger.info("Plate {0} has {1} curves".format(
-                id_plate + 1,
-                plate_size,
-            ))
-
-            vector_phenotypes = {
-                p: np.zeros(plate.shape[:2], dtype=object) * np.nan
-                for p in VectorPhenotypes if phenotypes_inclusion(p)
-            }
-            vector_meta_phenotypes = {}
-
             all_phenotypes.append(phenotypes)
             all_vector_phenotypes.append(vector_phenotypes)
-            all_vector_meta_phenotypes.append(vector_meta_phenotypes)
+            all_vector_meta_phenotypes.append({})
 
-            for pos_index, pos_data in enumerate(
-                plate_flat_regression_strided,
-            ):
-                id1 = pos_index % plate.shape[1]
-                id0 = pos_index // plate.shape[1]
-
-                curve_data = get_preprocessed_data_for_phenotypes(
-                    curve=plate[id0, id1],
-                    curve_strided=pos_data,
-                    flat_times=flat_times,
-                    times_strided=times_strided,
-                    index_for_48h=index_for_48h,
-                    position_offset=position_offset,
-                )
-
-                curve_has_data = True
-
-                if curve_data['curve_smooth_growth_data'].mask.all():
-
-                    self._logger.warning(
-                        "Position ({0}, {1}) on plate {2} seems void of data".format(  # noqa: E501
-                            id0,
-                            id1,
-                            id_plate + 1,
-                        ),
-                    )
-                    curve_has_data = False
-
-                else:
-                    for phenotype in Phenotypes:
-                        if not phenotypes_inclusion(phenotype):
-                            continue
-
-                        if PhenotypeDataType.Scalar(phenotype):
-                            phenotypes[phenotype][id0, id1] = phenotype(
-                                **curve_data,
-                            )
-
-                if (
-                    curve_has_data
-                    and (
-                        phenotypes_inclusion(
-                            VectorPhenotypes.PhasesClassifications,
-                        )
-                        or phenotypes_inclusion(
-                            VectorPhenotypes.PhasesPhenotypes,
-                        )
-                    )
-                ):
-
-                    phases, phases_phenotypes = get_phase_analysis(
-                        self,
-                        id_plate,
-                        (id0, id1),
-                        experiment_doublings=phenotypes[
-                            Phenotypes.ExperimentPopulationDoublings
-                        ][id0, id1]
-                    )
-
-                    if phenotypes_inclusion(
-                        VectorPhenotypes.PhasesClassifications,
-                    ):
-                        vector_phenotypes[
-                            VectorPhenotypes.PhasesClassifications
-                        ][id0, id1] = phases
-                    if phenotypes_inclusion(
-                        VectorPhenotypes.PhasesPhenotypes,
-                    ):
-                        vector_phenotypes[
-                            VectorPhenotypes.PhasesPhenotypes
-                        ][id0, id1] = phases_phenotypes
-
-                if id1 == 0:
-
-                    self._logger.debug("Done plate {0} pos {1} {2}".format(
-                        id_plate,
-                        id0,
-                        id1,
-                    ))
-
-                    self._logger.info("Plate {1} growth phenotypes {0:.1f}% done".format(  # noqa: E501
-                        100.0 * (pos_index + 1.0) / plate_size,
-                        id_plate + 1,
-                    ))
+        if workers > 1:
+            curves_done = self._iterate_curve_phenotypes_in_workers(
+                workers,
+                all_phenotypes,
+                all_vector_phenotypes,
+            )
+        else:
+            curves_done = self._iterate_curve_phenotypes(
+                all_phenotypes,
+                all_vector_phenotypes,
+            )
+        for curves in curves_done:
+            yield curves / total_curves
 
-                    yield (
-                        curves_in_completed_plates + pos_index + 1.0
-                    ) / total_curves
+        for id_plate, vector_meta_phenotypes in enumerate(
+            all_vector_meta_phenotypes,
+        ):
+            if vector_meta_phenotypes is None:
+                continue
 
             for phenotype in CurvePhaseMetaPhenotypes:
 
@@ -1184,9 +1048,11 @@ class Phenotyper(mock_numpy_interface.NumpyArrayInterface):
                     continue
 
                 phenotype_data = extract_phenotypes(
-                    vector_phenotypes[VectorPhenotypes.PhasesPhenotypes],
+                    all_vector_phenotypes[id_plate][
+                        VectorPhenotypes.PhasesPhenotypes
+                    ],
                     phenotype,
-                    phenotypes,
+                    all_phenotypes[id_plate],
                 )
 
                 vector_meta_phenotypes[phenotype] = phenotype_data.astype(
@@ -1194,9 +1060,6 @@ class Phenotyper(mock_numpy_interface.NumpyArrayInterface):
                 )
 
             self._logger.info("Plate {0} Done".format(id_plate + 1))
-            curves_in_completed_plates += (
-                0 if plate is None else plate_flat_regression_strided.shape[0]
-            )
 
         self._state.phenotypes = np.array(all_phenotypes)
         self._state.vector_phenotypes = np.array(all_vector_phenotypes)
@@ -1206,23 +1069,107 @@ class Phenotyper(mock_numpy_interface.NumpyArrayInterface):
         self._state.normalized_phenotypes = None
         self._logger.info("Phenotype Extraction Done")
 
-    def _get_plate_linear_regression_strided(self, plate):
-        if plate is None:
-            return None
+    def _iterate_curve_phenotypes(
+        self,
+        all_phenotypes: list,
+        all_vector_phenotypes: list,
+    ) -> Generator[int, None, None]:
+        """Extract the curve phenotypes of all plates, one row at a time
 
-        return np.lib.stride_tricks.as_strided(
-            plate,
-            shape=(
-                plate.shape[0] * plate.shape[1],
-                plate.shape[2] - (self._settings.linear_regression_size - 1),
-                self._settings.linear_regression_size,
-            ),
-            strides=(
-                plate.strides[1],
-                plate.strides[2],
-                plate.strides[2],
-            ),
-        )
+        Yields:
+            The number of curves done
+        """
+        assert self._state.smooth_growth_data is not None
+        assert self._state.times_data is not None
+        curves_in_completed_plates = 0
+        for id_plate, plate in enumerate(self._state.smooth_growth_data):
+            if plate is None:
+                continue
+
+            plate_size = np.prod(plate.shape[:2])
+            self._logger.info("Plate {0} has {1} curves".format(
+                id_plate + 1,
+                plate_size,
+            ))
+
+            for curves in iterate_curve_phenotypes(
+                plate,
+                self._state.times_data,
+                self._settings,
+                (all_phenotypes[id_plate], all_vector_phenotypes[id_plate]),
+                id_plate,
+            ):
+                self._logger.info("Plate {1} growth phenotypes {0:.1f}% done".format(  # noqa: E501
+                    100.0 * curves / plate_size,
+                    id_plate + 1,
+                ))
+                yield curves_in_completed_plates + curves
+
+            curves_in_completed_plates += plate_size
+
+    def _iterate_curve_phenotypes_in_workers(
+        self,
+        workers: int,
+        all_phenotypes: list,
+        all_vector_phenotypes: list,
+    ) -> Generator[int, None, None]:
+        """Extract the curve phenotypes of all plates in worker processes
+
+        Each plate is split into about as many blocks of rows as there are
+        workers. The plates are copied into shared memory once and the
+        workers read their blocks from there.
+
+        Yields:
+            The number of curves done, as blocks complete
+        """
+        assert self._state.smooth_growth_data is not None
+        plates = [
+            (id_plate, plate)
+            for id_plate, plate in enumerate(self._state.smooth_growth_data)
+            if plate is not None
+        ]
+        shared = SharedArrays(sum(plate.nbytes for _, plate in plates))
+        executor: Optional[ProcessPoolExecutor] = None
+        try:
+            shared_plates: dict[int, SharedArray] = {
+                id_plate: shared.add(plate)[1] for id_plate, plate in plates
+            }
+            executor = ProcessPoolExecutor(max_workers=workers)
+            self._logger.info(
+                f"Started {workers} phenotype extraction workers",
+            )
+            blocks: dict[Future, tuple[int, int, int]] = {}
+            columns = {id_plate: plate.shape[1] for id_plate, plate in plates}
+            for id_plate, plate in plates:
+                rows = plate.shape[0]
+                block_rows = -(-rows // workers)
+                for start in range(0, rows, block_rows):
+                    stop = min(start + block_rows, rows)
+                    blocks[executor.submit(
+                        extract_shared_curve_phenotypes,
+                        shared_plates[id_plate],
+                        (start, stop),
+                        self._state.times_data,
+                        self._settings,
+                        id_plate,
+                    )] = (id_plate, start, stop)
+
+            curves_done = 0
+            for future in as_completed(blocks):
+                id_plate, start, stop = blocks[future]
+                phenotypes, vector_phenotypes = future.result()
+                for phenotype, values in phenotypes.items():
+                    all_phenotypes[id_plate][phenotype][start: stop] = values
+                for phenotype, values in vector_phenotypes.items():
+                    all_vector_phenotypes[id_plate][phenotype][
+                        start: stop
+                    ] = values
+                curves_done += (stop - start) * columns[id_plate]
+                yield curves_done
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            shared.release()
 
     def add_phenotype_to_normalization(
         self,
@@ -1579,15 +1526,10 @@ class Phenotyper(mock_numpy_interface.NumpyArrayInterface):
         )
 
     def get_derivative(self, plate, position):
-        return get_derivative(
-            self._get_plate_linear_regression_strided(
-                self.smooth_growth_data[plate][position].reshape(
-                    1,
-                    1,
-                    self.times.size,
-                ),
-            )[0],
-            self.times_strided,
+        return get_derivatives(
+            self.smooth_growth_data[plate][position],
+            self.times,
+            self._settings.linear_regression_size,
         )[0]
 
     def get_chapman_richards_data(
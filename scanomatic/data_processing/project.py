@@ -64,6 +64,9 @@ def get_project_dates(directory_path):
         directory_path,
         _p.image_analysis_img_data.format("*"),
     ))
+    growth_data_path = os.path.join(directory_path, _p.growth_data)
+    if os.path.isfile(growth_data_path):
+        image_data_files.append(growth_data_path)
     if image_data_files:
         analysis_date = max(most_recent(os.stat(p)) for p in image_data_files)
     try:
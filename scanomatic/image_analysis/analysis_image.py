@@ -1,7 +1,7 @@
 import os
-from subprocess import call
-from threading import Thread
-from time import sleep
+import pickle
+from collections.abc import Collection
+from typing import Optional
 
 import numpy as np
 
@@ -17,11 +17,49 @@ from scanomatic.models.compile_project_model import CompileImageAnalysisModel
 from scanomatic.models.factories.analysis_factories import (
     AnalysisFeaturesFactory
 )
+from scanomatic.models.fixture_models import FixturePlateModel
+from scanomatic.util.analysis import make_grid_preview
+from scanomatic.util.image_ranges import get_image_indices
 
 from . import grid_array
 from .grayscale import get_grayscale
-from .image_basics import load_image_to_numpy
+from .image_basics import Region, load_image_to_numpy
 from .grayscale_detection import is_valid_grayscale
+from .image_prefetch import ImagePrefetcher
+from .plate_analysis_pool import PlateAnalysisPool
+
+_MEGABYTE = 1024 ** 2
+_GRID_DETECTION_TIMEOUT = 600
+_GRAYSCALE_WEIGHTS = (0.299, 0.587, 0.144)
+_GRAYSCALE_FIXED_BITS = 14
+_GRAYSCALE_FIXED_WEIGHTS = tuple(
+    int(round(weight * 2 ** _GRAYSCALE_FIXED_BITS))
+    for weight in _GRAYSCALE_WEIGHTS
+)
+_GRAYSCALE_CONVERSION_ROWS = 256
+
+
+def _get_grayscale_image(im: np.ndarray) -> np.ndarray:
+    """Grayscale of color images
+
+    8 bit color images are converted in fixed point integers a few rows at
+    a time into a 16 bit image, since the weights sum to more than one.
+    """
+    if im.ndim != 3:
+        return im
+    if im.dtype != np.uint8:
+        return np.dot(im[..., :3], _GRAYSCALE_WEIGHTS)
+
+    out = np.empty(im.shape[:2], dtype=np.uint16)
+    for start in range(0, im.shape[0], _GRAYSCALE_CONVERSION_ROWS):
+        chunk = im[start: start + _GRAYSCALE_CONVERSION_ROWS]
+        gray = np.zeros(chunk.shape[:2], dtype=np.uint32)
+        for channel, weight in enumerate(_GRAYSCALE_FIXED_WEIGHTS):
+            gray += np.multiply(chunk[..., channel], weight, dtype=np.uint32)
+        gray += 1 << (_GRAYSCALE_FIXED_BITS - 1)
+        gray >>= _GRAYSCALE_FIXED_BITS
+        out[start: start + _GRAYSCALE_CONVERSION_ROWS] = gray
+    return out
 
 
 def _get_init_features(
@@ -59,14 +97,24 @@ class ProjectImage:
         self._logger = get_logger("Analysis Image")
 
         self._im_loaded = False
-        self.im = None
-        self._im_path_as_requested = None
+        self.im: Optional[np.ndarray] = None
+        self._im_path_as_requested: Optional[str] = None
 
         self._grid_arrays = self._new_grid_arrays
         self._plate_image_inclusion = self.image_inclusions
 
         self.features = _get_init_features(self._grid_arrays)
 
+        self._analysis_pool: Optional[PlateAnalysisPool] = None
+
+        self._prefetcher: Optional[ImagePrefetcher] = None
+        if analysis_model.prefetch_images > 0:
+            self._prefetcher = ImagePrefetcher(
+                self._prefetch_image,
+                analysis_model.prefetch_images,
+                analysis_model.prefetch_memory_mb * _MEGABYTE,
+            )
+
     @property
     def active_plates(self):
         return len(self._grid_arrays)
@@ -141,44 +189,19 @@ class ProjectImage:
                         ret[i] = all_images
 
                 else:
-                    ret[i] = set()
-                    instruction = (
-                        self._analysis_model.plate_image_inclusion[i]
+                    indices = get_image_indices(
+                        self._analysis_model.plate_image_inclusion[i],
+                        highest_index_plus_one,
                     )
-                    instruction = [
-                        [val.strip() for val in part.strip().split("-")]
-                        for part in instruction.split(",")
-                    ]
-
-                    if not all(len(part) == 2 for part in instruction):
+                    if indices is None:
                         self._logger.error(
                             "Malformed plate inclusion settings: '{0}'".format(
                                 self._analysis_model.plate_image_inclusion[i]
                             )
                             + " Plate excluded from analysis"
                         )
-
-                        continue
-
-                    try:
-                        instruction = [
-                            (
-                                int(start) if start else 0, int(end) + 1
-                                if end else highest_index_plus_one
-                            )
-                            for start, end in instruction
-                        ]
-                    except ValueError:
-                        self._logger.error(
-                            "Plate inclusion setting contains non-ints {0}".format(  # noqa: E501
-                                instruction
-                            )
-                            + " Plate excluded from analysis"
-                        )
-                        continue
-
-                    for start, end in instruction:
-                        ret[i].update(list(range(start, end)))
+                        indices = set()
+                    ret[i] = indices
 
             return ret
 
@@ -220,11 +243,20 @@ class ProjectImage:
             self._logger.critical("No image model to grid on")
             return False
 
-        self.load_image(image_model.image.path)
+        self.load_image(
+            image_model.image.path,
+            regions=self._get_plate_regions(image_model),
+        )
 
         if self._im_loaded:
 
-            threads = set()
+            sections: dict[int, np.ndarray] = {}
+            detection_sections: dict[int, np.ndarray] = {}
+            if self._use_analysis_pool:
+                pool = self._get_analysis_pool()
+                pool.release_grid_arrays(plate_indices)
+                assert self.im is not None
+                self.im = pool.share_image(self.im)
 
             self._logger.info(
                 "Setting grids for plates {0} using image index {1}".format(
@@ -263,6 +295,7 @@ class ProjectImage:
                     )
                     continue
 
+                sections[index] = im
                 if (
                     self._analysis_model.grid_model.gridding_offsets
                     is not None
@@ -309,40 +342,17 @@ class ProjectImage:
 
                 else:
 
-                    t = Thread(
-                        target=self._grid_arrays[index].detect_grid,
-                        args=(im,),
-                        kwargs={
-                            "analysis_directory": (
-                                self._analysis_model.output_directory
-                            ),
-                        },
-                    )
-                    t.start()
-                    threads.add(t)
+                    detection_sections[index] = im
 
-            while threads:
-                threads = set(t for t in threads if t.is_alive())
-                sleep(0.01)
+            self._detect_grids(detection_sections)
 
             self._logger.info(
-                "Producing grid images for plates {0} based on image {1} and compilation '{2}'".format(  # noqa: E501
+                "Producing grid images for plates {0} based on image {1}".format(  # noqa: E501
                     plate_indices,
                     image_model.image.path,
-                    self._analysis_model.compilation,
                 ),
             )
-
-            call([
-                "python",
-                "-c",
-                "from scanomatic.util.analysis import produce_grid_images;"
-                " produce_grid_images('{0}', plates={1}, compilation='{2}')".format(  # noqa: E501
-                    self._analysis_model.output_directory,
-                    plate_indices,
-                    self._analysis_model.compilation,
-                ),
-            ])
+            self._write_grid_images(sections)
         else:
 
             self._logger.warning(
@@ -353,26 +363,136 @@ class ProjectImage:
 
         return True
 
-    def load_image(self, path):
+    def _detect_grids(self, sections: dict[int, np.ndarray]) -> None:
+        """Detect the grids of plates
+
+        With a plate analysis pool the plates are gridded in its workers,
+        else one at a time. Plates where detection raises or times out
+        keep their current grid arrays.
+
+        :param sections: The plate image section per plate index
+        """
+        if not sections:
+            return
+
+        if self._use_analysis_pool:
+            gridded = self._get_analysis_pool().detect_grids(
+                self._grid_arrays,
+                sections,
+                self._analysis_model.output_directory,
+                _GRID_DETECTION_TIMEOUT,
+            )
+            for index, grid_arr in gridded.items():
+                grid_arr.set_analysis_model(self._analysis_model)
+                self._grid_arrays[index] = grid_arr
+            self.features = _get_init_features(self._grid_arrays)
+            return
+
+        for index, im in sections.items():
+            try:
+                self._grid_arrays[index].detect_grid(
+                    im,
+                    analysis_directory=self._analysis_model.output_directory,
+                )
+            except Exception:
+                self._logger.exception(
+                    f"Grid detection on plate {index + 1} failed",
+                )
+
+    def _write_grid_images(self, sections: dict[int, np.ndarray]) -> None:
+        for index, im in sections.items():
+            path = os.path.join(
+                self._analysis_model.output_directory,
+                Paths().experiment_grid_image_pattern.format(index + 1),
+            )
+            try:
+                make_grid_preview(
+                    im,
+                    self._grid_arrays[index].analysis_grid,
+                    path,
+                )
+            except (IOError, ValueError):
+                self._logger.exception(
+                    f"Could not write grid image for plate {index + 1}",
+                )
+
+    def _get_plate_regions(
+        self,
+        image_model: CompileImageAnalysisModel,
+    ) -> list[Region]:
+        """The portrait image row and column slices of the analysed plates
+
+        The same regions are used for all plates of an image so it is only
+        loaded once.
+        """
+        regions = []
+        for plate in image_model.fixture.plates:
+            if plate.index not in self._grid_arrays:
+                continue
+            x = sorted((plate.x1, plate.x2))
+            y = sorted((plate.y1, plate.y2))
+            regions.append((
+                slice(max(0, int(np.floor(y[0]))), int(np.ceil(y[1])) + 1),
+                slice(max(0, int(np.floor(x[0]))), int(np.ceil(x[1])) + 1),
+            ))
+        return regions
+
+    def load_image(self, path: str, regions: Optional[list[Region]] = None):
+        """Load the image to analyse
+
+        :param path: Path to the image
+        :param regions: If given only these parts of the image are read
+            from file, images from the prefetcher are always complete.
+        """
         if path == self._im_path_as_requested:
             self._logger.info("Image was already loaded")
             return
 
+        im = None
+        if self._prefetcher is not None:
+            im = self._prefetcher.get(path)
+
+        if im is not None:
+
+            self.im = im
+            self._im_loaded = True
+
+        else:
+            self._load_image_from_file(path, regions)
+
+        if self._im_loaded:
+            self._logger.info("Image loaded")
+            self._im_path_as_requested = path
+        else:
+            self._logger.error("Failed to load image")
+
+        self.validate_rotation()
+        self._convert_to_grayscale()
+
+    def _get_alternative_path(self, path: str) -> str:
+        return os.path.join(
+            os.path.dirname(self._analysis_model.compilation),
+            os.path.basename(path),
+        )
+
+    def _load_image_from_file(
+        self,
+        path: str,
+        regions: Optional[list[Region]] = None,
+    ):
         try:
 
             self.im = load_image_to_numpy(
                 path,
                 IMAGE_ROTATIONS.Portrait,
                 dtype=np.uint8,
+                regions=regions,
             )
             self._im_loaded = True
 
         except (TypeError, IOError):
 
-            alt_path = os.path.join(
-                os.path.dirname(self._analysis_model.compilation),
-                os.path.basename(path),
-            )
+            alt_path = self._get_alternative_path(path)
 
             self._logger.warning(
                 "Failed to load image at '{0}', trying '{1}'.".format(
@@ -386,6 +506,7 @@ class ProjectImage:
                     alt_path,
                     IMAGE_ROTATIONS.Portrait,
                     dtype=np.uint8,
+                    regions=regions,
                 )
                 self._im_loaded = True
 
@@ -393,18 +514,32 @@ class ProjectImage:
 
                 self._im_loaded = False
 
-        if self._im_loaded:
-            self._logger.info("Image loaded")
-            self._im_path_as_requested = path
-        else:
-            self._logger.error("Failed to load image")
+    def _prefetch_image(self, path: str) -> Optional[np.ndarray]:
+        for image_path in (path, self._get_alternative_path(path)):
+            try:
+                return _get_grayscale_image(load_image_to_numpy(
+                    image_path,
+                    IMAGE_ROTATIONS.Portrait,
+                    dtype=np.uint8,
+                ))
+            except (TypeError, IOError):
+                pass
+        return None
 
-        self.validate_rotation()
-        self._convert_to_grayscale()
+    def _prefetch_upcoming_images(self):
+        if self._prefetcher is None:
+            return
+
+        self._prefetcher.prefetch(
+            image_model.image.path for image_model in
+            self._first_pass_results.get_upcoming_image_models(
+                self._analysis_model.prefetch_images,
+            )
+            if image_model.image is not None
+        )
 
     def _convert_to_grayscale(self):
-        if self.im.ndim == 3:
-            self.im = np.dot(self.im[..., :3], [0.299, 0.587, 0.144])
+        self.im = _get_grayscale_image(self.im)
 
     def validate_rotation(self):
 
@@ -496,8 +631,12 @@ class ProjectImage:
             grid_arr.clear_features()
 
     def analyse(self, image_model: CompileImageAnalysisModel):
-        self.load_image(image_model.image.path)
+        self.load_image(
+            image_model.image.path,
+            regions=self._get_plate_regions(image_model),
+        )
         self._logger.info("Image loaded")
+        self._prefetch_upcoming_images()
         if self._im_loaded is False:
             self.clear_features()
             return
@@ -515,7 +654,7 @@ class ProjectImage:
 
         self.features.index = image_model.image.index
         grid_arrays_processed = set()
-        # threads = set()
+        pooled_plates = {}
         for plate in image_model.fixture.plates:
 
             if plate.index in self._grid_arrays:
@@ -536,18 +675,17 @@ class ProjectImage:
                     self.set_grid_plates([plate.index], image_model)
 
                 grid_arrays_processed.add(plate.index)
+                if self._use_analysis_pool:
+                    pooled_plates[plate.index] = plate
+                    continue
+
                 im = self.get_im_section(plate)
                 grid_arr = self._grid_arrays[plate.index]
                 grid_arr.analyse(im, image_model)
-                """
-                t = Thread(target=grid_arr.analyse, args=(im, image_model))
-                t.start()
-                threads.add(t)
-
-        while threads:
-            threads = set(t for t in threads if t.is_alive())
-            sleep(0.01)
-        """
+
+        if pooled_plates:
+            self._analyse_in_pool(pooled_plates, image_model)
+
         for index, grid_arr in self._grid_arrays.items():
             if index not in grid_arrays_processed:
                 grid_arr.clear_features()
@@ -555,3 +693,144 @@ class ProjectImage:
         self._logger.info(
             "Image {0} processed".format(image_model.image.index),
         )
+
+    @property
+    def _use_analysis_pool(self) -> bool:
+        return self._analysis_model.plate_workers > 1 and self.active_plates > 1
+
+    def _get_analysis_pool(self) -> PlateAnalysisPool:
+        if self._analysis_pool is None:
+            self._analysis_pool = PlateAnalysisPool(
+                min(self._analysis_model.plate_workers, self.active_plates),
+            )
+        return self._analysis_pool
+
+    def _analyse_in_pool(
+        self,
+        plates: dict[int, FixturePlateModel],
+        image_model: CompileImageAnalysisModel,
+    ):
+        pool = self._get_analysis_pool()
+        assert self.im is not None
+        self.im = pool.share_image(self.im)
+        for index in plates:
+            if not pool.holds_grid_array(index):
+                pool.set_grid_array(self._grid_arrays[index])
+
+        plates_features = pool.analyse(
+            {
+                index: self.get_im_section(plate_model)
+                for index, plate_model in plates.items()
+            },
+            image_model,
+        )
+        for index, plate_features in plates_features.items():
+            self._grid_arrays[index].set_features(plate_features)
+
+    def _get_current_grid_arrays(self) -> dict[int, grid_array.GridArray]:
+        grid_arrays = dict(self._grid_arrays)
+        if self._analysis_pool is not None:
+            for index in self._grid_arrays:
+                if not self._analysis_pool.holds_grid_array(index):
+                    continue
+                pooled = self._analysis_pool.get_grid_array(index)
+                if pooled is not None:
+                    grid_arrays[index] = pooled
+        return grid_arrays
+
+    def is_gridding_image_compiled(self) -> bool:
+        """If the image the plates should be gridded on has been compiled
+
+        Without explicit grid images, plates are gridded on the last image
+        of the experiment, which isn't known to be compiled before the
+        experiment is done.
+        """
+        if self._analysis_model.plate_image_inclusion is not None:
+            return True
+        if self._analysis_model.grid_images:
+            return (
+                max(self._analysis_model.grid_images)
+                < len(self._first_pass_results)
+            )
+        return False
+
+    def save_state(self, path: str, image_indices: Collection[int]):
+        """Store the grids and analysis history of all plates
+
+        The grids are only reused when continuing the analysis if they were
+        made on the image the plates should be gridded on.
+
+        :param path: The file to store the state in
+        :param image_indices: The images that have been analysed
+        """
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'wb') as fh:
+            pickle.dump(
+                (
+                    self._get_current_grid_arrays(),
+                    sorted(image_indices),
+                    self.is_gridding_image_compiled(),
+                ),
+                fh,
+            )
+        os.replace(temporary_path, path)
+        self._logger.info(
+            f"Saved analysis state of {len(image_indices)} images to {path}",
+        )
+
+    def load_state(self, path: str) -> Optional[tuple[set[int], bool]]:
+        """Continue from an analysis state stored by `save_state`
+
+        :param path: The file with the state
+        :return: The images that have been analysed and if the stored grids
+            were used, or None if no state could be loaded. When the grids
+            weren't used the plates need to be gridded again. A final
+            analysis, followed by feature extraction, doesn't continue from
+            such a state, as the images analysed would keep being measured on
+            other grids than the rest.
+        """
+        try:
+            with open(path, 'rb') as fh:
+                grid_arrays, image_indices, *final_grids = pickle.load(fh)
+        except (IOError, EOFError, pickle.UnpicklingError, ValueError):
+            self._logger.warning(f"Could not load analysis state from {path}")
+            return None
+
+        # States stored without the flag always kept their grids
+        if final_grids and not final_grids[0]:
+            if self._analysis_model.chain:
+                self._logger.info(
+                    f"Analysing all images again, since the grids stored in"
+                    f" {path} weren't made on the gridding image",
+                )
+                return None
+            self._logger.info(
+                f"Resuming analysis after {len(image_indices)} images from"
+                f" {path}, but the stored grids weren't made on the gridding"
+                " image",
+            )
+            return set(image_indices), False
+
+        for index, grid_arr in grid_arrays.items():
+            if index in self._grid_arrays:
+                grid_arr.set_analysis_model(self._analysis_model)
+                self._grid_arrays[index] = grid_arr
+        if self._analysis_pool is not None:
+            self._analysis_pool.release_grid_arrays(grid_arrays)
+        self.features = _get_init_features(self._grid_arrays)
+        self._logger.info(
+            f"Resuming analysis after {len(image_indices)} images from {path}",
+        )
+        return set(image_indices), True
+
+    def close(self):
+        """Stops any worker processes and threads used for the analysis"""
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+            self._prefetcher = None
+        if self._analysis_pool is not None:
+            self.im = None
+            self._im_loaded = False
+            self._im_path_as_requested = None
+            self._analysis_pool.close()
+            self._analysis_pool = None
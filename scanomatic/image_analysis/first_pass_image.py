@@ -1,8 +1,8 @@
-import itertools
 import time
-from typing import Any, Union
+from typing import Any, Optional, Union
 
 import numpy as np
+from scipy.optimize import linear_sum_assignment  # type: ignore
 
 from scanomatic.data_processing.calibration import get_image_json_from_ccc
 from scanomatic.image_analysis.grayscale import get_grayscale
@@ -44,6 +44,51 @@ def get_image_scale(im):
         return invalid_scale
 
 
+def _get_distances(positions: np.ndarray) -> np.ndarray:
+    return np.linalg.norm(positions[:, None] - positions[None], axis=-1)
+
+
+def get_marker_order(
+    positions: np.ndarray,
+    reference_positions: np.ndarray,
+) -> tuple[np.ndarray, float]:
+    """Match detected markers to the reference markers
+
+    Each marker is described by its sorted distances to the other markers,
+    which stay the same if the fixture is moved or rotated. For every
+    reference distance the closest distance of a detected marker counts, so
+    surplus detections don't spoil the description of the real markers. The
+    detected markers are then assigned to reference markers so that the
+    total difference of the descriptions is the smallest, leaving surplus
+    detections unassigned.
+
+    :param positions: The n detected marker positions as rows of x and y
+    :param reference_positions: The m reference marker positions, m <= n
+    :return: The indices of the detected markers in the order of the
+        reference markers, and the root mean square difference between
+        the distances of the assigned markers and of the reference markers.
+    """
+    distances = _get_distances(positions)
+    reference_distances = _get_distances(reference_positions)
+
+    # The smallest distance of each marker is to itself
+    signatures = np.sort(distances, axis=1)[:, 1:]
+    reference_signatures = np.sort(reference_distances, axis=1)[:, 1:]
+    costs = np.abs(
+        signatures[:, None, :, None] - reference_signatures[None, :, None, :]
+    ).min(axis=2).sum(axis=2)
+
+    markers, reference_markers = linear_sum_assignment(costs)
+    order = markers[np.argsort(reference_markers)]
+
+    n_references = len(reference_positions)
+    residuals = distances[np.ix_(order, order)] - reference_distances
+    error = np.sqrt(
+        (residuals ** 2).sum() / max(n_references * (n_references - 1), 1),
+    )
+    return order, float(error)
+
+
 # def _get_rotated_vector(x, y, rotation):
 #    return x * np.cos(rotation), y * np.sin(rotation)
 
@@ -79,6 +124,7 @@ class FixtureImage:
     MARKER_DETECTION_DPI = 150
     EXPECTED_IM_SIZE = (6000, 4800)
     EXPECTED_IM_DPI = 600
+    MAX_MARKER_DISTANCE_ERROR = 10
 
     def __init__(
         self,
@@ -269,6 +315,7 @@ class FixtureImage:
             image=analysis_img,
             pattern_image_path=self["reference"].get_marker_path(),
             scale=scale_factor,
+            offset=image_basics.get_scale_offset(scale_factor),
         )
 
         (
@@ -286,47 +333,64 @@ class FixtureImage:
     def _get_image_in_correct_scale(self, target_dpi):
         if self._original_dpi != target_dpi:
             return image_basics.Quick_Scale_To_im(
+                path=self.im_path,
                 im=self.im,
                 scale=self.get_dpi_factor_to_target(target_dpi),
             )
 
         return self.im
 
-    def _set_current_mark_order(self):
-        x_centered, y_centered = self._get_centered_mark_positions(
-            "current",
-        )
-        x_centered_ref, y_centered_ref = self._get_centered_mark_positions(
-            "reference",
-        )
+    def _set_current_mark_order(self) -> Optional[float]:
+        """Order the current markers as the reference markers
 
-        if all(
-            o is not None and o.size > 0 for o in
-            (x_centered, y_centered, x_centered_ref, y_centered_ref)
-        ):
-            length = np.sqrt(x_centered ** 2 + y_centered ** 2)
-            length_ref = np.sqrt(x_centered_ref ** 2 + y_centered_ref ** 2)
-            sort_order, sort_error = self._get_sort_order(length, length_ref)
-
-            self._logger.debug(
-                "Found sort order that matches the reference {0} (error {1})".format(  # noqa: E501
-                    sort_order,
-                    sort_error,
-                ),
-            )
-            self.__set_current_mark_order(sort_order)
+        Surplus current markers are dropped.
 
-        else:
+        :return: The root mean square difference in pixels between the
+            distances of the current and of the reference markers, None if
+            there are too few current markers.
+        """
+        positions = self._get_mark_positions("current")
+        reference_positions = self._get_mark_positions("reference")
+
+        if (
+            positions is None
+            or reference_positions is None
+            or len(reference_positions) == 0
+            or len(positions) < len(reference_positions)
+        ):
             self._logger.critical("Missmatch in number of markings!")
+            return None
 
-    def __set_current_mark_order(self, sort_order):
-        current_model = self["current"].model
-        current_model.orientation_marks_x = (
-            current_model.orientation_marks_x[sort_order]
+        sort_order, sort_error = get_marker_order(
+            positions,
+            reference_positions,
         )
-        current_model.orientation_marks_y = (
-            current_model.orientation_marks_y[sort_order]
+        self._logger.debug(
+            "Found sort order that matches the reference {0} (error {1})".format(  # noqa: E501
+                sort_order,
+                sort_error,
+            ),
         )
+        self.__set_current_mark_order(sort_order)
+        return sort_error
+
+    def __set_current_mark_order(self, sort_order):
+        current_model = self["current"].model
+        current_model.orientation_marks_x = np.asarray(
+            current_model.orientation_marks_x,
+        )[sort_order]
+        current_model.orientation_marks_y = np.asarray(
+            current_model.orientation_marks_y,
+        )[sort_order]
+
+    def _get_mark_positions(self, source="current") -> Optional[np.ndarray]:
+        x_positions = self[source].model.orientation_marks_x
+        y_positions = self[source].model.orientation_marks_y
+
+        if x_positions is None or y_positions is None:
+            return None
+
+        return np.column_stack((x_positions, y_positions)).astype(float)
 
     def _get_centered_mark_positions(self, source="current"):
         x_positions = self[source].model.orientation_marks_x
@@ -346,25 +410,6 @@ class FixtureImage:
 
         return x_centered, y_centered
 
-    @staticmethod
-    def _get_sort_order(length, reference_length):
-        s = list(range(len(length)))
-
-        length_deltas = []
-        sort_orders = []
-        for sort_order in itertools.permutations(s):
-
-            length_deltas.append(
-                (length[list(sort_order)] - reference_length) ** 2,
-            )
-            sort_orders.append(sort_order)
-
-        length_deltas = np.array(length_deltas).sum(1)
-        return (
-            list(sort_orders[length_deltas.argmin()]),
-            np.sqrt(length_deltas.min()),
-        )
-
     def _get_rotation(self):
         x_centered, y_centered = self._get_centered_mark_positions("current")
         x_centered_ref, y_centered_ref = self._get_centered_mark_positions(
@@ -494,7 +539,12 @@ class FixtureImage:
         :param issues: reported issues
         """
 
-        self._set_current_mark_order()
+        marker_error = self._set_current_mark_order()
+        if (
+            marker_error is not None
+            and marker_error > self.MAX_MARKER_DISTANCE_ERROR
+        ):
+            issues['markers'] = marker_error
         offset = self._get_offset()
         rotation = self._get_rotation()
         if abs(rotation) > 0.05:
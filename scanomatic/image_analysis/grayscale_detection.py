@@ -2,9 +2,7 @@ import os
 from typing import Optional
 
 import numpy as np
-from numpy.lib.stride_tricks import as_strided
 from scipy.ndimage import gaussian_filter1d  # type: ignore
-from scipy.signal import convolve2d  # type: ignore
 
 from scanomatic.generics.maths import mid50_mean as iqr_mean
 from scanomatic.io.logger import get_logger
@@ -34,24 +32,61 @@ DEBUG_DETECTION = False
 _logger = get_logger("Analyze Grayscale")
 
 
+def _get_window_sums(im: np.ndarray, size: int) -> np.ndarray:
+    """Sums of all windows of `size` along the first axis"""
+    cumulative = np.zeros((im.shape[0] + 1,) + im.shape[1:])
+    np.cumsum(im, axis=0, out=cumulative[1:])
+    return cumulative[size:] - cumulative[:-size]
+
+
 def get_ortho_trimmed_slice(
     im: np.ndarray,
     grayscale: Grayscale,
 ) -> np.ndarray:
     half_width = grayscale.width / 2
     im_scaled: np.ndarray = im / im.max() - 0.5
-    kernel = np.array(grayscale.targets).repeat(int(grayscale.length))
-    kernel = kernel.reshape((kernel.size, 1))
-    if kernel.size > im.shape[0]:
+    segment_length = int(grayscale.length)
+    targets = np.array(grayscale.targets, dtype=float)
+    if targets.size * segment_length > im.shape[0]:
         return np.array([])
 
-    kernel_scaled: np.ndarray = kernel / kernel.max() - 0.5
-    detection = np.abs(convolve2d(im_scaled, kernel_scaled, mode="valid"))
+    # The kernel is the targets each repeated over a segment length, so the
+    # valid convolution along the strip is a weighted sum of the window sums
+    # of the segments. Convolution flips the kernel, hence the reversed
+    # targets.
+    targets_scaled = targets / targets.max() - 0.5
+    window_sums = _get_window_sums(im_scaled, segment_length)
+    length = im.shape[0] - targets.size * segment_length + 1
+    detection = np.zeros((length, im.shape[1]))
+    for segment, value in enumerate(targets_scaled[::-1]):
+        start = segment * segment_length
+        detection += value * window_sums[start: start + length]
+    np.abs(detection, out=detection)
     peak = gaussian_filter1d(np.max(detection, axis=0), half_width).argmax()
 
     return im[:, int(round(peak - half_width)): int(round(peak + half_width))]
 
 
+def _get_local_variances(
+    im: np.ndarray,
+    kernel_size: tuple[int, int],
+) -> np.ndarray:
+    """Variances of all windows of `kernel_size` in the image"""
+    # Variance doesn't depend on the mean, removing it keeps the window sums
+    # of squares small and precise.
+    centered = im - im.mean()
+    size = kernel_size[0] * kernel_size[1]
+    sums = _get_window_sums(
+        _get_window_sums(centered, kernel_size[0]).T,
+        kernel_size[1],
+    ).T
+    squared_sums = _get_window_sums(
+        _get_window_sums(centered ** 2, kernel_size[0]).T,
+        kernel_size[1],
+    ).T
+    return np.clip(squared_sums / size - (sums / size) ** 2, 0, None)
+
+
 def get_para_trimmed_slice(
     im_ortho_trimmed: np.ndarray,
     grayscale: Grayscale,
@@ -63,23 +98,15 @@ def get_para_trimmed_slice(
     # Restructures the image so that local variances can be measured using a
     # kernel the scaled (default 0.7) size of the segment size
 
-    kernel_size = tuple(
-        int(kernel_part_of_segment * v) for v in
-        (grayscale.length, grayscale.width)
+    kernel_size = (
+        int(kernel_part_of_segment * grayscale.length),
+        int(kernel_part_of_segment * grayscale.width),
     )
 
-    try:
-        strided_im = as_strided(
-            im_ortho_trimmed,
-            shape=(
-                im_ortho_trimmed.shape[0] - kernel_size[0] + 1,
-                im_ortho_trimmed.shape[1] - kernel_size[1] + 1,
-                kernel_size[0],
-                kernel_size[1],
-            ),
-            strides=im_ortho_trimmed.strides * 2,
-        )
-    except ValueError:
+    if any(
+        size > axis_size + 1
+        for size, axis_size in zip(kernel_size, im_ortho_trimmed.shape)
+    ):
         _logger.error(
             "Failed to stride image, try making a larger selection around the grayscale on the fixture.",  # noqa: E501
         )
@@ -89,7 +116,7 @@ def get_para_trimmed_slice(
     # im_ortho_trimmed
 
     ortho_signal = np.median(
-        np.var(strided_im, axis=(-1, -2)),
+        _get_local_variances(im_ortho_trimmed, kernel_size),
         axis=1,
     ) / sum(kernel_size)
 
@@ -100,47 +127,31 @@ def get_para_trimmed_slice(
     permissible_positions: np.ndarray = ortho_signal < permissibility_threshold
     # Selects the best stretch of permissible signal (True) compared to the
     # expected length of the grayscale
+    length = grayscale.sections * grayscale.length
+    changes = np.diff(np.concatenate((
+        [0],
+        permissible_positions.astype(np.int8),
+        [0],
+    )))
+    section_starts = np.flatnonzero(changes == 1)
+    section_ends = np.flatnonzero(changes == -1)
+
+    # The difference of the observed length compared to the exepected
+    # is divided with the expected. It is practically impossible due
+    # to restraints on size of area checked for grayscale that the
+    # delta is larger than the expected length. For that reason the
+    # division will be in the range 0 - 1 with better precision being
+    # close to 0. Accuracy will therefore be close to 1 if the fit is
+    # good.
+    accuracies = 1 - np.abs(section_ends - section_starts - length) / length
     acceptable_placement = None
     placement_accuracy = 0.
-    in_section = False
-    section_start = 0
-    length = grayscale.sections * grayscale.length
-
-    for i, val in enumerate(permissible_positions):
-        if in_section and not val:
-            in_section = False
-            # The difference of the observed length compared to the exepected
-            # is divided with the expected. It is practically impossible due
-            # to restraints on size of area checked for grayscale that the
-            # delta is larger than the expected length. For that reason the
-            # division will be in the range 0 - 1 with better precision being
-            # close to 0. Accuracy will therefore be close to 1 if the fit is
-            # good.
-            accuracy = 1 - abs(i - section_start - length) / length
-            if accuracy > placement_accuracy:
-                placement_accuracy = accuracy
-                acceptable_placement_length = i - 1 - section_start
-                acceptable_placement = int(
-                    acceptable_placement_length / 2
-                ) + section_start
-        elif not in_section and val:
-            in_section = True
-            section_start = i
-
-    if in_section:
-        # This only repeats above code in the loop but covers the case that
-        # the segment ends with a permissible area.
-        accuracy = 1 - abs(
-            permissible_positions.size - section_start - length
-        ) / length
-        if accuracy > placement_accuracy:
-            placement_accuracy = accuracy
-            acceptable_placement_length = (
-                permissible_positions.size - 1 - section_start
-            )
-            acceptable_placement = int(
-                acceptable_placement_length / 2
-            ) + section_start
+    if accuracies.size and accuracies.max() > placement_accuracy:
+        best = int(accuracies.argmax())
+        placement_accuracy = accuracies[best]
+        acceptable_placement = int(
+            (section_ends[best] - 1 - section_starts[best]) / 2
+        ) + int(section_starts[best])
 
     if (
         placement_accuracy > acceptability_threshold
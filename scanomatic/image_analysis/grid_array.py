@@ -8,7 +8,11 @@ from scanomatic.io.logger import get_logger
 import scanomatic.io.paths as paths
 from scanomatic.image_analysis.grayscale import get_grayscale
 from scanomatic.io.pickler import safe_load
-from scanomatic.models.analysis_model import IMAGE_ROTATIONS
+from scanomatic.models.analysis_model import (
+    IMAGE_ROTATIONS,
+    AnalysisFeatures,
+    AnalysisModel
+)
 from scanomatic.models.compile_project_model import CompileImageAnalysisModel
 from scanomatic.models.factories.analysis_factories import (
     AnalysisFeaturesFactory
@@ -16,6 +20,7 @@ from scanomatic.models.factories.analysis_factories import (
 
 from . import grid, image_basics
 from .grid_cell import GridCell
+from .grid_cell_batch import GridCellBatch
 
 
 class InvalidGridException(Exception):
@@ -28,14 +33,13 @@ def _analyse_grid_cell(
     transpose_polynomial,
     image_index,
     semaphore=None,
-    analysis_job_model=None
+    analysis_job_model=None,
+    calibration_lookup=None,
 ):
     save_extra_data = grid_cell.save_extra_data
-    source = _get_image_slice(im, grid_cell)
-    grid_cell.source = (
-        source.astype(np.float64) if source is not None else None
-    )
-    if grid_cell.source is None:
+    tile = _get_image_view(im, grid_cell)
+    if tile is None:
+        grid_cell.source = None
         GridArray._LOGGER.error(
             "Tried to analyse grid cell that doesn't have any area",
         )
@@ -45,6 +49,9 @@ def _analyse_grid_cell(
 
     grid_cell.image_index = image_index
 
+    if save_extra_data or calibration_lookup is None:
+        grid_cell.set_source(tile)
+
     if save_extra_data:
         grid_cell.save_data_image(
             suffix=".raw",
@@ -52,7 +59,9 @@ def _analyse_grid_cell(
             if analysis_job_model else None,
         )
 
-    if transpose_polynomial is not None:
+    if calibration_lookup is not None:
+        grid_cell.set_source_lookup(tile, calibration_lookup)
+    elif transpose_polynomial is not None:
         _set_image_transposition(grid_cell, transpose_polynomial)
 
     if save_extra_data:
@@ -87,7 +96,21 @@ def _set_image_transposition(grid_cell, transpose_polynomial):
     grid_cell.source[...] = transpose_polynomial(grid_cell.source)
 
 
-def _get_image_slice(im, grid_cell: Optional[GridCell]):
+def _get_calibration_lookup(
+    im: np.ndarray,
+    transpose_polynomial,
+) -> Optional[np.ndarray]:
+    """Calibrated value of each possible pixel value of 8-bit images."""
+    if im.dtype != np.uint8:
+        return None
+
+    values = np.arange(256, dtype=np.float64)
+    if transpose_polynomial is None:
+        return values
+    return transpose_polynomial(values)
+
+
+def _get_image_view(im, grid_cell: Optional[GridCell]):
     if not grid_cell or im is None:
         return None
 
@@ -95,10 +118,15 @@ def _get_image_slice(im, grid_cell: Optional[GridCell]):
     xy2 = grid_cell.xy2
 
     if xy1 is not None and len(xy1) == 2 and xy2 is not None and len(xy2) == 2:
-        return im[xy1[0]: xy2[0], xy1[1]: xy2[1]].copy()
+        return im[xy1[0]: xy2[0], xy1[1]: xy2[1]]
     return None
 
 
+def _get_image_slice(im, grid_cell: Optional[GridCell]):
+    view = _get_image_view(im, grid_cell)
+    return None if view is None else view.copy()
+
+
 def _create_grid_array_identifier(
     identifier: Union[int, Sequence],
 ) -> Sequence:
@@ -185,6 +213,7 @@ class GridArray:
             data=set(),
         )
         self._first_analysis = True
+        self._grid_cell_batch: Optional[GridCellBatch] = None
 
     def __getitem__(self, item: tuple) -> GridCell:
         return self._grid_cells[item]
@@ -208,6 +237,11 @@ class GridArray:
         """
         return self._grid[:, ::-1, :].tolist()
 
+    @property
+    def analysis_grid(self) -> Optional[np.ndarray]:
+        """Return grid as used in analysis, in plate image coordinates."""
+        return self._grid
+
     @property
     def grid_shape(self):
         return self._grid.shape[1:]
@@ -480,6 +514,7 @@ class GridArray:
         self._grid = None
         self._grid_cell_size = None
         self._grid_cells.clear()
+        self._grid_cell_batch = None
         self._features.data.clear()
 
         focus_position = (
@@ -508,8 +543,21 @@ class GridArray:
                     self._grid_cells[grid_cell.position] = grid_cell
 
     def clear_features(self):
-        for grid_cell in self._grid_cells.values():
-            grid_cell.clear_features()
+        for cell_features in self._features.data:
+            for compartment_features in cell_features.data.values():
+                compartment_features.data.clear()
+
+    def set_analysis_model(self, analysis_model: AnalysisModel):
+        """Use the settings of another analysis, e.g. when resuming the
+        analysis of a stored plate."""
+        self._analysis_model = analysis_model
+
+    def set_features(self, features: AnalysisFeatures):
+        """Use plate features produced by another instance of the plate,
+        e.g. one analysing it in a worker process."""
+        self._features.shape = features.shape
+        self._features.data.clear()
+        self._features.data.update(features.data)
 
     def analyse(self, im, image_model: CompileImageAnalysisModel):
         index = image_model.image.index
@@ -535,6 +583,23 @@ class GridArray:
                 return
 
         m = self._analysis_model
+        calibration_lookup = _get_calibration_lookup(im, transpose_polynomial)
+
+        if m.batch_analysis:
+            if self._grid_cell_batch is None:
+                self._grid_cell_batch = GridCellBatch(
+                    list(self._grid_cells.values()),
+                    m.cell_count_calibration,
+                )
+            self._grid_cell_batch.analyse(
+                im,
+                transpose_polynomial,
+                index,
+                base_path=m.output_directory,
+                calibration_lookup=calibration_lookup,
+            )
+            self._LOGGER.info("Plate {0} completed".format(self._identifier))
+            return
 
         for grid_cell in self._grid_cells.values():
             if grid_cell.save_extra_data:
@@ -550,6 +615,7 @@ class GridArray:
                 index,
                 None,
                 m,
+                calibration_lookup,
             )
 
         self._LOGGER.info("Plate {0} completed".format(self._identifier))
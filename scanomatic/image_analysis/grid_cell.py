@@ -31,6 +31,10 @@ class GridCell:
         self.xy1 = []
         self.xy2 = []
         self.source = None
+        self._source_buffer = None
+        self._estimates_buffer = None
+        self._source_pixels = None
+        self._source_lookup = None
         self.ready = False
         self._previous_image = None
         self.image_index = -1
@@ -79,6 +83,38 @@ class GridCell:
             self.position[1]
         ].astype(int)
 
+    @staticmethod
+    def _get_buffer(buffer, shape) -> np.ndarray:
+        if buffer is None or buffer.shape != shape:
+            return np.empty(shape, dtype=np.float64)
+        return buffer
+
+    def set_source(self, tile: np.ndarray):
+        """Copy an image tile into the source, reusing its memory.
+
+        The cell items keep the cell estimates of the previous image for
+        detection, so the source never shares memory with those.
+        """
+        self._source_buffer = self._get_buffer(self._source_buffer, tile.shape)
+        np.copyto(self._source_buffer, tile)
+        self.source = self._source_buffer
+
+    def set_source_lookup(self, pixels: np.ndarray, lookup: np.ndarray):
+        """Set source from integer pixel values through a lookup table.
+
+        Until the source is converted to a new data space, pixels with the
+        same value are known to have the same source value, which allows
+        converting the lookup table instead of every pixel.
+        """
+        self._source_pixels = pixels
+        self._source_lookup = lookup
+        self._source_buffer = self._get_buffer(
+            self._source_buffer,
+            pixels.shape,
+        )
+        np.take(lookup, pixels, out=self._source_buffer)
+        self.source = self._source_buffer
+
     def set_new_data_source_space(
         self,
         space: VALUES = VALUES.Cell_Estimates,
@@ -86,32 +122,71 @@ class GridCell:
         polynomial_coeffs=None,
     ):
         if space is VALUES.Cell_Estimates:
-            if bg_sub_source is not None:
-                feature_array = self.source[np.where(bg_sub_source)]
-                # bg_sub = tmean(
-                #   feature_array,
-                #   mquantiles(feature_array, prob=[0.25, 0.75]),
-                # )
-                bg_sub = iqr_mean(feature_array)
-                if not np.isfinite(bg_sub):
-                    bg_sub = np.mean(feature_array)
-                    GridCell._logger.warning(
-                        "{0} caused background mean ({1}) due to inf".format(
-                            self._identifier,
-                            bg_sub,
-                        ),
-                    )
-                self.source = bg_sub - self.source
-
-            self.source[self.source < self.MIN_THRESHOLD] = self.MIN_THRESHOLD
-
-            if polynomial_coeffs is not None:
-                self.source = np.polyval(polynomial_coeffs, self.source)
+            assert self.source is not None
+            # The cell items are done detecting in the previous estimates
+            estimates = self._get_buffer(
+                self._estimates_buffer,
+                self.source.shape,
+            )
+            if self._source_lookup is not None:
+                assert self._source_pixels is not None
+                np.take(
+                    self._get_cell_estimates(
+                        self._source_lookup.copy(),
+                        bg_sub_source,
+                        polynomial_coeffs,
+                    ),
+                    self._source_pixels,
+                    out=estimates,
+                )
+            else:
+                np.copyto(
+                    estimates,
+                    self._get_cell_estimates(
+                        self.source,
+                        bg_sub_source,
+                        polynomial_coeffs,
+                    ),
+                )
+            self._estimates_buffer = estimates
+            self.source = estimates
 
             self._set_max_value_filter()
 
+        self._source_pixels = None
+        self._source_lookup = None
         self.push_source_data_to_cell_items()
 
+    def _get_cell_estimates(
+        self,
+        values: np.ndarray,
+        bg_sub_source,
+        polynomial_coeffs,
+    ) -> np.ndarray:
+        if bg_sub_source is not None:
+            feature_array = self.source[np.where(bg_sub_source)]
+            # bg_sub = tmean(
+            #   feature_array,
+            #   mquantiles(feature_array, prob=[0.25, 0.75]),
+            # )
+            bg_sub = iqr_mean(feature_array)
+            if not np.isfinite(bg_sub):
+                bg_sub = np.mean(feature_array)
+                GridCell._logger.warning(
+                    "{0} caused background mean ({1}) due to inf".format(
+                        self._identifier,
+                        bg_sub,
+                    ),
+                )
+            values = bg_sub - values
+
+        values[values < self.MIN_THRESHOLD] = self.MIN_THRESHOLD
+
+        if polynomial_coeffs is not None:
+            values = np.polyval(polynomial_coeffs, values)
+
+        return values
+
     def _set_max_value_filter(self):
 
         max_detect_filter = self.source > self.MAX_THRESHOLD
@@ -164,6 +239,10 @@ class GridCell:
         else:
             self._analyse()
 
+        # Don't keep the image of the pixels alive
+        self._source_pixels = None
+        self._source_lookup = None
+
     def get_save_data_path(self, base_path):
         if base_path is None:
             base_path = Paths().log
@@ -0,0 +1,596 @@
+"""
+Part of the analysis work-flow that analyses all grid-cells of a grid-array
+at once.
+
+The tiles of the grid-cells are stacked into three dimensional arrays and
+the calibration, blob detection and measures that `GridCell.analyse` does
+tile by tile are done as array operations over the stacks. The results are
+written to the features of the grid-cells, so they are used the same way
+as those of the per grid-cell analysis.
+"""
+from collections.abc import Callable, Sequence
+from typing import Any, Optional, cast
+
+import numpy as np
+from scipy.ndimage import (  # type: ignore
+    binary_dilation,
+    binary_erosion,
+    find_objects,
+    generate_binary_structure,
+    label
+)
+
+from scanomatic.io.logger import get_logger
+from scanomatic.models.analysis_model import COMPARTMENTS, MEASURES
+
+from .grid_cell import GridCell
+from .grid_cell_extra import get_shifted_filter_difference
+
+# Connectivity within each tile, but never between neighbouring tiles
+PLANAR_CROSS = np.zeros((3, 3, 3), dtype=bool)
+PLANAR_CROSS[1] = generate_binary_structure(2, 1)
+
+# These mirror `Blob.BLOB_RECIPE`, `Blob.detect` and `Background.detect`
+OTSU_BINS = 256
+OTSU_ADJUST = 0.5
+BLOB_DILATION = 2
+BACKGROUND_EROSION = 3
+MAX_BLOB_CHANGE = 8
+
+# Exchanges that leave the median of nine values in the fifth position
+_MEDIAN_OF_NINE_NETWORK = (
+    (1, 2), (4, 5), (7, 8), (0, 1), (3, 4), (6, 7), (1, 2), (4, 5), (7, 8),
+    (0, 3), (5, 8), (4, 7), (3, 6), (1, 4), (2, 5), (4, 7), (4, 2), (6, 4),
+    (4, 2),
+)
+
+
+def _get_tile(im: np.ndarray, grid_cell: GridCell) -> Optional[np.ndarray]:
+    xy1 = grid_cell.xy1
+    xy2 = grid_cell.xy2
+
+    if xy1 is not None and len(xy1) == 2 and xy2 is not None and len(xy2) == 2:
+        return im[xy1[0]: xy2[0], xy1[1]: xy2[1]]
+    return None
+
+
+def get_median_filtered(stack: np.ndarray) -> np.ndarray:
+    """Each tile median filtered with a 3 x 3 kernel and the nearest mode,
+    giving the same values as `scipy.ndimage.median_filter` would."""
+    padded = np.pad(stack, ((0, 0), (1, 1), (1, 1)), mode="edge")
+    height, width = stack.shape[1:]
+    values = [
+        padded[:, row: row + height, column: column + width]
+        for row in range(3)
+        for column in range(3)
+    ]
+    for low, high in _MEDIAN_OF_NINE_NETWORK:
+        values[low], values[high] = (
+            np.minimum(values[low], values[high]),
+            np.maximum(values[low], values[high]),
+        )
+    return values[4]
+
+
+def get_otsu_thresholds(
+    stack: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Otsu threshold of each tile as `skimage.filters.threshold_otsu`
+    would find it.
+
+    :return: The thresholds and if they could be calculated
+    """
+    tiles = stack.reshape(len(stack), -1)
+    thresholds = tiles[:, 0].copy()
+    uniform = (tiles == thresholds[:, None]).all(axis=1)
+    lows = tiles.min(axis=1)
+    highs = tiles.max(axis=1)
+    valid = uniform | (np.isfinite(lows) & np.isfinite(highs))
+    binned = np.flatnonzero(valid & ~uniform)
+    if binned.size == 0:
+        return thresholds, valid
+
+    # Bins the values exactly as `np.histogram` does for automatic ranges
+    values = tiles[binned]
+    lows = lows[binned, None]
+    highs = highs[binned, None]
+    edges = np.linspace(lows, highs, OTSU_BINS + 1, axis=1)[..., 0]
+    rows = np.arange(binned.size)[:, None]
+    indices = ((values - lows) * (OTSU_BINS / (highs - lows))).astype(np.intp)
+    indices[indices == OTSU_BINS] -= 1
+    indices[values < edges[rows, indices]] -= 1
+    indices[
+        (values >= edges[rows, indices + 1]) & (indices != OTSU_BINS - 1)
+    ] += 1
+    counts = np.bincount(
+        (indices + rows * OTSU_BINS).ravel(),
+        minlength=binned.size * OTSU_BINS,
+    ).reshape(binned.size, OTSU_BINS).astype(float)
+    centers = (edges[:, :-1] + edges[:, 1:]) / 2.
+
+    weight1 = np.cumsum(counts, axis=1)
+    weight2 = np.cumsum(counts[:, ::-1], axis=1)[:, ::-1]
+    weighted_centers = counts * centers
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean1 = np.cumsum(weighted_centers, axis=1) / weight1
+        mean2 = (
+            np.cumsum(weighted_centers[:, ::-1], axis=1) / weight2[:, ::-1]
+        )[:, ::-1]
+    variance12 = (
+        weight1[:, :-1] * weight2[:, 1:] * (mean1[:, :-1] - mean2[:, 1:]) ** 2
+    )
+    thresholds[binned] = centers[
+        rows[:, 0],
+        np.argmax(variance12, axis=1),
+    ]
+    return thresholds, valid
+
+
+def keep_best_blobs(blobs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Keep the best blob of each tile as `Blob.keep_best_blob` does.
+
+    Blobs whose centre of mass lie within the best blob are kept as part of
+    it, all others are returned as trash.
+    """
+    labels, number_of_labels = label(blobs, structure=PLANAR_CROSS)
+    if number_of_labels == 0:
+        return blobs, np.zeros_like(blobs)
+
+    objects = find_objects(labels)
+    tiles = np.array([obj[0].start for obj in objects])
+    extents = np.array(
+        [
+            (obj[1].stop - obj[1].start, obj[2].stop - obj[2].start)
+            for obj in objects
+        ],
+        dtype=float,
+    )
+    flat_labels = labels.ravel()
+    areas = np.bincount(flat_labels, minlength=number_of_labels + 1)[1:]
+    qualities = areas * extents.min(axis=1) / extents.max(axis=1)
+    coordinates = np.indices(labels.shape[1:]).reshape(2, -1)
+    centres_of_mass = np.array([
+        np.bincount(
+            flat_labels,
+            weights=np.tile(coordinate, len(labels)),
+            minlength=number_of_labels + 1,
+        )[1:] / areas
+        for coordinate in coordinates
+    ])
+
+    # Ties in quality go to the later label, like in the per tile ordering
+    label_values = np.arange(1, number_of_labels + 1)
+    order = np.lexsort((label_values, qualities, tiles))
+    last_of_tile = np.r_[tiles[order][1:] != tiles[order][:-1], True]
+    best_labels = np.zeros(len(labels), dtype=labels.dtype)
+    best_labels[tiles[order][last_of_tile]] = label_values[order][last_of_tile]
+
+    positions = np.round(centres_of_mass).astype(int)
+    keep = labels[tiles, positions[0], positions[1]] == best_labels[tiles]
+    keep |= label_values == best_labels[tiles]
+
+    blob_lookup = np.zeros(number_of_labels + 1, dtype=bool)
+    blob_lookup[1:] = keep
+    trash_lookup = np.zeros(number_of_labels + 1, dtype=bool)
+    trash_lookup[1:] = ~keep
+    return blob_lookup[labels], trash_lookup[labels]
+
+
+def get_mid50_means(values: np.ndarray) -> np.ma.MaskedArray:
+    """The `mid50_mean` of rows of sorted values with non-finite last.
+
+    As with `mid50_mean`, rows with too few values have masked means.
+    """
+    sizes = np.isfinite(values).sum(axis=1)
+    flanks = (sizes - sizes // 2) // 2
+    sums = np.zeros((len(values), values.shape[1] + 1))
+    np.cumsum(
+        np.where(np.isfinite(values), values, 0),
+        axis=1,
+        out=sums[:, 1:],
+    )
+    rows = np.arange(len(values))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = (
+            sums[rows, sizes - flanks] - sums[rows, flanks]
+        ) / (sizes - 2 * flanks)
+    return np.ma.masked_array(means, mask=flanks == 0)
+
+
+def get_measures(
+    values: np.ndarray,
+    filters: np.ndarray,
+    centroid: bool = False,
+) -> list[Optional[dict[MEASURES, Any]]]:
+    """The `CellItem.do_analysis` measures of the filtered values of each
+    tile, or `None` where the measures would be cleared."""
+    counts = filters.sum(axis=(1, 2))
+    sums = np.where(filters, values, 0).sum(axis=(1, 2))
+
+    # Sorting puts the filtered out and non-finite values, as NaN, last
+    sorted_values = np.where(
+        filters & np.isfinite(values),
+        values,
+        np.nan,
+    ).reshape(len(values), -1)
+    sorted_values.sort(axis=1)
+    finite_counts = np.isfinite(sorted_values).sum(axis=1)
+    rows = np.arange(len(values))
+    lower_median = sorted_values[rows, np.maximum(finite_counts - 1, 0) // 2]
+    upper_median = sorted_values[rows, finite_counts // 2]
+    quartiles = finite_counts // 4
+    lower_quartile = sorted_values[rows, quartiles]
+    upper_quartile = sorted_values[
+        rows,
+        np.where(quartiles > 0, finite_counts - quartiles, 0),
+    ]
+    iqr_means = get_mid50_means(sorted_values)
+
+    if centroid:
+        coordinates = np.indices(values.shape[1:])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            centroids = [
+                (filters * coordinate).sum(axis=(1, 2)) / counts
+                for coordinate in coordinates
+            ]
+
+    measures: list[Optional[dict[MEASURES, Any]]] = []
+    for tile in rows:
+        count = counts[tile]
+        total = sums[tile]
+        if count == total or count == 0:
+            measures.append(None)
+            continue
+
+        features: dict[MEASURES, Any] = {
+            MEASURES.Count: count,
+            MEASURES.Sum: total,
+            MEASURES.Mean: total / count,
+            MEASURES.Median: (lower_median[tile] + upper_median[tile]) / 2,
+            MEASURES.IQR: (lower_quartile[tile], upper_quartile[tile]),
+            MEASURES.IQR_Mean: iqr_means[tile],
+        }
+        if centroid:
+            features[MEASURES.Centroid] = (
+                centroids[0][tile],
+                centroids[1][tile],
+            )
+            features[MEASURES.Perimeter] = None
+        measures.append(features)
+
+    return measures
+
+
+class GridCellStack:
+    """Grid-cells whose tiles have the same shape, analysed together.
+
+    Like the per grid-cell analysis, blobs are detected in the cell
+    estimates of the previous image and kept close to the previous
+    detections.
+    """
+    _LOGGER = get_logger("Grid Cell Stack")
+
+    def __init__(
+        self,
+        grid_cells: Sequence[GridCell],
+        polynomial_coeffs,
+    ):
+        self.grid_cells = list(grid_cells)
+        self._polynomial_coeffs = polynomial_coeffs
+        self._detection_source: Optional[np.ndarray] = None
+        self._old_blobs: Optional[np.ndarray] = None
+        self._overshooting = np.zeros(len(self.grid_cells), dtype=bool)
+        self._pixels: Optional[np.ndarray] = None
+        self._source: Optional[np.ndarray] = None
+
+    def set_pixels(self, tiles: Sequence[np.ndarray]) -> np.ndarray:
+        """Stack the image tiles of the grid cells, reusing the memory of
+        the previous image's stack."""
+        shape = (len(tiles),) + tiles[0].shape
+        if (
+            self._pixels is None
+            or self._pixels.shape != shape
+            or self._pixels.dtype != tiles[0].dtype
+        ):
+            self._pixels = np.empty(shape, dtype=tiles[0].dtype)
+            self._source = np.empty(shape, dtype=np.float64)
+        np.stack(tiles, out=self._pixels)
+        return self._pixels
+
+    def set_source(
+        self,
+        transpose_polynomial,
+        lookup: Optional[np.ndarray],
+    ) -> np.ndarray:
+        """Calibrate the stacked pixels into the reused source stack."""
+        assert self._pixels is not None and self._source is not None
+        if lookup is not None:
+            np.take(lookup, self._pixels, out=self._source)
+        else:
+            np.copyto(self._source, self._pixels)
+            if transpose_polynomial is not None:
+                self._source[...] = transpose_polynomial(self._source)
+        return self._source
+
+    def _detect(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        assert self._detection_source is not None
+        filtered = get_median_filtered(self._detection_source)
+        thresholds, valid = get_otsu_thresholds(filtered)
+        blobs = filtered < (thresholds + OTSU_ADJUST)[:, None, None]
+        blobs[~valid] = False
+        blobs = binary_dilation(
+            blobs,
+            structure=PLANAR_CROSS,
+            iterations=BLOB_DILATION,
+        )
+        blobs, trash = keep_best_blobs(blobs)
+        self._keep_blobs_similar(blobs)
+
+        background = binary_erosion(
+            ~blobs & ~trash,
+            structure=PLANAR_CROSS,
+            iterations=BACKGROUND_EROSION,
+            border_value=1,
+        )
+        return blobs, trash, background
+
+    def _keep_blobs_similar(self, blobs: np.ndarray) -> None:
+        old_blobs = self._old_blobs
+        if old_blobs is not None:
+            lost = ~blobs.any(axis=(1, 2))
+            blobs[lost] = old_blobs[lost]
+
+            sqrt_of_oldsums = old_blobs.sum(axis=(1, 2)) ** 0.5
+            with np.errstate(divide='ignore', invalid='ignore'):
+                changed = (
+                    (old_blobs ^ blobs).sum(axis=(1, 2)) / sqrt_of_oldsums
+                    > MAX_BLOB_CHANGE
+                )
+
+            for tile in np.flatnonzero(changed):
+                if (
+                    not blobs[tile].any()
+                    or not old_blobs[tile].any()
+                    or get_shifted_filter_difference(
+                        old_blobs[tile],
+                        blobs[tile],
+                    ) / sqrt_of_oldsums[tile] > MAX_BLOB_CHANGE
+                ):
+                    blobs[tile] = old_blobs[tile]
+
+        self._old_blobs = blobs.copy()
+
+    def _get_cell_estimates(
+        self,
+        source: np.ndarray,
+        background: np.ndarray,
+        pixels: Optional[np.ndarray] = None,
+        lookup: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        background_values = np.where(
+            background & np.isfinite(source),
+            source,
+            np.nan,
+        ).reshape(len(source), -1)
+        background_values.sort(axis=1)
+        bg_sub = get_mid50_means(background_values).filled(np.nan)
+        fallback = ~np.isfinite(bg_sub)
+        if fallback.any():
+            bg_sub[fallback] = (
+                np.where(background[fallback], source[fallback], 0).sum(
+                    axis=(1, 2),
+                ) / background[fallback].sum(axis=(1, 2))
+            )
+            self._LOGGER.warning(
+                "{0} grid cells used background mean due to inf".format(
+                    fallback.sum(),
+                ),
+            )
+
+        if pixels is not None and lookup is not None:
+            # Converts each tile's lookup table instead of its pixels
+            estimates = bg_sub[:, None] - lookup
+        else:
+            estimates = bg_sub[:, None, None] - source
+        estimates[estimates < GridCell.MIN_THRESHOLD] = GridCell.MIN_THRESHOLD
+
+        if self._polynomial_coeffs is not None:
+            estimates = np.polyval(self._polynomial_coeffs, estimates)
+
+        if pixels is not None and lookup is not None:
+            return np.take_along_axis(
+                estimates,
+                pixels.reshape(len(pixels), -1),
+                axis=1,
+            ).reshape(pixels.shape)
+        return estimates
+
+    def _warn_about_overshooting(
+        self,
+        tiles: np.ndarray,
+        estimates: np.ndarray,
+    ) -> None:
+        overshooting = (estimates > GridCell.MAX_THRESHOLD).any(axis=(1, 2))
+        started = tiles[overshooting & ~self._overshooting[tiles]]
+        stopped = tiles[~overshooting & self._overshooting[tiles]]
+        if started.size:
+            self._LOGGER.warning(
+                "{0} got pixel-values overshooting {1}.".format(
+                    [self.grid_cells[tile].position for tile in started],
+                    GridCell.MAX_THRESHOLD,
+                ) + " Further warnings for these colonies suppressed.",
+            )
+        if stopped.size:
+            self._LOGGER.info(
+                "{0} no longer have pixels that reach {1} depth.".format(
+                    [self.grid_cells[tile].position for tile in stopped],
+                    GridCell.MAX_THRESHOLD,
+                ),
+            )
+        self._overshooting[tiles] = overshooting
+
+    def analyse(
+        self,
+        source: np.ndarray,
+        image_index: int,
+        save_data: Callable[[int, str, np.ndarray], None],
+        pixels: Optional[np.ndarray] = None,
+        lookup: Optional[np.ndarray] = None,
+    ) -> None:
+        """Analyse the calibrated tiles of the grid cells
+
+        :param source: The calibrated tiles stacked in grid cell order
+        :param image_index: The index of the image
+        :param save_data: Called with tile, file suffix and data for grid
+            cells that should save their extra data.
+        :param pixels: Optionally the integer pixel values of the tiles
+        :param lookup: The calibrated value of each pixel value, if pixels
+            are given
+        """
+        for grid_cell in self.grid_cells:
+            grid_cell.image_index = image_index
+            if not grid_cell.ready:
+                grid_cell.source = np.zeros(source.shape[1:])
+                grid_cell.attach_analysis(
+                    blob=True,
+                    background=True,
+                    cell=True,
+                    run_detect=False,
+                )
+
+        if source[0].size == 0:
+            for grid_cell in self.grid_cells:
+                grid_cell.clear_features()
+            return
+
+        if self._detection_source is None:
+            self._detection_source = source.copy()
+
+        blobs, trash, background = self._detect()
+        has_background = background.any(axis=(1, 2))
+        tiles = np.flatnonzero(has_background)
+        for tile in np.flatnonzero(~has_background):
+            self.grid_cells[tile].clear_features()
+        if tiles.size == 0:
+            return
+
+        estimates = self._get_cell_estimates(
+            source[tiles],
+            background[tiles],
+            None if pixels is None else pixels[tiles],
+            lookup,
+        )
+        self._warn_about_overshooting(tiles, estimates)
+        self._detection_source[tiles] = estimates
+
+        compartments = (
+            (COMPARTMENTS.Total, np.ones_like(blobs[tiles])),
+            (COMPARTMENTS.Blob, blobs[tiles]),
+            (COMPARTMENTS.Background, background[tiles]),
+        )
+        for compartment, filters in compartments:
+            measures = get_measures(
+                estimates,
+                filters,
+                centroid=compartment is COMPARTMENTS.Blob,
+            )
+            for tile, features in zip(tiles, measures):
+                feature_data = self.grid_cells[tile].get_item(
+                    compartment,
+                ).features.data
+                feature_data.clear()
+                if features is not None:
+                    feature_data.update(features)
+
+        for tile, grid_cell in enumerate(self.grid_cells):
+            if grid_cell.save_extra_data:
+                save_data(tile, ".background.filter", background[tile])
+                save_data(tile, ".image.cells", self._detection_source[tile])
+                save_data(tile, ".blob.filter", blobs[tile])
+                save_data(tile, ".blob.trash.current", trash[tile])
+
+
+class GridCellBatch:
+    """Analyses all grid-cells of a grid-array together.
+
+    Grid-cells are stacked by the shape of their tiles, which usually only
+    differ at the edges of the image.
+    """
+    _LOGGER = get_logger("Grid Cell Batch")
+
+    def __init__(self, grid_cells: Sequence[GridCell], polynomial_coeffs):
+        self._grid_cells = list(grid_cells)
+        self._polynomial_coeffs = polynomial_coeffs
+        self._tile_shapes: Optional[list[Optional[tuple[int, ...]]]] = None
+        self._stacks: list[tuple[list[int], GridCellStack]] = []
+
+    def _set_stacks(self, tile_shapes: list[Optional[tuple[int, ...]]]):
+        self._tile_shapes = tile_shapes
+        grid_cells_by_shape: dict[tuple[int, ...], list[int]] = {}
+        for index, shape in enumerate(tile_shapes):
+            if shape is None:
+                continue
+            grid_cells_by_shape.setdefault(shape, []).append(index)
+
+        self._stacks = [
+            (
+                indices,
+                GridCellStack(
+                    [self._grid_cells[index] for index in indices],
+                    self._polynomial_coeffs,
+                ),
+            )
+            for indices in grid_cells_by_shape.values()
+        ]
+
+    def analyse(
+        self,
+        im: np.ndarray,
+        transpose_polynomial,
+        image_index: int,
+        base_path: Optional[str] = None,
+        calibration_lookup: Optional[np.ndarray] = None,
+    ) -> None:
+        tiles = [_get_tile(im, grid_cell) for grid_cell in self._grid_cells]
+        tile_shapes = [None if tile is None else tile.shape for tile in tiles]
+        if any(shape is None for shape in tile_shapes):
+            self._LOGGER.error(
+                "Tried to analyse grid cells that don't have any area",
+            )
+        if tile_shapes != self._tile_shapes:
+            self._set_stacks(tile_shapes)
+
+        for indices, stack in self._stacks:
+            pixels = stack.set_pixels(
+                [cast(np.ndarray, tiles[index]) for index in indices],
+            )
+
+            def save_data(tile: int, suffix: str, data: np.ndarray):
+                grid_cell = stack.grid_cells[tile]
+                np.save(
+                    grid_cell.get_save_data_path(base_path) + suffix + ".npy",
+                    data,
+                )
+
+            for tile, grid_cell in enumerate(stack.grid_cells):
+                if grid_cell.save_extra_data:
+                    grid_cell.image_index = image_index
+                    save_data(
+                        tile,
+                        ".raw.image",
+                        pixels[tile].astype(np.float64),
+                    )
+
+            source = stack.set_source(transpose_polynomial, calibration_lookup)
+
+            for tile, grid_cell in enumerate(stack.grid_cells):
+                if grid_cell.save_extra_data:
+                    save_data(tile, ".calibrated.image", source[tile])
+
+            stack.analyse(
+                source,
+                image_index,
+                save_data,
+                pixels=pixels if calibration_lookup is not None else None,
+                lookup=calibration_lookup,
+            )
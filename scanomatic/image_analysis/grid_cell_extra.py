@@ -155,6 +155,91 @@ def get_array_subtraction(
         )
 
 
+def _set_filter(
+    target: Optional[FilterArray],
+    values: np.ndarray,
+) -> FilterArray:
+    """Write values into the memory of target when it is of the same shape,
+    so that filters can be reused between images."""
+    if target is None or target.shape != values.shape or target is values:
+        return np.array(values, dtype=bool)
+    target[...] = values
+    return target
+
+
+def get_shifted_filter_difference(
+    old_filter: FilterArray,
+    filter_array: FilterArray,
+) -> int:
+    """Number of differing pixels between two filters once the new filter
+    has been shifted to align centre of masses with the old one."""
+    old_com = center_of_mass(old_filter)
+    new_com = center_of_mass(filter_array)
+
+    dim_1_offset = int(old_com[0] - new_com[0])
+    dim_2_offset = int(old_com[1] - new_com[1])
+
+    if dim_1_offset > 0 and dim_2_offset > 0:
+
+        diff_filter = (
+            old_filter[dim_1_offset:, dim_2_offset:]
+            ^ filter_array[:-dim_1_offset, :-dim_2_offset]
+        )
+
+    elif dim_1_offset < 0 and dim_2_offset < 0:
+
+        diff_filter = (
+            old_filter[: dim_1_offset, : dim_2_offset]
+            ^ filter_array[-dim_1_offset:, -dim_2_offset:]
+        )
+
+    elif dim_1_offset > 0 > dim_2_offset:
+
+        diff_filter = (
+            old_filter[dim_1_offset:, : dim_2_offset]
+            ^ filter_array[:-dim_1_offset, -dim_2_offset:]
+        )
+
+    elif dim_1_offset < 0 < dim_2_offset:
+
+        diff_filter = (
+            old_filter[: dim_1_offset, dim_2_offset:]
+            ^ filter_array[-dim_1_offset:, :-dim_2_offset]
+        )
+
+    elif dim_1_offset == 0 and dim_2_offset < 0:
+
+        diff_filter = (
+            old_filter[:, : dim_2_offset]
+            ^ filter_array[:, -dim_2_offset:]
+        )
+
+    elif dim_1_offset == 0 and dim_2_offset > 0:
+
+        diff_filter = (
+            old_filter[:, dim_2_offset:]
+            ^ filter_array[:, :-dim_2_offset]
+        )
+
+    elif dim_1_offset < 0 and dim_2_offset == 0:
+
+        diff_filter = (
+            old_filter[: dim_1_offset, :]
+            ^ filter_array[-dim_1_offset:, :]
+        )
+
+    elif dim_1_offset > 0 == dim_2_offset:
+        diff_filter = (
+            old_filter[dim_1_offset:, :]
+            ^ filter_array[:-dim_1_offset, :]
+        )
+
+    else:
+        diff_filter = old_filter ^ filter_array
+
+    return diff_filter.sum()
+
+
 class CellItem:
 
     def __init__(
@@ -203,7 +288,7 @@ class CellItem:
             MEASURES.Sum,
         ]
         self.features.shape = (len(self._features_key_list),)
-        self.old_filter = None
+        self.old_filter: Optional[FilterArray] = None
 
     def set_data_source(self, data_source) -> None:
         self.grid_array = data_source
@@ -365,8 +450,8 @@ class Blob(CellItem):
         else:
             self.detect_function = self.default_detect
 
-        self.old_trash = None
-        self.trash_array = None
+        self.old_trash: Optional[FilterArray] = None
+        self.trash_array: Optional[FilterArray] = None
         self.image_color_logic = image_color_logic
         self._features_key_list += [MEASURES.Centroid, MEASURES.Perimeter]
         self.features.shape = (len(self._features_key_list),)
@@ -572,9 +657,9 @@ class Blob(CellItem):
 
         if self.filter_array is not None:
 
-            self.trash_array = np.zeros(
-                self.filter_array.shape,
-                dtype=bool,
+            self.trash_array = _set_filter(
+                self.trash_array,
+                np.zeros(self.filter_array.shape, dtype=bool),
             )
 
         if detect_type is None:
@@ -600,7 +685,10 @@ class Blob(CellItem):
         if self.old_filter is not None:
 
             if self.filter_array.sum() == 0:
-                self.filter_array = self.old_filter.copy()
+                self.filter_array = _set_filter(
+                    self.filter_array,
+                    self.old_filter,
+                )
 
             blob_diff = (self.old_filter ^ self.filter_array).sum()
 
@@ -615,71 +703,10 @@ class Blob(CellItem):
 
                 else:
 
-                    old_com = center_of_mass(self.old_filter)
-                    new_com = center_of_mass(self.filter_array)
-
-                    dim_1_offset = int(old_com[0] - new_com[0])
-                    dim_2_offset = int(old_com[1] - new_com[1])
-
-                    if dim_1_offset > 0 and dim_2_offset > 0:
-
-                        diff_filter = (
-                            self.old_filter[dim_1_offset:, dim_2_offset:]
-                            ^ self.filter_array[:-dim_1_offset, :-dim_2_offset]
-                        )
-
-                    elif dim_1_offset < 0 and dim_2_offset < 0:
-
-                        diff_filter = (
-                            self.old_filter[: dim_1_offset, : dim_2_offset]
-                            ^ self.filter_array[-dim_1_offset:, -dim_2_offset:]
-                        )
-
-                    elif dim_1_offset > 0 > dim_2_offset:
-
-                        diff_filter = (
-                            self.old_filter[dim_1_offset:, : dim_2_offset]
-                            ^ self.filter_array[:-dim_1_offset, -dim_2_offset:]
-                        )
-
-                    elif dim_1_offset < 0 < dim_2_offset:
-
-                        diff_filter = (
-                            self.old_filter[: dim_1_offset, dim_2_offset:]
-                            ^ self.filter_array[-dim_1_offset:, :-dim_2_offset]
-                        )
-
-                    elif dim_1_offset == 0 and dim_2_offset < 0:
-
-                        diff_filter = (
-                            self.old_filter[:, : dim_2_offset]
-                            ^ self.filter_array[:, -dim_2_offset:]
-                        )
-
-                    elif dim_1_offset == 0 and dim_2_offset > 0:
-
-                        diff_filter = (
-                            self.old_filter[:, dim_2_offset:]
-                            ^ self.filter_array[:, :-dim_2_offset]
-                        )
-
-                    elif dim_1_offset < 0 and dim_2_offset == 0:
-
-                        diff_filter = (
-                            self.old_filter[: dim_1_offset, :]
-                            ^ self.filter_array[-dim_1_offset:, :]
-                        )
-
-                    elif dim_1_offset > 0 == dim_2_offset:
-                        diff_filter = (
-                            self.old_filter[dim_1_offset:, :]
-                            ^ self.filter_array[:-dim_1_offset, :]
-                        )
-
-                    else:
-                        diff_filter = self.old_filter ^ self.filter_array
-
-                    blob_diff = diff_filter.sum()
+                    blob_diff = get_shifted_filter_difference(
+                        self.old_filter,
+                        self.filter_array,
+                    )
 
                     if blob_diff / sqrt_of_oldsum > max_change_threshold:
 
@@ -687,7 +714,10 @@ class Blob(CellItem):
 
                 if bad_diff:
 
-                    self.filter_array = self.old_filter.copy()
+                    self.filter_array = _set_filter(
+                        self.filter_array,
+                        self.old_filter,
+                    )
 
                     if self.old_trash is not None:
 
@@ -695,7 +725,7 @@ class Blob(CellItem):
 
         if remember_filter:
 
-            self.old_filter = self.filter_array.copy()
+            self.old_filter = _set_filter(self.old_filter, self.filter_array)
 
         if remember_trash:
 
@@ -876,14 +906,14 @@ class Blob(CellItem):
             )))[0][::-1]
             best_quality_label = quality_order[0]
 
-            self.filter_array = label_array == best_quality_label
+            best_blob = label_array == best_quality_label
 
             composite_blob = [best_quality_label]
             composite_trash = []
 
             for item_label in quality_order[1:]:
 
-                if self.filter_array[
+                if best_blob[
                     tuple(map(
                         int,
                         list(map(round, centre_of_masses[item_label]))
@@ -894,15 +924,15 @@ class Blob(CellItem):
                 else:
                     composite_trash.append(item_label)
 
-            self.filter_array = np.in1d(
-                label_array, np.array(composite_blob)).reshape(
-                    self.filter_array.shape,
-                )
+            self.filter_array = _set_filter(
+                self.filter_array,
+                np.isin(label_array, composite_blob),
+            )
 
-            self.trash_array = np.in1d(
-                label_array, np.array(composite_trash)).reshape(
-                    self.filter_array.shape,
-                )
+            self.trash_array = _set_filter(
+                self.trash_array,
+                np.isin(label_array, composite_trash),
+            )
 
 
 class Background(CellItem):
@@ -930,7 +960,7 @@ class Background(CellItem):
             self.filter_array[...] = True
             self.filter_array[np.where(self.blob.filter_array)] = False
             self.filter_array[np.where(self.blob.trash_array)] = False
-            self.filter_array = binary_erosion(
+            self.filter_array[...] = binary_erosion(
                 self.filter_array,
                 iterations=3,
                 border_value=1
@@ -1,4 +1,5 @@
 """Resource module for handling basic images operations."""
+from collections.abc import Sequence
 from typing import Optional, Type
 
 import numpy as np
@@ -7,10 +8,23 @@ from scanomatic.io.logger import get_logger
 from scipy.ndimage import zoom  # type: ignore
 
 from scanomatic.models.analysis_model import IMAGE_ROTATIONS
+from . import image_pyramid
 from .exceptions import LoadImageError
 
 _logger = get_logger("Basic Image Utils")
 
+Region = tuple[slice, slice]
+
+_CONVERSION_ROWS = 256
+_MULTI_CHANNEL_MODES = {"RGB", "RGBA", "RGBX", "CMYK", "YCbCr", "LAB", "HSV"}
+_RAW_DTYPES: dict[str, np.dtype] = {
+    "L": np.dtype(np.uint8),
+    "I;16": np.dtype("<u2"),
+    "I;16L": np.dtype("<u2"),
+    "I;16B": np.dtype(">u2"),
+}
+_TIFF_ORIENTATION = 274
+
 
 def scale_16bit_to_8bit_range(data: np.ndarray) -> np.ndarray:
     return data / (2 ** 16 - 1.) * 255
@@ -20,36 +34,196 @@ def round_to_8bit(data: np.ndarray) -> np.ndarray:
     return np.round(data).astype(np.uint8)
 
 
+def get_8bit_from_16bit(
+    data: np.ndarray,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Same as rounding `scale_16bit_to_8bit_range` but in integers
+
+    Since 2 ** 16 - 1 is 255 * 257 the scaled value is the value divided by
+    257, which is never exactly half way between two integers. The
+    conversion is done a few rows at a time to avoid full image
+    temporaries.
+
+    :param data: The 16 bit image
+    :param out: Optional 8 bit array to write the result to
+    """
+    if out is None:
+        out = np.empty(data.shape, dtype=np.uint8)
+    for start in range(0, data.shape[0], _CONVERSION_ROWS):
+        chunk = data[start: start + _CONVERSION_ROWS].astype(np.uint32)
+        chunk += 128
+        chunk //= 257
+        out[start: start + _CONVERSION_ROWS] = chunk
+    return out
+
+
+def _convert_image_data(data: np.ndarray, dtype: Optional[Type]) -> np.ndarray:
+    if data.dtype == np.uint16:
+        if dtype == np.uint8:
+            return get_8bit_from_16bit(data)
+        data = scale_16bit_to_8bit_range(data)
+
+    if dtype is None or data.dtype == dtype:
+        return data
+    elif dtype == np.uint8:
+        return np.round(data).astype(dtype)
+    return data.astype(dtype)
+
+
+def _get_region_box(
+    region: Region,
+    shape: tuple[int, int],
+    transpose: bool,
+) -> tuple[int, int, int, int]:
+    """The left, upper, right and lower source image box of a region"""
+    (top, bottom), (left, right) = (
+        region[axis].indices(shape[axis])[:2] for axis in range(2)
+    )
+    if transpose:
+        (top, bottom), (left, right) = (left, right), (top, bottom)
+    return left, top, max(left, right), max(top, bottom)
+
+
+def _read_uncompressed_box(
+    im: Image.Image,
+    path: str,
+    box: tuple[int, int, int, int],
+) -> Optional[np.ndarray]:
+    """Read a box of an uncompressed TIFF directly from the file
+
+    Only the rows of the strips or tiles overlapping the box are read and
+    nothing is decoded.
+
+    :param im: The opened, not yet loaded, image
+    :param path: Path to the image
+    :param box: The left, upper, right and lower image box
+    :return: The box, or None if the file layout does not allow reading
+        parts of the image.
+    """
+    tiles = getattr(im, "tile", None)
+    if (
+        im.format != "TIFF"
+        or not tiles
+        or getattr(im, "tag_v2", {}).get(_TIFF_ORIENTATION, 1) != 1
+    ):
+        return None
+
+    left, top, right, bottom = box
+    out: Optional[np.ndarray] = None
+    covered = 0
+    for decoder, (x0, y0, x1, y1), offset, args in tiles:
+        dtype = _RAW_DTYPES.get(args[0]) if decoder == "raw" else None
+        if dtype is None or args[0] != im.mode or args[2:3] not in ((), (1,)):
+            return None
+        stride = args[1] if len(args) > 1 and args[1] else (
+            (x1 - x0) * dtype.itemsize
+        )
+        if stride % dtype.itemsize:
+            return None
+
+        rows = max(top, y0), min(bottom, y1)
+        cols = max(left, x0), min(right, x1)
+        if rows[1] <= rows[0] or cols[1] <= cols[0]:
+            continue
+
+        try:
+            data: np.ndarray = np.memmap(
+                path,
+                dtype=dtype,
+                mode="r",
+                offset=offset + (rows[0] - y0) * stride,
+                shape=(rows[1] - rows[0], stride // dtype.itemsize),
+            )
+        except (ValueError, OSError):
+            return None
+        if out is None:
+            out = np.zeros(
+                (bottom - top, right - left),
+                dtype=dtype.newbyteorder("="),
+            )
+        out[
+            rows[0] - top: rows[1] - top,
+            cols[0] - left: cols[1] - left,
+        ] = data[:, cols[0] - x0: cols[1] - x0]
+        covered += (rows[1] - rows[0]) * (cols[1] - cols[0])
+        del data
+
+    if out is None or covered != out.size:
+        return None
+    return out
+
+
+def _read_box(
+    im: Image.Image,
+    path: str,
+    box: tuple[int, int, int, int],
+) -> np.ndarray:
+    data = _read_uncompressed_box(im, path, box)
+    if data is None:
+        _logger.debug(f"Can't read parts of {path}, decoding all of it")
+        return np.array(im.crop(box))
+    return data
+
+
 def load_image_to_numpy(
     path: str,
     orientation: IMAGE_ROTATIONS = IMAGE_ROTATIONS.Portrait,
     dtype: Type = np.float64,
+    regions: Optional[Sequence[Region]] = None,
 ) -> np.ndarray:
-    im = Image.open(path)
-    data = np.array(im)
+    """Load an image in the requested orientation
 
-    if data.dtype == np.uint16:
-        data = scale_16bit_to_8bit_range(data)
+    16 bit images are scaled to the 8 bit range. If converted to 8 bit the
+    image stays in integers throughout.
 
+    :param path: Path to the image
+    :param orientation: The orientation of the first two axes
+    :param dtype: Type of the returned image, None keeps the 8 bit range
+        data as is.
+    :param regions: Optional row and column slices of the returned image to
+        read, the rest of the image is left as zeros. Of uncompressed TIFFs
+        only the parts of the file covering the regions are read, other
+        images are decoded fully but only the regions are converted. Multi
+        channel images are always read fully.
+    """
+    with Image.open(path) as im:
+        return _load_image_to_numpy(im, path, orientation, dtype, regions)
+
+
+def _load_image_to_numpy(
+    im: Image.Image,
+    path: str,
+    orientation: IMAGE_ROTATIONS,
+    dtype: Type,
+    regions: Optional[Sequence[Region]],
+) -> np.ndarray:
+    width, height = im.size
     data_orientation = (
-        IMAGE_ROTATIONS.Portrait if max(data.shape) == data.shape[0]
+        IMAGE_ROTATIONS.Portrait if height >= width
         else IMAGE_ROTATIONS.Landscape
     )
+    transpose = data_orientation != orientation
 
-    if data_orientation == orientation:
-        if dtype is None or data.dtype == dtype:
-            return data
-        elif dtype == np.uint8:
-            return np.round(data).astype(dtype)
-        else:
-            return data.astype(dtype)
-    else:
-        if dtype is None or data.dtype == dtype:
-            return data.T
-        elif dtype == np.uint8:
-            return np.round(data).T.astype(dtype)
-        else:
-            return data.T.astype(dtype)
+    if regions is not None and im.mode not in _MULTI_CHANNEL_MODES:
+        shape = (width, height) if transpose else (height, width)
+        out: Optional[np.ndarray] = None
+        for region in regions:
+            box = _get_region_box(region, shape, transpose)
+            if box[2] <= box[0] or box[3] <= box[1]:
+                continue
+            block = _convert_image_data(_read_box(im, path, box), dtype)
+            if out is None:
+                out = np.zeros(shape, dtype=block.dtype)
+            if transpose:
+                out[box[0]: box[2], box[1]: box[3]] = block.T
+            else:
+                out[box[1]: box[3], box[0]: box[2]] = block
+        if out is not None:
+            return out
+
+    data = _convert_image_data(np.array(im), dtype)
+    return data.T if transpose else data
 
 
 def Quick_Scale_To_im(
@@ -59,6 +233,26 @@ def Quick_Scale_To_im(
     target_dpi: int = 150,
     scale: Optional[float] = None,
 ) -> np.ndarray:
+    """Scale an image
+
+    Power of two downscales are taken from the image pyramid, which is
+    cached per path. Other scales are interpolated. The first pixel of the
+    result is centred at `get_scale_offset(scale)` in the image.
+
+    :param path: Path to load the image from if no image is given, also
+        identifies the image in the pyramid cache.
+    :param im: The image, a cached pyramid is only used if it was built
+        from this array.
+    """
+    if scale is None:
+        scale = target_dpi / source_dpi
+
+    level = image_pyramid.get_downscale_level(scale)
+    if level and path is not None:
+        pyramid = image_pyramid.get_cached_pyramid(path, im)
+        if pyramid is not None:
+            return pyramid.get_level(level)
+
     if im is None:
         if path is None:
             msg = "No image or path supplied"
@@ -72,13 +266,23 @@ def Quick_Scale_To_im(
             _logger.error(msg)
             raise LoadImageError(msg)
 
-    if scale is None:
-        scale = target_dpi / source_dpi
+    if level:
+        return image_pyramid.get_pyramid(im, path).get_level(level)
 
     small_im = zoom(im, scale, order=1)
     return small_im
 
 
+def get_scale_offset(scale: float) -> float:
+    """Position in the image of the first pixel of `Quick_Scale_To_im`
+
+    Interpolated scales start at the first pixel of the image, while
+    pyramid levels average blocks of pixels.
+    """
+    level = image_pyramid.get_downscale_level(scale)
+    return image_pyramid.get_sample_offset(level) if level else 0.0
+
+
 class Image_Transpose:
 
     def __init__(self, sourceValues=None, targetValues=None, polyCoeffs=None):
@@ -1,8 +1,9 @@
+from collections import OrderedDict
 from typing import Optional
 
 import numpy as np
+from scipy.fft import irfft2, next_fast_len, rfft2  # type: ignore
 from scipy.ndimage import center_of_mass  # type: ignore
-from scipy.signal import fftconvolve  # type: ignore
 
 from scanomatic.io.logger import get_logger
 
@@ -13,6 +14,51 @@ from .exceptions import FixtureImageError
 
 _logger = get_logger("Resource Image Analysis")
 
+_KERNEL_CACHE_SIZE = 16
+_kernel_cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+_MIN_COARSE_MARKER_SIZE = 8
+
+
+def _get_kernel_fft(
+    kernel: np.ndarray,
+    fft_shape: tuple[int, ...],
+) -> np.ndarray:
+    """The transform of a kernel, cached since it is the same for all
+    images of a project."""
+    key = (kernel.shape, kernel.dtype.str, kernel.tobytes(), fft_shape)
+    if key in _kernel_cache:
+        _kernel_cache.move_to_end(key)
+    else:
+        _kernel_cache[key] = rfft2(kernel, fft_shape)
+        if len(_kernel_cache) > _KERNEL_CACHE_SIZE:
+            _kernel_cache.popitem(last=False)
+    return _kernel_cache[key]
+
+
+def convolve_same(image: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """Convolution with the same result as `fftconvolve(mode='same')`"""
+    fft_shape = tuple(
+        next_fast_len(a + b - 1, real=True)
+        for a, b in zip(image.shape, kernel.shape)
+    )
+    full = irfft2(
+        rfft2(image, fft_shape) * _get_kernel_fft(kernel, fft_shape),
+        fft_shape,
+    )
+    start = [(size - 1) // 2 for size in kernel.shape]
+    return full[
+        start[0]: start[0] + image.shape[0],
+        start[1]: start[1] + image.shape[1],
+    ]
+
+
+def _block_mean(im: np.ndarray, factor: int) -> np.ndarray:
+    rows = im.shape[0] // factor
+    cols = im.shape[1] // factor
+    return im[: rows * factor, : cols * factor].reshape(
+        rows, factor, cols, factor,
+    ).mean(axis=(1, 3))
+
 
 class FixtureImage:
     def __init__(
@@ -20,11 +66,19 @@ class FixtureImage:
         image: np.ndarray,
         pattern_image: np.ndarray,
         scale: float,
+        offset: float = 0.0,
     ):
+        """
+        :param image: The image, scaled by `scale`
+        :param pattern_image: The marker image
+        :param scale: The scale of the image relative to the original
+        :param offset: Position in the original image of the first pixel
+        """
         self._img = image
         self._pattern_img = pattern_image
         self._transformed = False
         self._conversion_factor = 1.0 / scale
+        self._offset = offset
 
     @classmethod
     def from_image(
@@ -32,6 +86,7 @@ class FixtureImage:
         image: np.ndarray,
         pattern_image_path: str,
         scale: float = 1.0,
+        offset: float = 0.0,
     ) -> "FixtureImage":
         if len(image.shape) > 2:
             # Use first channel of color image
@@ -51,7 +106,7 @@ class FixtureImage:
             # Use first channel of color image
             pattern_image = pattern_image[:, :, 0]
 
-        return cls(image, pattern_image, scale)
+        return cls(image, pattern_image, scale, offset)
 
     @classmethod
     def from_image_path(
@@ -168,15 +223,107 @@ class FixtureImage:
             )
         ) - local_hit
 
-    def get_convolution(self, threshold: float = 127) -> np.ndarray:
+    def _get_thresholded(
+        self,
+        threshold: float,
+    ) -> tuple[np.ndarray, np.ndarray]:
         t_img = (self._img > threshold).astype(np.int8) * 2 - 1
         marker = self._pattern_img
 
         if len(marker.shape) == 3:
             marker = marker[:, :, 0]
 
-        t_mrk = (marker > 0) * 2 - 1
-        return fftconvolve(t_img, t_mrk, mode='same')
+        t_mrk = (marker > 0).astype(np.int8) * 2 - 1
+        return t_img, t_mrk
+
+    def get_convolution(self, threshold: float = 127) -> np.ndarray:
+        return convolve_same(*self._get_thresholded(threshold))
+
+    def get_coarse_to_fine_convolution(
+        self,
+        candidates: int,
+        threshold: float = 127,
+        downscale: int = 4,
+    ) -> np.ndarray:
+        """Convolution only computed at full resolution around the best hits
+        of a convolution of downscaled images.
+
+        Elsewhere the convolution has a value lower than any possible
+        marker match.
+
+        :param candidates: Number of hits on the downscaled convolution
+        :param threshold: Image threshold
+        :param downscale: Downscale factor, it is reduced if the marker
+            would become too small.
+        """
+        t_img, t_mrk = self._get_thresholded(threshold)
+        downscale = max(1, min(
+            downscale,
+            min(t_mrk.shape) // _MIN_COARSE_MARKER_SIZE,
+        ))
+        if downscale == 1:
+            return convolve_same(t_img, t_mrk)
+
+        coarse = convolve_same(
+            _block_mean(t_img, downscale),
+            _block_mean(t_mrk, downscale),
+        )
+        coarse_stencil = [size // downscale for size in t_mrk.shape]
+        conv_img = np.full(t_img.shape, -float(t_mrk.size) - 1)
+        for _ in range(candidates):
+            hit = [
+                int(pos)
+                for pos in np.unravel_index(coarse.argmax(), coarse.shape)
+            ]
+            coarse[
+                max(0, hit[0] - coarse_stencil[0]):
+                hit[0] + coarse_stencil[0] + 1,
+                max(0, hit[1] - coarse_stencil[1]):
+                hit[1] + coarse_stencil[1] + 1,
+            ] = -np.inf
+            self._set_local_convolution(
+                conv_img,
+                t_img,
+                t_mrk,
+                [(pos + 0.5) * downscale for pos in hit],
+                downscale,
+            )
+        return conv_img
+
+    @staticmethod
+    def _set_local_convolution(
+        conv_img: np.ndarray,
+        t_img: np.ndarray,
+        t_mrk: np.ndarray,
+        center: list[float],
+        margin: int,
+    ) -> None:
+        window = [
+            (
+                max(0, int(pos - size // 2 - 2 * margin - 2)),
+                min(limit, int(pos + size // 2 + 2 * margin + 2) + 1),
+            )
+            for pos, size, limit in zip(center, t_mrk.shape, t_img.shape)
+        ]
+        source = [
+            (max(0, low - size // 2 - 1), min(limit, high + size // 2 + 1))
+            for (low, high), size, limit in zip(
+                window,
+                t_mrk.shape,
+                t_img.shape,
+            )
+        ]
+        local = convolve_same(
+            t_img[source[0][0]: source[0][1], source[1][0]: source[1][1]],
+            t_mrk,
+        )
+        conv_img[
+            window[0][0]: window[0][1],
+            window[1][0]: window[1][1],
+        ] = local[
+            window[0][0] - source[0][0]: window[0][1] - source[0][0],
+            window[1][0] - source[1][0]: window[1][1] - source[1][0],
+        ]
 
     @staticmethod
     def get_best_location(
@@ -188,12 +335,13 @@ class FixtureImage:
     ) -> tuple[Optional[np.ndarray], np.ndarray]:
         """This whas hidden and should be taken care of, is it needed"""
 
-        hit = np.where(conv_img == conv_img.max())
-
-        if len(hit[0]) == 0:
+        if conv_img.size == 0 or np.isnan(conv_img.max()):
             return None, conv_img
 
-        hit = np.array((hit[0][0], hit[1][0]), dtype=float)
+        hit = np.array(
+            np.unravel_index(conv_img.argmax(), conv_img.shape),
+            dtype=float,
+        )
 
         # Zeroing out hit
         half_stencil_size = [x / 2.0 for x in stencil_size]
@@ -271,18 +419,27 @@ class FixtureImage:
         self,
         markings: int = 3,
         img_threshold: float = 127,
+        downscale: int = 4,
     ) -> tuple[np.ndarray, np.ndarray]:
         """This function returns the image positions as numpy arrays that
-        are scaled to match the ORIGINAL IMAGE size"""
+        are scaled to match the ORIGINAL IMAGE size
+
+        The markers are first searched for on an image downscaled by
+        `downscale` and then located at full resolution. Use a downscale
+        of 1 to search the full resolution image directly."""
 
-        c1 = self.get_convolution(threshold=img_threshold)
+        c1 = self.get_coarse_to_fine_convolution(
+            2 * markings,
+            threshold=img_threshold,
+            downscale=downscale,
+        )
 
         m1 = np.array(self.get_best_locations(
             c1,
             self._pattern_img.shape,
             markings,
             refine_hit_gauss_weight_size_fraction=3.5,
-        )) * self._conversion_factor
+        )) * self._conversion_factor + self._offset
 
         try:
             return m1[:, 1], m1[:, 0]
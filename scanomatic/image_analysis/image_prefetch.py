@@ -0,0 +1,92 @@
+"""Background loading of the images an analysis will need next.
+
+Decoding a scan image is mostly spent in the TIFF decoder and in numpy, both
+of which release the GIL, so a few threads are enough to have the next
+images ready while the current one is being analysed.
+"""
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+from scanomatic.io.logger import get_logger
+
+ImageLoader = Callable[[str], Optional[np.ndarray]]
+
+
+class ImagePrefetcher:
+    _LOGGER = get_logger("Image Prefetcher")
+
+    def __init__(
+        self,
+        loader: ImageLoader,
+        depth: int,
+        memory_limit: int,
+        workers: int = 1,
+    ):
+        """
+        :param loader: Loads the image at a path, returning None on failure
+        :param depth: Maximum number of images loaded ahead of use
+        :param memory_limit: Maximum bytes held by images loaded ahead of use
+        :param workers: Number of loading threads
+        """
+        self._loader = loader
+        self._depth = depth
+        self._memory_limit = memory_limit
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, workers),
+            thread_name_prefix="image-prefetch",
+        )
+        self._pending: OrderedDict[str, Future] = OrderedDict()
+        self._image_size = 0
+
+    @property
+    def _capacity(self) -> int:
+        if self._image_size <= 0:
+            return min(self._depth, 1)
+        return min(self._depth, self._memory_limit // self._image_size)
+
+    def prefetch(self, paths: Iterable[str]) -> None:
+        """Start loading the upcoming images in order of use
+
+        Images no longer among the upcoming are dropped, and no more images
+        are started than the depth and memory limit allows.
+        """
+        paths = list(paths)
+        for path in set(self._pending).difference(paths):
+            self._pending.pop(path).cancel()
+
+        capacity = self._capacity
+        for path in paths:
+            if len(self._pending) >= capacity:
+                break
+            if path not in self._pending:
+                self._pending[path] = self._executor.submit(self._load, path)
+
+    def _load(self, path: str) -> Optional[np.ndarray]:
+        im = self._loader(path)
+        if im is not None:
+            self._image_size = max(self._image_size, im.nbytes)
+        return im
+
+    def get(self, path: str) -> Optional[np.ndarray]:
+        """The prefetched image, waiting for it if still loading
+
+        Returns None if the image was never requested or failed to load.
+        """
+        future = self._pending.pop(path, None)
+        if future is None or future.cancelled():
+            return None
+        try:
+            return future.result()
+        except Exception:
+            self._LOGGER.exception(f"Failed to prefetch image '{path}'")
+            return None
+
+    def close(self) -> None:
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=True)
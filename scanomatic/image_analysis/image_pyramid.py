@@ -0,0 +1,159 @@
+"""Power of two downscaled versions of scans.
+
+Each level of a pyramid halves the previous one by averaging blocks of 2 x 2
+pixels. A level costs a quarter of the one before, so building all levels
+costs about a third of halving the full image once. Pixel i of level L is
+the mean of a block of 2 ** L pixels, centred at `i * 2 ** L` plus
+`get_sample_offset(L)` in the full image.
+
+Pyramids of images on disk are kept in a small least recently used cache
+keyed by the path and modification time of the image. Marker detection,
+previews and quality control asking for downscaled views of the same scan
+then share the levels instead of interpolating the full image each time.
+"""
+import os
+import weakref
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from scanomatic.io.logger import get_logger
+
+_logger = get_logger("Image Pyramid")
+
+MAX_LEVEL = 4
+_CACHE_SIZE = 8
+_cache: "OrderedDict[tuple, ImagePyramid]" = OrderedDict()
+
+
+def halve(im: np.ndarray) -> np.ndarray:
+    """Mean of each 2 x 2 block, trailing odd rows and columns are dropped
+
+    Integer images are rounded and keep their type.
+    """
+    rows = im.shape[0] // 2 * 2
+    cols = im.shape[1] // 2 * 2
+    if np.issubdtype(im.dtype, np.integer):
+        # Sums of four 8 bit values fit in 16 bits
+        sums = np.add(
+            im[0:rows:2, :cols],
+            im[1:rows:2, :cols],
+            dtype=np.uint16 if im.itemsize == 1 else np.int64,
+        )
+        sums = sums[:, 0::2] + sums[:, 1::2]
+        sums += 2
+        sums >>= 2
+        return sums.astype(im.dtype)
+    sums = im[0:rows:2, :cols] + im[1:rows:2, :cols]
+    return (sums[:, 0::2] + sums[:, 1::2]) / 4
+
+
+def get_sample_offset(level: int) -> float:
+    """Offset of the block centres of a level in full image pixels"""
+    return (2 ** level - 1) / 2
+
+
+def get_downscale_level(scale: float) -> Optional[int]:
+    """The pyramid level of a scale, None if not a power of two downscale"""
+    if not 0 < scale <= 1:
+        return None
+    level = int(round(-np.log2(scale)))
+    if level <= MAX_LEVEL and np.isclose(scale, 2. ** -level):
+        return level
+    return None
+
+
+class ImagePyramid:
+    def __init__(self, im: np.ndarray, levels: int = MAX_LEVEL):
+        """Build the downscaled levels of an image
+
+        The image itself is not kept.
+
+        :param im: The full resolution image
+        :param levels: Number of downscaled levels
+        """
+        self._shape = im.shape
+        self._source = weakref.ref(im)
+        self._levels: list[np.ndarray] = []
+        for _ in range(levels):
+            im = halve(im)
+            self._levels.append(im)
+
+    def is_of(self, im: np.ndarray) -> bool:
+        """If the pyramid was built from the image"""
+        return self._source() is im
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        """Shape of the full resolution image"""
+        return self._shape
+
+    @property
+    def levels(self) -> int:
+        return len(self._levels)
+
+    def get_level(self, level: int) -> np.ndarray:
+        """The image downscaled by `2 ** level`, level must be at least 1"""
+        if not 1 <= level <= self.levels:
+            raise ValueError(
+                f"Level {level} outside pyramid levels 1 - {self.levels}",
+            )
+        return self._levels[level - 1]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self._levels)
+
+
+def _get_cache_key(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+def get_cached_pyramid(
+    path: str,
+    im: Optional[np.ndarray] = None,
+) -> Optional[ImagePyramid]:
+    """The cached pyramid of the image at a path, if any
+
+    :param path: Path of the image
+    :param im: If given, only a pyramid built from this array is returned
+    """
+    key = _get_cache_key(path)
+    if key is None or key not in _cache:
+        return None
+    pyramid = _cache[key]
+    if im is not None and not pyramid.is_of(im):
+        return None
+    _cache.move_to_end(key)
+    return pyramid
+
+
+def get_pyramid(im: np.ndarray, path: Optional[str] = None) -> ImagePyramid:
+    """The pyramid of an image
+
+    :param im: The full resolution image
+    :param path: Path of the image, if given the pyramid is cached for it
+        and an already cached pyramid of the same array is reused.
+    """
+    if path is not None:
+        pyramid = get_cached_pyramid(path, im)
+        if pyramid is not None:
+            return pyramid
+
+    pyramid = ImagePyramid(im)
+    key = None if path is None else _get_cache_key(path)
+    if key is not None:
+        _cache[key] = pyramid
+        if len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+        _logger.info(f"Cached image pyramid of {path}")
+    return pyramid
+
+
+def clear_cache() -> None:
+    _cache.clear()
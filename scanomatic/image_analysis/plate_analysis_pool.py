@@ -0,0 +1,425 @@
+"""Worker processes that grid and analyse the plates of a scan image
+concurrently.
+
+Each worker owns the `GridArray`s of the plates assigned to it, so that the
+blob detection history of every grid cell survives between images. The
+image is handed to the workers through shared memory and only the resulting
+plate features travel back over the pipes.
+"""
+import time
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from collections.abc import Callable, Collection
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+from scanomatic.io.logger import get_logger
+from scanomatic.io.shared_arrays import SharedArrays, start_resource_tracker
+from scanomatic.models.analysis_model import AnalysisFeatures
+from scanomatic.models.compile_project_model import CompileImageAnalysisModel
+
+from .grid_array import GridArray
+
+_ACTION_SET_GRID_ARRAY = "set grid array"
+_ACTION_GET_GRID_ARRAY = "get grid array"
+_ACTION_ANALYSE = "analyse"
+_ACTION_DETECT_GRIDS = "detect grids"
+
+# Plate index, byte offset into shared image, shape and strides of section
+SectionLayout = tuple[int, int, Tuple[int, ...], Tuple[int, ...]]
+
+
+class PlateAnalysisError(Exception):
+    pass
+
+
+def _get_section(
+    buffer: memoryview,
+    dtype: str,
+    layout: SectionLayout,
+) -> np.ndarray:
+    _, offset, shape, strides = layout
+    return np.ndarray(
+        shape,
+        dtype=dtype,
+        buffer=buffer,
+        offset=offset,
+        strides=strides,
+    )
+
+
+def _analyse(
+    grid_arrays: dict[int, GridArray],
+    buffer: memoryview,
+    dtype: str,
+    layouts: list[SectionLayout],
+    image_model: CompileImageAnalysisModel,
+) -> dict[int, AnalysisFeatures]:
+    features = {}
+    for layout in layouts:
+        grid_arr = grid_arrays[layout[0]]
+        grid_arr.analyse(_get_section(buffer, dtype, layout), image_model)
+        features[layout[0]] = grid_arr.features
+    return features
+
+
+def _detect_grids(
+    grid_arrays: dict[int, GridArray],
+    buffer: memoryview,
+    dtype: str,
+    layouts: list[SectionLayout],
+    detection: tuple[dict[int, GridArray], Optional[str]],
+) -> dict[int, tuple[bool, Any]]:
+    plates, analysis_directory = detection
+    results: dict[int, tuple[bool, Any]] = {}
+    for layout in layouts:
+        grid_arr = plates[layout[0]]
+        try:
+            grid_arr.detect_grid(
+                _get_section(buffer, dtype, layout),
+                analysis_directory=analysis_directory,
+            )
+        except Exception as error:
+            results[layout[0]] = (False, repr(error))
+            continue
+        grid_arrays[layout[0]] = grid_arr
+        results[layout[0]] = (True, grid_arr)
+    return results
+
+
+def _plate_worker(connection: Connection) -> None:
+    grid_arrays: dict[int, GridArray] = {}
+    shared_image: Optional[SharedMemory] = None
+
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+
+        if message is None:
+            break
+
+        action, payload = message
+        if action == _ACTION_SET_GRID_ARRAY:
+            grid_arrays[payload.index] = payload
+            continue
+        elif action == _ACTION_GET_GRID_ARRAY:
+            connection.send(grid_arrays.get(payload))
+            continue
+
+        try:
+            name, dtype, layouts, argument = payload
+            if shared_image is None or shared_image.name != name:
+                if shared_image is not None:
+                    shared_image.close()
+                shared_image = SharedMemory(name=name)
+
+            if action == _ACTION_DETECT_GRIDS:
+                result: dict[int, Any] = _detect_grids(
+                    grid_arrays,
+                    shared_image.buf,
+                    dtype,
+                    layouts,
+                    argument,
+                )
+            else:
+                result = _analyse(
+                    grid_arrays,
+                    shared_image.buf,
+                    dtype,
+                    layouts,
+                    argument,
+                )
+            connection.send((True, result))
+        except Exception as error:
+            connection.send((False, repr(error)))
+
+    if shared_image is not None:
+        shared_image.close()
+    connection.close()
+
+
+class PlateAnalysisPool:
+    """A fixed set of processes that grid and analyse plates in parallel.
+
+    Plates are assigned to workers by their index, so the same worker always
+    analyses the same plate and can keep its `GridArray` between images.
+    """
+    _LOGGER = get_logger("Plate Analysis Pool")
+
+    def __init__(self, workers: int):
+        self._connections: list[Connection] = []
+        self._processes: list[Process] = []
+        self._held_plates: list[set[int]] = []
+        self._shared_image: Optional[SharedArrays] = None
+        self._image: Optional[np.ndarray] = None
+
+        start_resource_tracker()
+        for _ in range(workers):
+            connection, process = self._start_worker()
+            self._connections.append(connection)
+            self._processes.append(process)
+            self._held_plates.append(set())
+
+        self._LOGGER.info(f"Started {workers} plate analysis workers")
+
+    @staticmethod
+    def _start_worker() -> tuple[Connection, Process]:
+        parent_connection, child_connection = Pipe()
+        process = Process(
+            target=_plate_worker,
+            args=(child_connection,),
+            daemon=True,
+        )
+        process.start()
+        child_connection.close()
+        return parent_connection, process
+
+    def _restart_worker(self, worker: int) -> None:
+        """Replace a hung or dead worker, its plates are lost with it."""
+        self._processes[worker].terminate()
+        self._processes[worker].join(timeout=5)
+        self._connections[worker].close()
+        self._connections[worker], self._processes[worker] = (
+            self._start_worker()
+        )
+        self._held_plates[worker].clear()
+
+    @property
+    def workers(self) -> int:
+        return len(self._connections)
+
+    def _get_worker(self, plate_index: int) -> int:
+        return plate_index % self.workers
+
+    def _get_connection(self, plate_index: int) -> Connection:
+        return self._connections[self._get_worker(plate_index)]
+
+    def holds_grid_array(self, plate_index: int) -> bool:
+        """If the worker of the plate has a current copy of it"""
+        return plate_index in self._held_plates[self._get_worker(plate_index)]
+
+    def release_grid_arrays(self, plate_indices: Collection[int]) -> None:
+        """Mark the workers' copies of plates as outdated.
+
+        They must be handed over again with `set_grid_array` before
+        they are analysed.
+        """
+        for plate_index in plate_indices:
+            self._held_plates[self._get_worker(plate_index)].discard(
+                plate_index,
+            )
+
+    def set_grid_array(self, grid_array: GridArray) -> None:
+        """Hand over a gridded plate to the worker that will analyse it.
+
+        Any analysis history the worker had for the plate is replaced.
+        """
+        self._get_connection(grid_array.index).send(
+            (_ACTION_SET_GRID_ARRAY, grid_array),
+        )
+        self._held_plates[self._get_worker(grid_array.index)].add(
+            grid_array.index,
+        )
+
+    def get_grid_array(self, plate_index: int) -> Optional[GridArray]:
+        """The worker's copy of a plate, with its analysis history."""
+        connection = self._get_connection(plate_index)
+        connection.send((_ACTION_GET_GRID_ARRAY, plate_index))
+        return connection.recv()
+
+    def share_image(self, im: np.ndarray) -> np.ndarray:
+        """Copy image into shared memory and return the shared version.
+
+        Sections of the returned array can be analysed by the workers
+        without being pickled.
+        """
+        if im is self._image:
+            return im
+
+        if (
+            self._shared_image is None
+            or self._shared_image.size < im.nbytes
+        ):
+            self._release_shared_image()
+            self._shared_image = SharedArrays(im.nbytes)
+        else:
+            self._shared_image.clear()
+
+        self._image, _ = self._shared_image.add(im)
+        return self._image
+
+    def _get_section_layout(
+        self,
+        plate_index: int,
+        section: np.ndarray,
+    ) -> SectionLayout:
+        assert self._image is not None
+        if not np.shares_memory(section, self._image):
+            raise PlateAnalysisError(
+                f"Section of plate {plate_index} is not in the shared image",
+            )
+        offset = (
+            section.__array_interface__['data'][0]
+            - self._image.__array_interface__['data'][0]
+        )
+        return plate_index, offset, section.shape, section.strides
+
+    def analyse(
+        self,
+        sections: dict[int, np.ndarray],
+        image_model: CompileImageAnalysisModel,
+    ) -> dict[int, AnalysisFeatures]:
+        """Analyse plate sections of the shared image in parallel.
+
+        :param sections: Plate image sections per plate index, each a view
+            into the array returned by `share_image`.
+        :param image_model: The compilation model of the image
+        :return: The plate features per plate index
+        """
+        layouts = self._send_sections(
+            _ACTION_ANALYSE,
+            sections,
+            lambda _: image_model,
+        )
+        features: dict[int, Any] = {}
+        errors = []
+        for worker in layouts:
+            success, result = self._connections[worker].recv()
+            if success:
+                features.update(result)
+            else:
+                errors.append(result)
+
+        if errors:
+            raise PlateAnalysisError(
+                "Plate analysis failed: {0}".format(", ".join(errors)),
+            )
+        return {index: features[index] for index in sorted(features)}
+
+    def detect_grids(
+        self,
+        grid_arrays: dict[int, GridArray],
+        sections: dict[int, np.ndarray],
+        analysis_directory: Optional[str],
+        timeout: float,
+    ) -> dict[int, GridArray]:
+        """Detect the grids of plates in parallel.
+
+        The workers keep the gridded plates, replacing any previous
+        analysis history. Failures are logged and workers that don't
+        finish in time are terminated and replaced, losing all plates
+        they held.
+
+        :param grid_arrays: The plates to grid per plate index
+        :param sections: Plate image sections per plate index, each a view
+            into the array returned by `share_image`.
+        :param analysis_directory: Where to put grid detection debug output
+        :param timeout: Seconds to wait for the workers
+        :return: Copies of the gridded plates per plate index, plates
+            where detection failed are left out.
+        """
+        layouts = self._send_sections(
+            _ACTION_DETECT_GRIDS,
+            sections,
+            lambda worker: (
+                {
+                    index: grid_arrays[index] for index in sections
+                    if self._get_worker(index) == worker
+                },
+                analysis_directory,
+            ),
+        )
+
+        deadline = time.monotonic() + timeout
+        gridded: dict[int, GridArray] = {}
+        for worker, worker_layouts in layouts.items():
+            plates = [layout[0] + 1 for layout in worker_layouts]
+            connection = self._connections[worker]
+            try:
+                if not connection.poll(max(deadline - time.monotonic(), 0)):
+                    self._LOGGER.error(
+                        f"Grid detection on plates {plates} did not finish"
+                        f" within {timeout}s",
+                    )
+                    self._restart_worker(worker)
+                    continue
+                success, results = connection.recv()
+            except (EOFError, OSError):
+                self._LOGGER.error(
+                    f"Worker died while detecting grids on plates {plates}",
+                )
+                self._restart_worker(worker)
+                continue
+
+            if not success:
+                self._LOGGER.error(
+                    f"Grid detection on plates {plates} failed: {results}",
+                )
+                continue
+            for index, (detected, result) in results.items():
+                if detected:
+                    gridded[index] = result
+                    self._held_plates[worker].add(index)
+                else:
+                    self._LOGGER.error(
+                        f"Grid detection on plate {index + 1} failed:"
+                        f" {result}",
+                    )
+        return {index: gridded[index] for index in sorted(gridded)}
+
+    def _send_sections(
+        self,
+        action: str,
+        sections: dict[int, np.ndarray],
+        get_argument: Callable[[int], Any],
+    ) -> dict[int, list[SectionLayout]]:
+        """Send sections of the shared image to their workers
+
+        :param get_argument: The argument of the action for a worker
+        :return: The sent section layouts per worker
+        """
+        assert self._shared_image is not None and self._image is not None
+        layouts: dict[int, list[SectionLayout]] = {}
+        for plate_index in sorted(sections):
+            layouts.setdefault(self._get_worker(plate_index), []).append(
+                self._get_section_layout(plate_index, sections[plate_index]),
+            )
+
+        for worker, worker_layouts in layouts.items():
+            self._connections[worker].send((
+                action,
+                (
+                    self._shared_image.name,
+                    self._image.dtype.str,
+                    worker_layouts,
+                    get_argument(worker),
+                ),
+            ))
+        return layouts
+
+    def _release_shared_image(self) -> None:
+        self._image = None
+        if self._shared_image is not None:
+            self._shared_image.release()
+            self._shared_image = None
+
+    def close(self) -> None:
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for connection in self._connections:
+            connection.close()
+        self._connections = []
+        self._processes = []
+        self._held_plates = []
+        self._release_shared_image()
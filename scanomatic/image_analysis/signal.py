@@ -56,16 +56,12 @@ def get_signal_data(
         expected_spikes,
     )).argmin(axis=1)
 
-    deltas = []
-    for observed_i, expected_i in enumerate(observed_to_expected_index_map):
-        deltas.append(abs(
-            expected_spikes[expected_i]
-            - observed_spikes[observed_i]
-        ))
-        if deltas[-1] > delta_threshold:
-            deltas[-1] = np.nan
+    deltas = np.abs(
+        expected_spikes[observed_to_expected_index_map] - observed_spikes
+    )
+    deltas[deltas > delta_threshold] = np.nan
 
-    return np.array(deltas), observed_spikes, observed_to_expected_index_map
+    return deltas, observed_spikes, observed_to_expected_index_map
 
 
 def get_signal_edges(
@@ -194,8 +190,6 @@ def get_best_offset(
 
     """
 
-    dist_results = []
-
     if sum(measures.shape) == 0:
         _logger.warning(
             "No spikes where passed, so best offset can't be found.",
@@ -216,23 +210,13 @@ def get_best_offset(
     if np.isnan(frequency):
         return None
 
-    for offset in range(int(np.ceil(frequency))):
-        quality = []
-
-        for m in m_where:
-
-            # IMPROVE THIS ONE...
-            # n_signal_dist is peak index of the closest signal peak
-            n_signal_dist = np.round((m - offset) / frequency)
-
-            signal_diff = offset + frequency * n_signal_dist - m
-            if abs(signal_diff) > 0:
-                quality.append(signal_diff ** 2)
-            else:
-                quality.append(0)
-        dist_results.append(np.sum(np.sort(np.asarray(quality))[:n]))
+    offsets = np.arange(int(np.ceil(frequency)))[:, np.newaxis]
+    # n_signal_dist is peak index of the closest signal peak for each offset
+    n_signal_dist = np.round((m_where - offsets) / frequency)
+    signal_diff = offsets + frequency * n_signal_dist - m_where
+    dist_results = np.sort(signal_diff ** 2, axis=1)[:, :n].sum(axis=1)
 
-    return int(np.asarray(dist_results).argmin())
+    return int(dist_results.argmin())
 
 
 def get_spike_quality(
@@ -0,0 +1,375 @@
+"""A columnar store of all measures of all compartments of every colony.
+
+Each compartment and measure pair, e.g. `Blob_Sum`, is a column in its own
+directory. A column is split into chunks of a fixed number of images, each
+holding a `(plates, rows, cols, images)` array, with an extra trailing axis
+for measures that have several values such as the IQR. Chunks are saved as
+plain or compressed numpy files, so one measure can be read without
+touching the others.
+
+Plates with smaller pinning than the largest plate only use the leading
+rows and columns, the same way as in the growth data store.
+"""
+import glob
+import os
+import re
+import shutil
+from typing import Optional, Union
+from collections.abc import Sequence
+
+import numpy as np
+
+import scanomatic.io.paths as paths
+from scanomatic.io.logger import get_logger
+from scanomatic.models.analysis_model import (
+    COMPARTMENTS,
+    MEASURES,
+    AnalysisFeatures
+)
+
+PlateShapes = Sequence[Optional[tuple[int, int]]]
+
+_CHUNK_PATTERN = "chunk_{0}.{1}"
+_CHUNK_INDEX = re.compile(r"chunk_(\d+)\.np[yz]$")
+
+
+def get_column_name(compartment: COMPARTMENTS, measure: MEASURES) -> str:
+    return f"{compartment.name}_{measure.name}"
+
+
+class FeatureStore:
+    _LOGGER = get_logger("Feature Store")
+    _PATHS = paths.Paths()
+
+    def __init__(
+        self,
+        directory: str,
+        plate_shapes: np.ndarray,
+        times: np.ndarray,
+        chunk_size: int,
+        compressed: bool = False,
+    ):
+        self._directory = directory
+        self._shapes = plate_shapes
+        self._times = times
+        self._chunk_size = chunk_size
+        self._compressed = compressed
+        self._chunks: dict[int, dict[str, np.ndarray]] = {}
+
+    @staticmethod
+    def get_directory(analysis_directory: str) -> str:
+        return os.path.join(
+            analysis_directory,
+            FeatureStore._PATHS.feature_store,
+        )
+
+    @staticmethod
+    def exists(analysis_directory: str) -> bool:
+        return os.path.isfile(os.path.join(
+            FeatureStore.get_directory(analysis_directory),
+            FeatureStore._PATHS.feature_store_shapes,
+        ))
+
+    @staticmethod
+    def remove(analysis_directory: str) -> bool:
+        """Remove the store, returning if there was one"""
+        directory = FeatureStore.get_directory(analysis_directory)
+        if not os.path.isdir(directory):
+            return False
+        shutil.rmtree(directory)
+        return True
+
+    @classmethod
+    def create(
+        cls,
+        analysis_directory: str,
+        plate_shapes: PlateShapes,
+        chunk_size: int = 32,
+        compressed: bool = False,
+    ) -> "FeatureStore":
+        """Start a new store
+
+        :param analysis_directory: The analysis directory
+        :param plate_shapes: The pinning of each plate, None for plates
+            that are not analysed
+        :param chunk_size: Number of images per chunk
+        :param compressed: If chunks should be compressed
+        """
+        directory = cls.get_directory(analysis_directory)
+        os.makedirs(directory, exist_ok=True)
+        shapes = np.array(
+            [shape if shape else (0, 0) for shape in plate_shapes],
+            dtype=int,
+        ).reshape(-1, 2)
+        np.save(
+            os.path.join(directory, cls._PATHS.feature_store_shapes),
+            shapes,
+        )
+        return cls(
+            directory,
+            shapes,
+            np.full((0,), np.nan),
+            max(chunk_size, 1),
+            compressed,
+        )
+
+    @classmethod
+    def load(
+        cls,
+        analysis_directory: str,
+        chunk_size: int = 32,
+        compressed: bool = False,
+    ) -> Optional["FeatureStore"]:
+        """Open an existing store
+
+        Only the plate shapes and image times are read, columns are read
+        when requested.
+
+        :param analysis_directory: The analysis directory
+        :param chunk_size: Number of images per chunk for new chunks if the
+            store has none yet. Otherwise the size of the existing chunks is
+            kept.
+        :param compressed: If new chunks should be compressed
+        :return: The store or None if there is none
+        """
+        if not cls.exists(analysis_directory):
+            return None
+        directory = cls.get_directory(analysis_directory)
+        try:
+            shapes = np.load(os.path.join(
+                directory,
+                cls._PATHS.feature_store_shapes,
+            ))
+            times_path = os.path.join(
+                directory,
+                cls._PATHS.feature_store_times,
+            )
+            times = (
+                np.load(times_path) if os.path.isfile(times_path)
+                else np.full((0,), np.nan)
+            )
+        except (IOError, ValueError):
+            cls._LOGGER.exception(f"Could not load features in {directory}")
+            return None
+        store = cls(directory, shapes, times, chunk_size, compressed)
+        store._chunk_size = store._get_existing_chunk_size() or chunk_size
+        return store
+
+    @property
+    def plate_shapes(self) -> list[Optional[tuple[int, int]]]:
+        return [
+            (int(rows), int(cols)) if rows else None
+            for rows, cols in self._shapes
+        ]
+
+    @property
+    def columns(self) -> list[str]:
+        """Names of the stored compartment and measure pairs"""
+        return sorted(
+            name for name in os.listdir(self._directory)
+            if os.path.isdir(os.path.join(self._directory, name))
+        )
+
+    def _get_chunk_paths(self, column: str) -> dict[int, str]:
+        chunk_paths = {}
+        for path in glob.iglob(os.path.join(
+            self._directory,
+            column,
+            _CHUNK_PATTERN.format("*", "np*"),
+        )):
+            match = _CHUNK_INDEX.search(path)
+            if match:
+                chunk_paths[int(match.group(1))] = path
+        return chunk_paths
+
+    def _get_existing_chunk_size(self) -> Optional[int]:
+        for column in self.columns:
+            for path in self._get_chunk_paths(column).values():
+                return self._read_chunk(path).shape[3]
+        return None
+
+    @staticmethod
+    def _read_chunk(path: str) -> np.ndarray:
+        if path.endswith(".npz"):
+            with np.load(path) as data:
+                return data["data"]
+        return np.load(path, mmap_mode='r')
+
+    def _write_chunk(self, column: str, chunk_index: int, data: np.ndarray):
+        directory = os.path.join(self._directory, column)
+        os.makedirs(directory, exist_ok=True)
+        extension, other_extension = (
+            ("npz", "npy") if self._compressed else ("npy", "npz")
+        )
+        path = os.path.join(
+            directory,
+            _CHUNK_PATTERN.format(chunk_index, extension),
+        )
+        try:
+            os.remove(os.path.join(
+                directory,
+                _CHUNK_PATTERN.format(chunk_index, other_extension),
+            ))
+        except OSError:
+            pass
+        with open(f"{path}.tmp", 'wb') as fh:
+            if self._compressed:
+                np.savez_compressed(fh, data=data)
+            else:
+                np.save(fh, data)
+        os.replace(f"{path}.tmp", path)
+
+    def _get_chunk(self, chunk_index: int) -> dict[str, np.ndarray]:
+        if chunk_index not in self._chunks:
+            self._chunks[chunk_index] = {}
+            for column in self.columns:
+                path = self._get_chunk_paths(column).get(chunk_index)
+                if path is not None:
+                    self._chunks[chunk_index][column] = np.array(
+                        self._read_chunk(path),
+                    )
+        return self._chunks[chunk_index]
+
+    def _get_column_chunk(
+        self,
+        chunk: dict[str, np.ndarray],
+        column: str,
+        width: int,
+    ) -> np.ndarray:
+        if column not in chunk:
+            shape: tuple[int, ...] = (
+                len(self._shapes),
+                max(self._shapes[:, 0], default=0),
+                max(self._shapes[:, 1], default=0),
+                self._chunk_size,
+            )
+            if width > 1:
+                shape += (width,)
+            chunk[column] = np.full(shape, np.nan)
+        return chunk[column]
+
+    def write(
+        self,
+        image_index: int,
+        time: float,
+        features: AnalysisFeatures,
+    ) -> None:
+        """Keep all measures of one image
+
+        The values are written to disk when the chunk of the image is
+        complete or the store is flushed.
+
+        :param image_index: The index of the image
+        :param time: The time of the image in hours
+        :param features: The features of the image
+        """
+        chunk_index, position = divmod(image_index, self._chunk_size)
+        chunk = self._get_chunk(chunk_index)
+        for plate_features in features.data:
+            if plate_features is None:
+                continue
+            for cell_features in plate_features.data:
+                row, col = cell_features.index[::-1]
+                for compartment, compartment_features in (
+                    cell_features.data.items()
+                ):
+                    for measure, value in compartment_features.data.items():
+                        if value is None:
+                            continue
+                        value = np.asarray(value, dtype=float).ravel()
+                        self._get_column_chunk(
+                            chunk,
+                            get_column_name(compartment, measure),
+                            value.size,
+                        )[plate_features.index, row, col, position] = (
+                            value if value.size > 1 else value[0]
+                        )
+
+        if image_index >= self._times.size:
+            times = np.full((image_index + 1,), np.nan)
+            times[:self._times.size] = self._times
+            self._times = times
+        self._times[image_index] = time
+
+        chunk_times = self._times[
+            chunk_index * self._chunk_size:
+            (chunk_index + 1) * self._chunk_size
+        ]
+        if chunk_times.size == self._chunk_size and np.isfinite(
+            chunk_times,
+        ).all():
+            self._flush_chunk(chunk_index)
+
+    def _flush_chunk(self, chunk_index: int) -> None:
+        for column, data in self._chunks.pop(chunk_index, {}).items():
+            self._write_chunk(column, chunk_index, data)
+
+    def flush(self) -> None:
+        """Write all incomplete chunks and the image times"""
+        for chunk_index in list(self._chunks):
+            self._flush_chunk(chunk_index)
+        np.save(
+            os.path.join(self._directory, self._PATHS.feature_store_times),
+            self._times,
+        )
+
+    @property
+    def _written(self) -> Union[slice, np.ndarray]:
+        written = np.isfinite(self._times)
+        count = int(written.sum())
+        if written[:count].all():
+            return slice(0, count)
+        return np.flatnonzero(written)
+
+    @property
+    def times(self) -> np.ndarray:
+        """The times in hours of the written images"""
+        return self._times[self._written]
+
+    def read(
+        self,
+        compartment: COMPARTMENTS,
+        measure: MEASURES,
+    ) -> Optional[np.ndarray]:
+        """Read the values of one measure for all written images
+
+        Only the chunks of the requested measure are read.
+
+        :return: Per plate a `(rows, cols, images)` array, or
+            `(rows, cols, images, values)` for measures with several values,
+            None for plates not analysed. None if the measure was not
+            stored.
+        """
+        column = get_column_name(compartment, measure)
+        chunk_paths = self._get_chunk_paths(column)
+        if not chunk_paths:
+            return None
+
+        chunks = {
+            chunk_index: self._read_chunk(path)
+            for chunk_index, path in chunk_paths.items()
+        }
+        first = next(iter(chunks.values()))
+        data = np.full(
+            first.shape[:3]
+            + ((max(chunks) + 1) * self._chunk_size,)
+            + first.shape[4:],
+            np.nan,
+        )
+        for chunk_index, chunk in chunks.items():
+            start = chunk_index * self._chunk_size
+            data[:, :, :, start:start + self._chunk_size] = chunk
+
+        images = data.shape[3]
+        written = self._written
+        if isinstance(written, slice):
+            written = slice(0, min(written.stop, images))
+        else:
+            written = written[written < images]
+        plates = np.empty((len(self._shapes),), dtype=object)
+        for index, shape in enumerate(self.plate_shapes):
+            if shape is not None:
+                plates[index] = (
+                    data[index, :shape[0], :shape[1]][:, :, written]
+                )
+        return plates
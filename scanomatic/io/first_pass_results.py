@@ -1,9 +1,19 @@
 import os
+from dataclasses import dataclass
 from enum import Enum
 from glob import glob
-from typing import Optional, cast
-from collections.abc import Sequence
-from scanomatic.io.jsonizer import copy, dump, dump_to_stream, load, load_first
+from typing import Any, Optional, cast
+from collections.abc import Collection, Iterable, Sequence
+from scanomatic.io.jsonizer import (
+    CONTENT,
+    copy,
+    dump,
+    dump_record_to_stream,
+    index_records,
+    load_first,
+    load_record,
+    load_records
+)
 from scanomatic.io.logger import get_logger
 
 from scanomatic.io.paths import Paths
@@ -20,6 +30,30 @@ class FIRST_PASS_SORTING(Enum):
     Time = 2
 
 
+@dataclass
+class _ImageRecord:
+    """An image of a compilation
+
+    Images in the compilation file are only located by their byte offset
+    and length and read when asked for, other images keep their model.
+    """
+    index: int
+    time_stamp: float
+    offset: int = -1
+    length: int = 0
+    model: Optional[CompileImageAnalysisModel] = None
+
+
+def _get_time_stamp(record: Any) -> float:
+    return float(record[CONTENT]["image"][CONTENT]["time_stamp"])
+
+
+def _get_time_stamp_sorted(
+    records: Iterable[_ImageRecord],
+) -> list[_ImageRecord]:
+    return sorted(records, key=lambda record: record.time_stamp)
+
+
 class CompilationResults:
     def __init__(
         self,
@@ -27,16 +61,19 @@ class CompilationResults:
         compile_instructions_path=None,
         scanner_instructions_path=None,
         sort_mode: FIRST_PASS_SORTING = FIRST_PASS_SORTING.Time,
+        oldest_first: bool = False,
     ):
         self._logger = get_logger("Compilation results")
+        self._oldest_first = oldest_first
         self._compilation_path = compilation_path
         self._compile_instructions: Optional[CompileInstructionsModel] = None
         self._scanner_instructions: Optional[ScanningModel] = None
         self.load_scanner_instructions(scanner_instructions_path)
         self._plates = None
         self._plate_position_keys = None
-        self._image_models: list[CompileImageAnalysisModel] = []
-        self._used_models: list[CompileImageAnalysisModel] = []
+        # Records of unused images sorted by time stamp
+        self._image_models: list[_ImageRecord] = []
+        self._used_models: list[_ImageRecord] = []
         self._current_model: Optional[CompileImageAnalysisModel] = None
         self._loading_length = 0
         if compile_instructions_path:
@@ -62,14 +99,28 @@ class CompilationResults:
             CompileInstructionsModel,
             copy(compile_instructions),
         )
-        new._image_models = cast(
-            list[CompileImageAnalysisModel],
-            copy(list(image_models)),
-        )
-        new._used_models = cast(
-            list[CompileImageAnalysisModel],
-            copy(list(used_models)),
+        new._image_models = _get_time_stamp_sorted(
+            _ImageRecord(
+                model.image.index,
+                model.image.time_stamp,
+                model=model,
+            )
+            for model in cast(
+                list[CompileImageAnalysisModel],
+                copy(list(image_models)),
+            )
         )
+        new._used_models = [
+            _ImageRecord(
+                model.image.index,
+                model.image.time_stamp,
+                model=model,
+            )
+            for model in cast(
+                list[CompileImageAnalysisModel],
+                copy(list(used_models)),
+            )
+        ]
         new._loading_length = len(new._image_models)
         new._scanner_instructions = scan_instructions
         return new
@@ -99,34 +150,80 @@ class CompilationResults:
         path: str,
         sort_mode: FIRST_PASS_SORTING = FIRST_PASS_SORTING.Time
     ):
-        images: Optional[list[CompileImageAnalysisModel]] = load(path)
-        if images is None:
-            self._logger.error(f"Could not load any images from {path}")
-            images = []
+        index = index_records(path, _get_time_stamp)
+        if index is None:
+            records = self._load_legacy_compilation(path)
         else:
-            self._logger.info(f"Loaded {len(images)} compiled images")
-
-        self._reindex_plates(images)
+            records = [
+                _ImageRecord(-1, time_stamp, offset, length)
+                for offset, length, time_stamp in index
+            ]
+        self._logger.info(f"Indexed {len(records)} compiled images")
 
-        models = copy(images)
         if sort_mode is FIRST_PASS_SORTING.Time:
-            for (index, m) in enumerate(sorted(
-                models,
-                key=lambda x: x.image.time_stamp,
-            )):
-                m.image.index = index
-            self._image_models = models
+            records = _get_time_stamp_sorted(records)
+            for (index_, record) in enumerate(records):
+                record.index = index_
         else:
             inject_time = 0.
             previous_time = 0.
-            for (index, m) in enumerate(models):
-                m.image.index = index
-                if m.image.time_stamp < previous_time:
-                    inject_time += previous_time - m.image.time_stamp
-                m.image.time_stamp += inject_time
-            self._image_models = models
+            for (index_, record) in enumerate(records):
+                record.index = index_
+                if record.time_stamp < previous_time:
+                    inject_time += previous_time - record.time_stamp
+                record.time_stamp += inject_time
+            records = _get_time_stamp_sorted(records)
+        self._image_models = records
         self._loading_length = len(self._image_models)
 
+    def _load_legacy_compilation(self, path: str) -> list[_ImageRecord]:
+        images: Optional[list[CompileImageAnalysisModel]] = load_records(
+            path,
+        )
+        if images is None:
+            self._logger.error(f"Could not load any images from {path}")
+            return []
+
+        self._reindex_plates(images)
+        return [
+            _ImageRecord(image.image.index, image.image.time_stamp, model=image)
+            for image in images
+        ]
+
+    def _get_model(
+        self,
+        record: _ImageRecord,
+        for_writing: bool = False,
+    ) -> Optional[CompileImageAnalysisModel]:
+        """The model of an image
+
+        Models read from the compilation file are new objects on every
+        call. Kept models are shared, unless they are to be changed.
+
+        :param record: The image
+        :param for_writing: If the caller will change the model
+        """
+        if record.model is not None:
+            model = record.model
+            if for_writing:
+                model = cast(CompileImageAnalysisModel, copy(model))
+        else:
+            model = load_record(
+                self._compilation_path,
+                record.offset,
+                record.length,
+            )
+            if model is None:
+                self._logger.error(
+                    f"Could not load image {record.index} from"
+                    f" {self._compilation_path}",
+                )
+                return None
+            self._reindex_plates([model])
+        model.image.index = record.index
+        model.image.time_stamp = record.time_stamp
+        return model
+
     @staticmethod
     def _reindex_plates(images):
         for image in images:
@@ -145,16 +242,11 @@ class CompilationResults:
             item %= len(self._image_models)
 
         try:
-            return sorted(
-                self._image_models,
-                key=lambda x: x.image.time_stamp
-            )[item]
-        except (ValueError, IndexError):
+            return self._get_model(self._image_models[item])
+        except IndexError:
             return None
 
     def keys(self) -> Sequence[int]:
-        if self._image_models is None:
-            return []
         return list(range(len(self._image_models)))
 
     def __add__(self, other: "CompilationResults") -> "CompilationResults":
@@ -163,14 +255,20 @@ class CompilationResults:
         other_start_index = len(self)
         other_image_models = []
         other_directory = os.path.dirname(other._compilation_path)
-        for index in range(len(other)):
-            model: CompileImageAnalysisModel = copy(other[index])
+        for record in other._image_models:
+            model = other._get_model(record, for_writing=True)
+            if model is None:
+                continue
             model.image.time_stamp += start_time_difference
             model.image.index += other_start_index
             self._update_image_path_if_needed(model, other_directory)
             other_image_models.append(model)
 
-        other_image_models += self._image_models
+        other_image_models += [
+            model for model in (
+                self._get_model(record) for record in self._image_models
+            ) if model is not None
+        ]
         other_image_models = sorted(
             other_image_models,
             key=lambda x: x.image.time_stamp,
@@ -180,7 +278,11 @@ class CompilationResults:
             self._compilation_path,
             self._compile_instructions,
             other_image_models,
-            self._used_models,
+            [
+                model for model in (
+                    self._get_model(record) for record in self._used_models
+                ) if model is not None
+            ],
             self._scanner_instructions,
         )
 
@@ -234,18 +336,47 @@ class CompilationResults:
         )
 
     def recycle(self):
-        self._image_models += self._used_models
+        self._image_models = _get_time_stamp_sorted(
+            self._image_models + self._used_models,
+        )
         self._used_models = []
         self._current_model = None
 
     def get_next_image_model(self) -> Optional[CompileImageAnalysisModel]:
-        model = self[-1]
+        model = None
+        if self._image_models:
+            record = self._image_models.pop(0 if self._oldest_first else -1)
+            self._used_models.append(record)
+            model = self._get_model(record)
         self._current_model = model
-        if model:
-            self._image_models.remove(model)
-            self._used_models.append(model)
         return model
 
+    def get_upcoming_image_models(
+        self,
+        count: int,
+    ) -> list[CompileImageAnalysisModel]:
+        """The models the coming calls to get_next_image_model will return"""
+        if count <= 0:
+            return []
+        records = (
+            self._image_models[:count] if self._oldest_first
+            else self._image_models[:-count - 1:-1]
+        )
+        return [
+            model for model in map(self._get_model, records)
+            if model is not None
+        ]
+
+    def skip_image_models(self, indices: Collection[int]) -> None:
+        """Mark the models with the given image indices as used"""
+        self._used_models += [
+            record for record in self._image_models if record.index in indices
+        ]
+        self._image_models = [
+            record for record in self._image_models
+            if record.index not in indices
+        ]
+
     def dump(
         self,
         directory,
@@ -278,7 +409,7 @@ class CompilationResults:
                     if model is None:
                         break
                     if validate(model):
-                        dump_to_stream(model, fh)
+                        dump_record_to_stream(model, fh)
         except IOError:
             self._logger.error("Could not save to directory")
             return
@@ -0,0 +1,234 @@
+"""A single store for the growth data of all plates and images of a project.
+
+The values are kept in one memory mapped `(plates, rows, cols, images)`
+array next to a vector with the time of each image in hours. Analysis writes
+each image in place, and feature extraction maps the array directly instead
+of reading and restructuring one file per image.
+
+Plates with smaller pinning than the largest plate only use the leading
+rows and columns of their part of the array. Images that have not been
+written have no time and are left out when reading.
+"""
+import os
+from typing import Optional, Union
+from collections.abc import Sequence
+
+import numpy as np
+
+import scanomatic.io.paths as paths
+from scanomatic.io.logger import get_logger
+
+PlateShapes = Sequence[Optional[tuple[int, int]]]
+
+
+class GrowthDataStore:
+    _LOGGER = get_logger("Growth Data Store")
+    _PATHS = paths.Paths()
+
+    def __init__(
+        self,
+        directory: str,
+        data: np.ndarray,
+        times: np.ndarray,
+        shapes: np.ndarray,
+    ):
+        self._directory = directory
+        self._data = data
+        self._times = times
+        self._shapes = shapes
+
+    @staticmethod
+    def get_paths(directory: str) -> tuple[str, str, str]:
+        """The data, times and plate shapes files of the store"""
+        return (
+            os.path.join(directory, GrowthDataStore._PATHS.growth_data),
+            os.path.join(directory, GrowthDataStore._PATHS.growth_data_times),
+            os.path.join(directory, GrowthDataStore._PATHS.growth_data_shapes),
+        )
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return all(
+            os.path.isfile(path)
+            for path in GrowthDataStore.get_paths(directory)
+        )
+
+    @staticmethod
+    def remove(directory: str) -> int:
+        """Remove the store files, returning how many were removed"""
+        removed = 0
+        for path in GrowthDataStore.get_paths(directory):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            else:
+                removed += 1
+        return removed
+
+    @classmethod
+    def create(
+        cls,
+        directory: str,
+        plate_shapes: PlateShapes,
+        images: int,
+    ) -> "GrowthDataStore":
+        """Preallocate a store for a number of images
+
+        :param directory: The analysis directory
+        :param plate_shapes: The pinning of each plate, None for plates
+            that are not analysed
+        :param images: The expected number of images, the store grows if
+            more are written.
+        """
+        shapes = np.array(
+            [shape if shape else (0, 0) for shape in plate_shapes],
+            dtype=int,
+        ).reshape(-1, 2)
+        data_path, times_path, shapes_path = cls.get_paths(directory)
+        np.save(shapes_path, shapes)
+        data = cls._allocate(data_path, shapes, max(images, 1))
+        times = np.lib.format.open_memmap(
+            times_path,
+            mode='w+',
+            dtype=float,
+            shape=(data.shape[-1],),
+        )
+        times[:] = np.nan
+        cls._LOGGER.info(
+            f"Created growth data store for {data.shape[-1]} images of"
+            f" {len(shapes)} plates in {directory}",
+        )
+        return cls(directory, data, times, shapes)
+
+    @staticmethod
+    def _allocate(path: str, shapes: np.ndarray, images: int) -> np.memmap:
+        data = np.lib.format.open_memmap(
+            path,
+            mode='w+',
+            dtype=float,
+            shape=(
+                len(shapes),
+                max(shapes[:, 0], default=0),
+                max(shapes[:, 1], default=0),
+                images,
+            ),
+        )
+        data[...] = np.nan
+        return data
+
+    @classmethod
+    def load(
+        cls,
+        directory: str,
+        writable: bool = False,
+    ) -> Optional["GrowthDataStore"]:
+        """Map an existing store
+
+        :param directory: The analysis directory
+        :param writable: If the store should be opened for writing more
+            images. Otherwise changes to the mapped data are only made in
+            memory.
+        :return: The store or None if there is none
+        """
+        if not cls.exists(directory):
+            return None
+        data_path, times_path, shapes_path = cls.get_paths(directory)
+        mode = 'r+' if writable else 'c'
+        try:
+            return cls(
+                directory,
+                np.load(data_path, mmap_mode=mode),
+                np.load(times_path, mmap_mode=mode),
+                np.load(shapes_path),
+            )
+        except (IOError, ValueError):
+            cls._LOGGER.exception(f"Could not load growth data in {directory}")
+            return None
+
+    @property
+    def plate_shapes(self) -> list[Optional[tuple[int, int]]]:
+        return [
+            (int(rows), int(cols)) if rows else None
+            for rows, cols in self._shapes
+        ]
+
+    def _grow(self, images: int) -> None:
+        images = max(images, 2 * self._data.shape[-1])
+        data_path, times_path, _ = self.get_paths(self._directory)
+        grown_path = f"{data_path}.tmp"
+        grown = self._allocate(grown_path, self._shapes, images)
+        grown[..., :self._data.shape[-1]] = self._data
+        grown.flush()
+        times = np.full((images,), np.nan)
+        times[:self._times.size] = self._times
+
+        del grown
+        self._data = self._times = np.empty(0)
+        os.replace(grown_path, data_path)
+        np.save(times_path, times)
+        self._data = np.load(data_path, mmap_mode='r+')
+        self._times = np.load(times_path, mmap_mode='r+')
+        self._LOGGER.info(f"Grew growth data store to {images} images")
+
+    def write(
+        self,
+        image_index: int,
+        time: float,
+        plates: Sequence[Optional[np.ndarray]],
+    ) -> None:
+        """Write the values of all plates for one image
+
+        :param image_index: The index of the image
+        :param time: The time of the image in hours
+        :param plates: The values of each plate, None for plates without
+            values.
+        """
+        if image_index >= self._data.shape[-1]:
+            self._grow(image_index + 1)
+
+        for index, plate in enumerate(plates):
+            if plate is None:
+                continue
+            rows, cols = plate.shape
+            self._data[index, :rows, :cols, image_index] = plate
+        self._times[image_index] = time
+
+    def flush(self) -> None:
+        for array in (self._data, self._times):
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    @property
+    def _written(self) -> Union[slice, np.ndarray]:
+        written = np.isfinite(self._times)
+        count = int(written.sum())
+        if written[:count].all():
+            return slice(0, count)
+        return np.flatnonzero(written)
+
+    @property
+    def times(self) -> np.ndarray:
+        """The times in hours of the written images"""
+        return self._times[self._written]
+
+    def get_plates(self) -> np.ndarray:
+        """The growth data of the written images per plate
+
+        If all plates are analysed and have the same pinning this is the
+        memory mapped `(plates, rows, cols, images)` array itself, otherwise
+        an object array of the `(rows, cols, images)` arrays of the plates
+        with None for plates not analysed.
+        """
+        written = self._written
+        plate_shapes = self.plate_shapes
+        if all(plate_shapes) and len(set(plate_shapes)) == 1:
+            return self._data[..., written]
+
+        plates = np.empty((len(plate_shapes),), dtype=object)
+        for index, shape in enumerate(plate_shapes):
+            if shape is not None:
+                plates[index] = (
+                    self._data[index, :shape[0], :shape[1]][..., written]
+                )
+        return plates
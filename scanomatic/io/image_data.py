@@ -7,6 +7,8 @@ import numpy as np
 from scanomatic.io.logger import get_logger
 
 import scanomatic.io.paths as paths
+from scanomatic.io.feature_store import FeatureStore
+from scanomatic.io.growth_data import GrowthDataStore
 from scanomatic.io.pickler import safe_load
 from scanomatic.models.analysis_model import (
     COMPARTMENTS,
@@ -24,41 +26,55 @@ class ImageData:
     _PATHS = paths.Paths()
 
     @staticmethod
-    def write_image(
+    def write_image_to_store(
+        store: GrowthDataStore,
         analysis_model: AnalysisModel,
         image_model: CompileImageAnalysisModel,
         features,
     ) -> bool:
-        if image_model.image is None:
+        image = image_model.image
+        if image is None:
             raise ValueError("Need an image to write!")
-        return ImageData._write_image(
-            analysis_model.output_directory,
-            image_model.image.index,
+
+        if features is None:
+            ImageData._LOGGER.warning(f"Image {image.index} had no data")
+            return False
+
+        plates = ImageData._get_plates(
             features,
             analysis_model.image_data_output_item,
             analysis_model.image_data_output_measure,
         )
+        if plates is None:
+            return False
+
+        store.write(image.index, image.time_stamp / _SECONDS_PER_HOUR, plates)
+        return True
 
     @staticmethod
-    def _write_image(
-        path: str,
-        image_index: int,
+    def write_image_to_feature_store(
+        store: FeatureStore,
+        image_model: CompileImageAnalysisModel,
         features,
-        output_item: COMPARTMENTS,
-        output_value: MEASURES,
     ) -> bool:
-
-        path = os.path.join(*ImageData.directory_path_to_data_path_tuple(
-            path,
-            image_index=image_index,
-        ))
+        image = image_model.image
+        if image is None:
+            raise ValueError("Need an image to write!")
 
         if features is None:
-            ImageData._LOGGER.warning(f"Image {image_index} had no data")
             return False
 
+        store.write(image.index, image.time_stamp / _SECONDS_PER_HOUR, features)
+        return True
+
+    @staticmethod
+    def _get_plates(
+        features,
+        output_item: COMPARTMENTS,
+        output_value: MEASURES,
+    ) -> Optional[list[Optional[np.ndarray]]]:
         number_of_plates = features.shape[0]
-        plates = [None] * number_of_plates
+        plates: list[Optional[np.ndarray]] = [None] * number_of_plates
         ImageData._LOGGER.info(
             "Writing features for {0} plates ({1})".format(
                 number_of_plates,
@@ -95,7 +111,7 @@ class ImageData:
                                 ),
                             )
 
-                            return False
+                            return None
                     else:
                         ImageData._LOGGER.info("Missing data for colony position {0}, plate {1}".format(  # noqa: E501
                             cell_features.index,
@@ -107,47 +123,7 @@ class ImageData:
                         plate_features.index,
                     ))
 
-        ImageData._LOGGER.info(
-            "Saved Image Data '{0}' with {1} plates".format(
-                path,
-                len(plates),
-            ),
-        )
-        np.save(path, plates)
-        return True
-
-    @staticmethod
-    def write_times(
-        analysis_model: AnalysisModel,
-        image_model: CompileImageAnalysisModel,
-        overwrite,
-    ) -> None:
-        global _SECONDS_PER_HOUR
-        image = image_model.image
-        if image is None:
-            raise ValueError("Need an image to write times!")
-
-        if not overwrite:
-            current_data = ImageData.read_times(
-                analysis_model.output_directory,
-            )
-        else:
-            current_data = np.array([], dtype=float)
-
-        if not (image.index < current_data.size):
-            current_data = np.r_[
-                current_data,
-                [None] * (1 + image.index - current_data.size)
-            ].astype(float)
-
-        current_data[image.index] = image.time_stamp / _SECONDS_PER_HOUR
-        np.save(
-            os.path.join(*ImageData.directory_path_to_data_path_tuple(
-                analysis_model.output_directory,
-                times=True,
-            )),
-            current_data,
-        )
+        return plates
 
     @staticmethod
     def read_times(path: str) -> np.ndarray:
@@ -303,7 +279,14 @@ class ImageData:
 
             tuple (numpy array of time points, numpy array of data)
 
+        If the directory has a growth data store, its memory mapped data
+        is used directly instead.
         """
+        store = GrowthDataStore.load(path)
+        if store is not None:
+            ImageData._LOGGER.info(f"Using growth data store in {path}")
+            return store.times, store.get_plates()
+
         times = ImageData.read_times(path)
 
         data = []
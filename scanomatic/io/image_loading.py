@@ -6,7 +6,7 @@ from typing import Optional
 import numpy as np
 
 from scanomatic.image_analysis.image_basics import load_image_to_numpy
-from scanomatic.io.jsonizer import load
+from scanomatic.io.jsonizer import load_records
 from scanomatic.io.logger import get_logger
 from scanomatic.io.paths import Paths
 from scanomatic.io.pickler import safe_load
@@ -15,7 +15,10 @@ from scanomatic.models.compile_project_model import CompileImageAnalysisModel
 _logger = get_logger("Image loader")
 
 
-def _get_project_compilation(analysis_directory, file_name=None):
+def _get_project_compilation(
+    analysis_directory: str,
+    file_name: Optional[str] = None,
+) -> str:
 
     experiment_directory = os.sep.join(analysis_directory.split(os.sep)[:-1])
     if file_name:
@@ -118,7 +121,14 @@ def load_colony_image(
             analysis_directory,
             file_name=compilation_file_name,
         )
-        compilation_result = load(compilation_file)[time_index]
+        compilation_results = load_records(compilation_file)
+        if not compilation_results:
+            raise ValueError(
+                "Could not load any images from '{0}'".format(
+                    compilation_file,
+                ),
+            )
+        compilation_result = compilation_results[time_index]
         if not experiment_directory:
             experiment_directory = os.path.dirname(compilation_file)
 
@@ -160,7 +170,7 @@ def load_colony_images_for_animation(
     position: Sequence[int],
     project_compilation: Optional[str] = None,
     positioning: str = "one-time",
-) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+) -> tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
     """
 
     :param analysis_directory: path to analysis directory
@@ -172,8 +182,8 @@ def load_colony_images_for_animation(
     which uses the gridding image positioning all through.Use "detected" for
     the position actually detected.
     :return: First array is a 1D time-vector, second array is a 3D image
-    sequence vector where the last dimension is time, the third array is the
-    2D plate slice of the last image.
+    sequence vector where the last dimension is time, the third is meant to
+    be the 2D plate slice of the last image but isn't loaded (None).
     """
 
     assert (
@@ -189,9 +199,9 @@ def load_colony_images_for_animation(
 
     grid, grid_size = _load_grid_info(analysis_directory, position[0])
 
-    compilation_results: list[CompileImageAnalysisModel] = load(
+    compilation_results: list[CompileImageAnalysisModel] = load_records(
         project_compilation,
-    )
+    ) or []
     compilation_results = sorted(
         compilation_results,
         key=lambda e: e.image.index,
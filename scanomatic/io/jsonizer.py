@@ -1,4 +1,6 @@
 import json
+import os
+import shutil
 from collections.abc import Callable, Sequence
 from enum import Enum, unique
 from typing import Any, Optional, TextIO, Type, TypeVar, Union
@@ -406,6 +408,215 @@ def dump_to_stream(
         stream.write(dumps(model))
 
 
+def dump_record_to_stream(model: Any, stream: TextIO):
+    """Write a model as one line of a line delimited records file"""
+    stream.write(dumps(model))
+    stream.write("\n")
+
+
+def _is_record_line(line: bytes) -> bool:
+    try:
+        return not isinstance(json.loads(line), list)
+    except ValueError:
+        return False
+
+
+def _prepare_for_records(path: Path):
+    """Ensure the file ends with a complete record line.
+
+    Files in the legacy layout, a single JSON document, are rewritten as
+    one record per line. An incomplete last record, e.g. from a crash
+    during writing, is removed.
+
+    Only the first line and the end of files with records are read.
+    """
+    try:
+        with open(path, 'rb') as fh:
+            first_line = fh.readline()
+            if not first_line:
+                return
+            fh.seek(-1, os.SEEK_END)
+            if fh.read(1) == b"\n" and _is_record_line(first_line):
+                return
+            fh.seek(0)
+            contents = fh.read()
+    except FileNotFoundError:
+        return
+
+    try:
+        legacy = loads(contents)
+    except ValueError:
+        if contents.lstrip().startswith(b"["):
+            raise IOError(f"Could not parse records of '{path}'")
+        if not contents.endswith(b"\n"):
+            _LOGGER.warning(f"Removing incomplete last record of '{path}'")
+            with open(path, 'rb+') as fh:
+                fh.truncate(contents.rfind(b"\n") + 1)
+        return
+
+    _LOGGER.info(f"Converting '{path}' to one record per line")
+    temporary_path = path.with_name(f"{path.name}.tmp")
+    with open(temporary_path, 'w') as out:
+        for record in legacy if isinstance(legacy, list) else [legacy]:
+            dump_record_to_stream(record, out)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(temporary_path, path)
+
+
+def append_record(model: Any, path: Union[str, Path]) -> bool:
+    """Append a model as a new line to a line delimited records file
+
+    Only the end of the file is inspected, so the cost of appending does not
+    grow with the number of records.
+    """
+    if isinstance(path, str):
+        path = Path(path)
+    try:
+        _prepare_for_records(path)
+        with open(path, 'a') as fh:
+            dump_record_to_stream(model, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+    except IOError:
+        _LOGGER.exception(f'Could not append {model} to: {path}')
+        return False
+    return True
+
+
+def load_records(path: Union[str, Path]) -> Optional[list]:
+    """Load all models of a records file
+
+    Reads both files with one record per line and the legacy layout with
+    all records in a single JSON list. An incomplete last record is
+    skipped.
+    """
+    if isinstance(path, str):
+        path = Path(path)
+    try:
+        contents = path.read_text()
+    except IOError:
+        _LOGGER.warning(
+            f"Attempted to load records from '{path}', but failed",
+        )
+        return None
+
+    if contents.lstrip().startswith("["):
+        try:
+            return loads(contents)
+        except ValueError:
+            _LOGGER.warning(f"Could not parse records of '{path}'")
+            return None
+
+    records = []
+    lines = contents.splitlines()
+    for line_index, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            records.append(loads(line))
+        except ValueError:
+            if line_index == len(lines) - 1:
+                _LOGGER.warning(
+                    f"Skipping incomplete last record of '{path}'",
+                )
+            else:
+                _LOGGER.error(
+                    f"Skipping corrupt record on line {line_index + 1}"
+                    f" of '{path}'",
+                )
+    return records
+
+
+def index_records(
+    path: Union[str, Path],
+    get_key: Callable[[Any], T],
+) -> Optional[list[tuple[int, int, T]]]:
+    """Locate the records of a line delimited records file
+
+    The file is read one line at a time and each record is parsed as plain
+    JSON, without creating any models, to be summarised by `get_key`.
+    Corrupt records and an incomplete last record are skipped.
+
+    :param path: The records file
+    :param get_key: Summary of a record from its plain JSON content
+    :return: Byte offset, byte length and summary of each record, None if
+        the file can't be read or is in the legacy layout.
+    """
+    index: list[tuple[int, int, T]] = []
+    try:
+        with open(path, 'rb') as fh:
+            offset = 0
+            for line_index, line in enumerate(fh):
+                stripped = line.strip()
+                if line_index == 0 and stripped.startswith(b"["):
+                    return None
+                if stripped:
+                    try:
+                        index.append(
+                            (offset, len(line), get_key(json.loads(line))),
+                        )
+                    except (ValueError, KeyError, TypeError):
+                        _LOGGER.warning(
+                            f"Skipping corrupt or incomplete record on line"
+                            f" {line_index + 1} of '{path}'",
+                        )
+                offset += len(line)
+    except IOError:
+        _LOGGER.warning(
+            f"Attempted to index records of '{path}', but failed",
+        )
+        return None
+    return index
+
+
+def load_record(path: Union[str, Path], offset: int, length: int) -> Any:
+    """Load the model of one record located by `index_records`"""
+    try:
+        with open(path, 'rb') as fh:
+            fh.seek(offset)
+            return loads(fh.read(length))
+    except (IOError, ValueError):
+        _LOGGER.warning(
+            f"Attempted to load record at {offset} of '{path}', but failed",
+        )
+        return None
+
+
+def replace_records(
+    path: Union[str, Path],
+    records: dict[tuple[int, int], Any],
+) -> bool:
+    """Replace some records of a line delimited records file
+
+    The file is rewritten with the other records copied as they are.
+
+    :param path: The records file
+    :param records: The new models by the byte offset and length of the
+        record they replace, as located by `index_records`
+    """
+    if isinstance(path, str):
+        path = Path(path)
+    temporary_path = path.with_name(f"{path.name}.tmp")
+    try:
+        with open(path, 'rb') as source, open(temporary_path, 'wb') as out:
+            position = 0
+            for (offset, length), model in sorted(records.items()):
+                out.write(source.read(offset - position))
+                out.write(dumps(model).encode())
+                out.write(b"\n")
+                source.seek(offset + length)
+                position = offset + length
+            shutil.copyfileobj(source, out)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temporary_path, path)
+    except IOError:
+        _LOGGER.exception(f'Could not replace records of: {path}')
+        return False
+    return True
+
+
 def _models_equal(a: Any, b: Model) -> bool:
     try:
         assert_models_deeply_equal(a, b)
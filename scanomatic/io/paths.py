@@ -133,6 +133,8 @@ class Paths(SingeltonOneInit):
 
         self.analysis_run_log = 'analysis.log'
         self.analysis_model_file = 'analysis.model'
+        self.analysis_incremental_state = 'analysis.incremental.pickle'
+        self.analysis_incremental_lock = 'analysis.incremental.lock'
 
         self.experiment_local_fixturename = (
             self.fixture_conf_file_rel_pattern.format("fixture")
@@ -165,6 +167,12 @@ class Paths(SingeltonOneInit):
 
         self.image_analysis_img_data = "image_{0}_data.npy"
         self.image_analysis_time_series = "time_data.npy"
+        self.growth_data = "growth_data.npy"
+        self.growth_data_times = "growth_data_times.npy"
+        self.growth_data_shapes = "growth_data_shapes.npy"
+        self.feature_store = "features"
+        self.feature_store_shapes = "plate_shapes.npy"
+        self.feature_store_times = "times.npy"
 
         self.project_compilation_from_scanning_pattern_old = (
             "{0}.project.settings"
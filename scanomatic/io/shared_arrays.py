@@ -0,0 +1,116 @@
+"""Arrays copied into shared memory, so worker processes can read them
+without them being pickled.
+"""
+from multiprocessing import resource_tracker  # type: ignore
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional, Tuple
+
+import numpy as np
+
+from scanomatic.io.logger import get_logger
+
+# Name of shared memory, byte offset, shape and dtype of an array
+SharedArray = tuple[str, int, Tuple[int, ...], str]
+
+_LOGGER = get_logger("Shared Arrays")
+
+
+def start_resource_tracker() -> None:
+    """Start the resource tracker before starting workers using shared arrays
+
+    Workers must share the tracker of the process creating the shared memory,
+    or they will each consider the shared arrays leaked when they exit.
+    """
+    resource_tracker.ensure_running()
+
+
+class SharedArrays:
+    """Copies of arrays, packed after each other in one block of shared memory
+    """
+    def __init__(self, size: int):
+        start_resource_tracker()
+        self._memory: Optional[SharedMemory] = SharedMemory(
+            create=True,
+            size=max(size, 1),
+        )
+        self._offset = 0
+
+    @property
+    def name(self) -> str:
+        assert self._memory is not None
+        return self._memory.name
+
+    @property
+    def size(self) -> int:
+        assert self._memory is not None
+        return self._memory.size
+
+    def add(self, array: np.ndarray) -> tuple[np.ndarray, SharedArray]:
+        """Copy an array into the free part of the shared memory
+
+        Returns:
+            The shared copy and where it is in shared memory
+        """
+        assert self._memory is not None
+        if self._offset + array.nbytes > self._memory.size:
+            raise ValueError(
+                f"No room for {array.nbytes} bytes in shared memory",
+            )
+        shared: np.ndarray = np.ndarray(
+            array.shape,
+            dtype=array.dtype,
+            buffer=self._memory.buf,
+            offset=self._offset,
+        )
+        np.copyto(shared, array)
+        shared_array = (
+            self._memory.name,
+            self._offset,
+            array.shape,
+            array.dtype.str,
+        )
+        self._offset += array.nbytes
+        return shared, shared_array
+
+    def clear(self) -> None:
+        """Make all of the shared memory free, overwriting the arrays in it"""
+        self._offset = 0
+
+    def release(self) -> None:
+        """Free the shared memory, no shared copies may be used after this"""
+        if self._memory is None:
+            return
+        try:
+            self._memory.close()
+        except BufferError:
+            _LOGGER.warning("Shared arrays still referenced while released")
+        self._memory.unlink()
+        self._memory = None
+
+
+def read_shared_array(
+    shared_array: SharedArray,
+    key: slice = slice(None),
+) -> np.ndarray:
+    """Copy (a part of) an array out of shared memory
+
+    The copy is made so no view into the shared memory outlives it.
+
+    Args:
+        shared_array: Where the array is in shared memory
+        key: The part of the array along its first axis
+
+    Returns:
+        A copy of the array, or of its part
+    """
+    name, offset, shape, dtype = shared_array
+    memory = SharedMemory(name=name)
+    try:
+        return np.ndarray(
+            shape,
+            dtype=dtype,
+            buffer=memory.buf,
+            offset=offset,
+        )[key].copy()
+    finally:
+        memory.close()
@@ -68,6 +68,14 @@ class AnalysisModelFields(Enum):
     image_data_output_measure = auto()
     chain = auto()
     plate_image_inclusion = auto()
+    plate_workers = auto()
+    batch_analysis = auto()
+    prefetch_images = auto()
+    prefetch_memory_mb = auto()
+    incremental = auto()
+    full_features = auto()
+    full_features_chunk_size = auto()
+    full_features_compressed = auto()
 
 
 class AnalysisModel(model.Model):
@@ -96,6 +104,14 @@ class AnalysisModel(model.Model):
         plate_image_inclusion=None,
         cell_count_calibration=None,
         cell_count_calibration_id=None,
+        plate_workers: int = 1,
+        batch_analysis: bool = False,
+        prefetch_images: int = 0,
+        prefetch_memory_mb: int = 1024,
+        incremental: bool = False,
+        full_features: bool = False,
+        full_features_chunk_size: int = 32,
+        full_features_compressed: bool = False,
     ):
         self.cell_count_calibration = cell_count_calibration
         self.cell_count_calibration_id = cell_count_calibration_id
@@ -117,6 +133,14 @@ class AnalysisModel(model.Model):
         self.image_data_output_measure = image_data_output_measure
         self.chain = chain
         self.plate_image_inclusion = plate_image_inclusion
+        self.plate_workers: int = plate_workers
+        self.batch_analysis: bool = batch_analysis
+        self.prefetch_images: int = prefetch_images
+        self.prefetch_memory_mb: int = prefetch_memory_mb
+        self.incremental: bool = incremental
+        self.full_features: bool = full_features
+        self.full_features_chunk_size: int = full_features_chunk_size
+        self.full_features_compressed: bool = full_features_compressed
         super().__init__()
 
 
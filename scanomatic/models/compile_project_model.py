@@ -8,6 +8,7 @@ from scanomatic.models.fixture_models import FixtureModel
 class COMPILE_ACTION(Enum):
     Initiate = 0
     Append = 1
+    FixUp = 2
     InitiateAndSpawnAnalysis = 10
     AppendAndSpawnAnalysis = 11
 
@@ -28,6 +29,9 @@ class CompileInstructionsModelFields(Enum):
     email = auto()
     overwrite_pinning_matrices = auto()
     cell_count_calibration_id = auto()
+    incremental_analysis = auto()
+    compile_workers = auto()
+    fix_up_images = auto()
 
 
 class CompileInstructionsModel(Model):
@@ -43,6 +47,9 @@ class CompileInstructionsModel(Model):
         email="",
         overwrite_pinning_matrices=None,
         cell_count_calibration_id="default",
+        incremental_analysis: bool = False,
+        compile_workers: int = 1,
+        fix_up_images: str = "",
     ):
         self.compile_action: COMPILE_ACTION = compile_action
         self.images: Sequence[CompileImageModel] = images
@@ -54,6 +61,9 @@ class CompileInstructionsModel(Model):
         self.email: str = email
         self.overwrite_pinning_matrices = overwrite_pinning_matrices
         self.cell_count_calibration_id: str = cell_count_calibration_id
+        self.incremental_analysis: bool = incremental_analysis
+        self.compile_workers: int = compile_workers
+        self.fix_up_images: str = fix_up_images
         super().__init__()
 
 
@@ -54,6 +54,14 @@ class AnalysisModelFactory(AbstractModelFactory):
         'plate_image_inclusion': (tuple, str),
         'cell_count_calibration': (tuple, float),
         'cell_count_calibration_id': str,
+        'plate_workers': int,
+        'batch_analysis': bool,
+        'prefetch_images': int,
+        'prefetch_memory_mb': int,
+        'incremental': bool,
+        'full_features': bool,
+        'full_features_chunk_size': int,
+        'full_features_compressed': bool,
     }
 
     @classmethod
@@ -99,6 +107,14 @@ class AnalysisModelFactory(AbstractModelFactory):
         keys = set(keys).union((
             'cell_count_calibration_id',
             'cell_count_calibration',
+            'plate_workers',
+            'batch_analysis',
+            'prefetch_images',
+            'prefetch_memory_mb',
+            'incremental',
+            'full_features',
+            'full_features_chunk_size',
+            'full_features_compressed',
         ))
         return super().all_keys_valid(keys)
 
@@ -68,6 +68,9 @@ class CompileProjectFactory(AbstractModelFactory):
         'fixture_name': str,
         'overwrite_pinning_matrices': (tuple, tuple, int),
         'cell_count_calibration_id': str,
+        'incremental_analysis': bool,
+        'compile_workers': int,
+        'fix_up_images': str,
     }
 
     @classmethod
@@ -13,7 +13,8 @@ class FeaturesFactory(AbstractModelFactory):
         "analysis_directory": str,
         "email": email_serializer,
         "extraction_data": features_model.FeatureExtractionData,
-        "try_keep_qc": bool
+        "try_keep_qc": bool,
+        "extraction_workers": int,
     }
 
     @classmethod
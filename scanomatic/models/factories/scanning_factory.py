@@ -73,7 +73,8 @@ class ScanningModelFactory(AbstractModelFactory):
         'auxillary_info': ScanningAuxInfoModel,
         'scanning_program': str,
         'scanning_program_version': str,
-        'scanning_program_params': (tuple, str)
+        'scanning_program_params': (tuple, str),
+        'incremental_analysis': bool,
     }
 
     @classmethod
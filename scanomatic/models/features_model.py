@@ -13,6 +13,7 @@ class FeaturesModelFields(Enum):
     email = auto()
     extraction_data = auto()
     try_keep_qc = auto()
+    extraction_workers = auto()
 
 
 class FeaturesModel(model.Model):
@@ -22,10 +23,12 @@ class FeaturesModel(model.Model):
         email: str = "",
         extraction_data: FeatureExtractionData = FeatureExtractionData.Default,
         try_keep_qc: bool = False,
+        extraction_workers: int = 1,
     ):
 
         self.analysis_directory: str = analysis_directory
         self.email: str = email
         self.extraction_data: FeatureExtractionData = extraction_data
         self.try_keep_qc: bool = try_keep_qc
+        self.extraction_workers: int = extraction_workers
         super().__init__()
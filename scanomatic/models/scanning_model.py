@@ -111,6 +111,7 @@ class ScanningModelFields(Enum):
     cell_count_calibration_id = auto()
     auxillary_info = auto()
     version = auto()
+    incremental_analysis = auto()
 
 
 class ScanningModel(model.Model):
@@ -138,6 +139,7 @@ class ScanningModel(model.Model):
         scanning_program_version: str = "",
         scanning_program_params: Sequence[str] = tuple(),
         cell_count_calibration_id=None,
+        incremental_analysis: bool = False,
     ):
         self.number_of_scans: int = number_of_scans
         self.time_between_scans: float = time_between_scans
@@ -162,6 +164,7 @@ class ScanningModel(model.Model):
         self.cell_count_calibration_id = cell_count_calibration_id
         self.auxillary_info: ScanningAuxInfoModel = auxillary_info
         self.version: str = version
+        self.incremental_analysis: bool = incremental_analysis
         super().__init__()
 
 
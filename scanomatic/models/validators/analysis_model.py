@@ -132,3 +132,61 @@ def validate_cell_count_calibration(
     ):
         return True
     return AnalysisModelFields.cell_count_calibration
+
+
+def validate_plate_workers(model: AnalysisModel) -> ValidationResult:
+    if isinstance(model.plate_workers, int) and model.plate_workers >= 1:
+        return True
+    return AnalysisModelFields.plate_workers
+
+
+def validate_batch_analysis(model: AnalysisModel) -> ValidationResult:
+    if isinstance(model.batch_analysis, bool):
+        return True
+    return AnalysisModelFields.batch_analysis
+
+
+def validate_prefetch_images(model: AnalysisModel) -> ValidationResult:
+    if isinstance(model.prefetch_images, int) and model.prefetch_images >= 0:
+        return True
+    return AnalysisModelFields.prefetch_images
+
+
+def validate_prefetch_memory_mb(model: AnalysisModel) -> ValidationResult:
+    if (
+        isinstance(model.prefetch_memory_mb, int)
+        and model.prefetch_memory_mb > 0
+    ):
+        return True
+    return AnalysisModelFields.prefetch_memory_mb
+
+
+def validate_incremental(model: AnalysisModel) -> ValidationResult:
+    if isinstance(model.incremental, bool):
+        return True
+    return AnalysisModelFields.incremental
+
+
+def validate_full_features(model: AnalysisModel) -> ValidationResult:
+    if isinstance(model.full_features, bool):
+        return True
+    return AnalysisModelFields.full_features
+
+
+def validate_full_features_chunk_size(
+    model: AnalysisModel,
+) -> ValidationResult:
+    if (
+        isinstance(model.full_features_chunk_size, int)
+        and model.full_features_chunk_size > 0
+    ):
+        return True
+    return AnalysisModelFields.full_features_chunk_size
+
+
+def validate_full_features_compressed(
+    model: AnalysisModel,
+) -> ValidationResult:
+    if isinstance(model.full_features_compressed, bool):
+        return True
+    return AnalysisModelFields.full_features_compressed
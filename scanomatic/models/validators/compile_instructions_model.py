@@ -5,10 +5,12 @@ from scanomatic.data_processing.calibration import get_active_cccs
 from scanomatic.io.fixtures import Fixtures
 from scanomatic.io.paths import Paths
 from scanomatic.models.compile_project_model import (
+    COMPILE_ACTION,
     FIXTURE,
     CompileInstructionsModel,
     CompileInstructionsModelFields,
 )
+from scanomatic.util.image_ranges import get_image_indices
 
 ValidationResult = Union[Literal[True], CompileInstructionsModelFields]
 
@@ -16,7 +18,7 @@ ValidationResult = Union[Literal[True], CompileInstructionsModelFields]
 def validate_images(
     model: CompileInstructionsModel,
 ) -> ValidationResult:
-    if model.images:
+    if model.images or model.compile_action is COMPILE_ACTION.FixUp:
         return True
     else:
         return CompileInstructionsModelFields.images
@@ -63,3 +65,30 @@ def validate_cell_count_calibration_id(
     if model.cell_count_calibration_id in get_active_cccs():
         return True
     return CompileInstructionsModelFields.cell_count_calibration_id
+
+
+def validate_incremental_analysis(
+    model: CompileInstructionsModel,
+) -> ValidationResult:
+    if isinstance(model.incremental_analysis, bool):
+        return True
+    return CompileInstructionsModelFields.incremental_analysis
+
+
+def validate_compile_workers(
+    model: CompileInstructionsModel,
+) -> ValidationResult:
+    if isinstance(model.compile_workers, int) and model.compile_workers >= 1:
+        return True
+    return CompileInstructionsModelFields.compile_workers
+
+
+def validate_fix_up_images(
+    model: CompileInstructionsModel,
+) -> ValidationResult:
+    if (
+        model.compile_action is not COMPILE_ACTION.FixUp
+        or get_image_indices(model.fix_up_images, 0) is not None
+    ):
+        return True
+    return CompileInstructionsModelFields.fix_up_images
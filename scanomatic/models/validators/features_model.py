@@ -18,3 +18,12 @@ def validate_analysis_directory(model: FeaturesModel) -> ValidationResult:
     ):
         return True
     return FeaturesModelFields.analysis_directory
+
+
+def validate_extraction_workers(model: FeaturesModel) -> ValidationResult:
+    if (
+        isinstance(model.extraction_workers, int)
+        and model.extraction_workers >= 1
+    ):
+        return True
+    return FeaturesModelFields.extraction_workers
@@ -171,3 +171,9 @@ def validate_cell_count_calibration_id(
     if model.cell_count_calibration_id in get_active_cccs():
         return True
     return ScanningModelFields.cell_count_calibration_id
+
+
+def validate_incremental_analysis(model: ScanningModel) -> ValidationResult:
+    if isinstance(model.incremental_analysis, bool):
+        return True
+    return ScanningModelFields.incremental_analysis
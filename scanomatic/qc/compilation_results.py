@@ -2,11 +2,12 @@ import glob
 import os
 import re
 from collections.abc import Sequence
+from typing import Any, Optional
 
 import numpy as np
 from matplotlib import pyplot as plt  # type: ignore
 
-from scanomatic.io.jsonizer import load
+from scanomatic.io.jsonizer import load_records
 from scanomatic.io.movie_writer import MovieWriter
 from scanomatic.models.compile_project_model import CompileImageAnalysisModel
 
@@ -18,8 +19,12 @@ def _input_validate(f):
     def wrapped(*args, **kwargs):
         if len(args) > 0:
             if isinstance(args[0], str):
-                args = list(args)
-                args[0] = load(args[0])
+                project_compilation = load_records(args[0])
+                if project_compilation is None:
+                    raise ValueError(
+                        f"Could not load compilation '{args[0]}'",
+                    )
+                args = (project_compilation, *args[1:])
         return f(*args, **kwargs)
 
     return wrapped
@@ -81,14 +86,13 @@ def plot_grayscale_histogram(
     save_target=None,
 ):
 
-    data = [
+    values = [
         image.fixture.grayscale.section_values
         for image in project_compilation
     ]
-    length = max(len(v) for v in data if v is not None)
+    length = max(len(v) for v in values if v is not None)
     empty = np.zeros((length,), dtype=float) * np.inf
-    data = [empty if d is None else d for d in data]
-    data = np.array(data)
+    data = np.array([empty if v is None else v for v in values])
     if mark_outliers:
         outliers = get_grayscale_outlier_images(
             project_compilation,
@@ -150,7 +154,7 @@ def animate_marker_positions(
 
     fig.clf()
 
-    images = [None for _ in range(positions.shape[-1])]
+    images: list[Any] = [None for _ in range(positions.shape[-1])]
     half_slice_size = np.floor(slice_size / 2.0)
 
     for idx in range(len(images)):
@@ -181,24 +185,27 @@ def animate_marker_positions(
 
     @MovieWriter(save_target, title=title, comment=comment, fps=fps, fig=fig)
     def _animate():
-        data = [None for _ in range(positions.shape[0])]
+        data: list[Optional[list[np.ndarray]]] = [
+            None for _ in range(positions.shape[0])
+        ]
 
         for index in range(positions.shape[0]):
-
-            if data[index] is None:
+            cutouts = data[index]
+            if cutouts is None:
 
                 image = plt.imread(paths[index])
-                data[index] = []
+                cutouts = []
                 for im_index, im in enumerate(images):
                     im_slice = make_cutout(
                         image,
                         *positions[index, :, im_index],
                     )
                     im.set_data(im_slice)
-                    data[index].append(im_slice)
+                    cutouts.append(im_slice)
+                data[index] = cutouts
             else:
                 for im_index, im in enumerate(images):
-                    im.set_data(data[index][im_index])
+                    im.set_data(cutouts[im_index])
 
             fig.axes[0].set_title("Time {0}".format(index))
             yield
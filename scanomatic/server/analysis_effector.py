@@ -10,6 +10,8 @@ from scanomatic.io.logger import get_logger
 import scanomatic.io.rpc_client as rpc_client
 from scanomatic.data_processing.project import remove_state_from_path
 from scanomatic.io.app_config import Config as AppConfig
+from scanomatic.io.feature_store import FeatureStore
+from scanomatic.io.growth_data import GrowthDataStore
 from scanomatic.io.jsonizer import copy, dump, load_first
 from scanomatic.io.paths import Paths
 from scanomatic.models.analysis_model import AnalysisModel, AnalysisModelFields
@@ -61,6 +63,56 @@ def get_label_from_analysis_model(
     return f"{root} -> {output}, ({id_hash[-6:]})"
 
 
+def _is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def acquire_lock(path: str) -> bool:
+    """Create a lock file owned by the current process
+
+    A lock left by a process that is no longer running is taken over.
+
+    :param path: The lock file
+    :return: If the lock was acquired
+    """
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                with open(path) as fh:
+                    pid = int(fh.read().strip())
+            except FileNotFoundError:
+                continue
+            except (IOError, ValueError):
+                # The owner may not have written its pid yet
+                return False
+            if _is_process_alive(pid):
+                return False
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        else:
+            with os.fdopen(fd, 'w') as fh:
+                fh.write(str(os.getpid()))
+            return True
+    return False
+
+
+def release_lock(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
 class AnalysisEffector(proc_effector.ProcessEffector):
 
     TYPE = JOB_TYPE.Analysis
@@ -96,7 +148,14 @@ class AnalysisEffector(proc_effector.ProcessEffector):
         self._job.content_model = self._analysis_job
         self._scanning_instructions: Optional[ScanningModel] = None
         self._current_image_model: Optional[CompileImageAnalysisModel] = None
+        self._image: Optional[analysis_image.ProjectImage] = None
+        self._holds_incremental_lock = False
+        self._waiting_for_incremental_lock = False
         self._analysis_needs_init = True
+        self._analysed_image_indices: set[int] = set()
+        self._resumed_analysis = False
+        self._growth_data: Optional[GrowthDataStore] = None
+        self._full_features: Optional[FeatureStore] = None
 
     @property
     def current_image_index(self) -> int:
@@ -126,6 +185,10 @@ class AnalysisEffector(proc_effector.ProcessEffector):
         total = float(self.total)
         initiation_weight = 1
         if total > 0 and self._current_image_model:
+            if self._analysis_job.incremental:
+                return (
+                    self.current_image_index + 1 + initiation_weight
+                ) / (total + initiation_weight)
             return (
                 total - self.current_image_index + initiation_weight
             ) / (total + initiation_weight)
@@ -160,6 +223,28 @@ class AnalysisEffector(proc_effector.ProcessEffector):
             )
         self._logger.info(f'Analysis completed at {str(time.time())}')
 
+        if self._growth_data is not None:
+            self._growth_data.flush()
+        if self._full_features is not None:
+            self._full_features.flush()
+
+        if self._image is not None:
+            if self._analysis_job.incremental:
+                try:
+                    self._image.save_state(
+                        self._incremental_state_path,
+                        self._analysed_image_indices,
+                    )
+                except (IOError, OSError):
+                    self._logger.exception(
+                        "Could not save state for continuing the analysis",
+                    )
+            self._image.close()
+
+        if self._holds_incremental_lock:
+            release_lock(self._incremental_lock_path)
+            self._holds_incremental_lock = False
+
         if self._analysis_job.chain:
             try:
                 rc = rpc_client.get_client()
@@ -219,6 +304,8 @@ class AnalysisEffector(proc_effector.ProcessEffector):
                     else image_model.image.path,
                 ),
             )
+            if image_model.image is not None:
+                self._analysed_image_indices.add(image_model.image.index)
             return True
 
         # Overwrite grayscale with previous if has been requested
@@ -258,13 +345,13 @@ class AnalysisEffector(proc_effector.ProcessEffector):
                 self._reference_compilation_image_model.fixture.plates
             ]
 
-        first_image_analysed = self._current_image_model is None
         self._current_image_model = image_model
 
         self._logger.info(
             f"ANALYSIS, Running analysis on '{image_model.image.path}'",
         )
 
+        assert self._image is not None
         self._image.analyse(image_model)
         self._logger.info(
             "Analysis took {0}, will now write out results.".format(
@@ -277,12 +364,9 @@ class AnalysisEffector(proc_effector.ProcessEffector):
         if features is None:
             self._logger.warning("Analysis features not set up correctly")
 
-        image_data.ImageData.write_times(
-            self._analysis_job,
-            image_model,
-            overwrite=first_image_analysed,
-        )
-        if not image_data.ImageData.write_image(
+        assert self._growth_data is not None
+        if not image_data.ImageData.write_image_to_store(
+            self._growth_data,
             self._analysis_job,
             image_model,
             features,
@@ -293,16 +377,70 @@ class AnalysisEffector(proc_effector.ProcessEffector):
             )
             return False
 
+        if self._full_features is not None:
+            image_data.ImageData.write_image_to_feature_store(
+                self._full_features,
+                image_model,
+                features,
+            )
+
+        self._analysed_image_indices.add(image_model.image.index)
         self._logger.info(
             "Image took {0} seconds".format(time.time() - scan_start_time),
         )
         return True
 
+    @property
+    def _incremental_state_path(self) -> str:
+        return os.path.join(
+            self._analysis_job.output_directory,
+            Paths().analysis_incremental_state,
+        )
+
+    @property
+    def _incremental_lock_path(self) -> str:
+        return os.path.join(
+            self._analysis_job.output_directory,
+            Paths().analysis_incremental_lock,
+        )
+
+    def _acquire_incremental_lock(self) -> bool:
+        """Wait for other incremental analyses of the same output
+
+        Each compile step requests an incremental analysis, and one started
+        before the previous one is done would otherwise remove or append to
+        the output the previous one is still writing.
+        """
+        try:
+            os.makedirs(self._analysis_job.output_directory, exist_ok=True)
+        except OSError:
+            # Reported when setting up the output directory
+            return True
+        if acquire_lock(self._incremental_lock_path):
+            self._holds_incremental_lock = True
+            return True
+        if not self._waiting_for_incremental_lock:
+            self._waiting_for_incremental_lock = True
+            self._logger.info(
+                "Waiting for a previous incremental analysis of {0}".format(
+                    self._analysis_job.output_directory,
+                ),
+            )
+        return False
+
     def _setup_first_iteration(self):
+        if (
+            self._analysis_job.incremental
+            and not self._acquire_incremental_lock()
+        ):
+            return True
+
         self._start_time = time.time()
         self._first_pass_results = first_pass_results.CompilationResults(
             self._analysis_job.compilation,
-            self._analysis_job.compile_instructions)
+            self._analysis_job.compile_instructions,
+            oldest_first=self._analysis_job.incremental,
+        )
 
         try:
             os.makedirs(self._analysis_job.output_directory)
@@ -336,19 +474,45 @@ class AnalysisEffector(proc_effector.ProcessEffector):
                 ),
             )
 
-        self._logger.info("Will remove previous files")
-
-        self._remove_files_from_previous_analysis()
-
-        self._image = analysis_image.ProjectImage(
+        image = analysis_image.ProjectImage(
             self._analysis_job,
             self._first_pass_results,
         )
+        self._image = image
 
-        # TODO: Need rework to handle gridding of diff times for diff plates
-        if not self._image.set_grid():
-            self._stopping = True
+        needs_grid = True
+        if self._analysis_job.incremental and os.path.isfile(
+            self._incremental_state_path,
+        ):
+            state = image.load_state(self._incremental_state_path)
+            if state is not None:
+                self._resumed_analysis = True
+                self._analysed_image_indices, has_grids = state
+                needs_grid = not has_grids
+
+        if not self._resumed_analysis:
+            self._logger.info("Will remove previous files")
+
+            self._remove_files_from_previous_analysis()
+
+        if needs_grid:
+            if self._resumed_analysis:
+                self._logger.info(
+                    "Gridding again since the gridding image wasn't compiled"
+                    " at the previous incremental analysis",
+                )
+            # TODO: Need rework to handle gridding of diff times for diff plates
+            if not image.set_grid():
+                self._stopping = True
+
+        if self._resumed_analysis:
+            self._first_pass_results.skip_image_models(
+                self._analysed_image_indices,
+            )
 
+        self._growth_data = self._get_growth_data_store()
+        if self._analysis_job.full_features:
+            self._full_features = self._get_full_features_store()
         self._analysis_needs_init = False
 
         self._logger.info(
@@ -359,6 +523,48 @@ class AnalysisEffector(proc_effector.ProcessEffector):
         )
         return True
 
+    def _get_growth_data_store(self) -> GrowthDataStore:
+        if self._resumed_analysis:
+            store = GrowthDataStore.load(
+                self._analysis_job.output_directory,
+                writable=True,
+            )
+            if store is not None:
+                return store
+            self._logger.warning(
+                "Could not continue on previous growth data, earlier images"
+                " will be missing",
+            )
+
+        assert self._image is not None
+        features = self._image.features
+        return GrowthDataStore.create(
+            self._analysis_job.output_directory,
+            [
+                None if plate is None else (plate.shape[0], plate.shape[1])
+                for plate in features.data
+            ],
+            self._first_pass_results.total_number_of_images,
+        )
+
+    def _get_full_features_store(self) -> FeatureStore:
+        if self._resumed_analysis:
+            store = FeatureStore.load(
+                self._analysis_job.output_directory,
+                chunk_size=self._analysis_job.full_features_chunk_size,
+                compressed=self._analysis_job.full_features_compressed,
+            )
+            if store is not None:
+                return store
+
+        assert self._growth_data is not None
+        return FeatureStore.create(
+            self._analysis_job.output_directory,
+            self._growth_data.plate_shapes,
+            chunk_size=self._analysis_job.full_features_chunk_size,
+            compressed=self._analysis_job.full_features_compressed,
+        )
+
     def _filter_pinning_on_included_plates(self):
         assert self._original_model is not None
         included_indices = (
@@ -404,6 +610,12 @@ class AnalysisEffector(proc_effector.ProcessEffector):
         else:
             self._logger.info("Removed pre-existing time data file")
 
+        if GrowthDataStore.remove(self._analysis_job.output_directory):
+            self._logger.info("Removed pre-existing growth data")
+
+        if FeatureStore.remove(self._analysis_job.output_directory):
+            self._logger.info("Removed pre-existing full features")
+
         for i, _ in enumerate(self._analysis_job.pinning_matrices):
 
             for filename_pattern in (
@@ -425,6 +637,13 @@ class AnalysisEffector(proc_effector.ProcessEffector):
                         f"Removed pre-existing grid file '{grid_path}'",
                     )
 
+        try:
+            os.remove(self._incremental_state_path)
+        except (IOError, OSError):
+            pass
+        else:
+            self._logger.info("Removed pre-existing incremental analysis state")
+
         remove_state_from_path(self._analysis_job.output_directory)
 
     def setup(self, *_):
@@ -1,7 +1,20 @@
 import os
 import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from typing import Any, Optional, cast
-from scanomatic.io.jsonizer import dump, dump_to_stream, loads
+
+import numpy as np
+
+from scanomatic.io.jsonizer import (
+    CONTENT,
+    append_record,
+    dump,
+    index_records,
+    load_record,
+    loads,
+    replace_records
+)
 
 import scanomatic.io.rpc_client as rpc_client
 from scanomatic.image_analysis import first_pass
@@ -11,12 +24,15 @@ from scanomatic.io.paths import Paths
 from scanomatic.models.compile_project_model import (
     COMPILE_ACTION,
     FIXTURE,
+    CompileImageAnalysisModel,
     CompileImageModel,
     CompileInstructionsModel
 )
 from scanomatic.models.factories.analysis_factories import AnalysisModelFactory
 from scanomatic.models.rpc_job_models import JOB_TYPE, RPCjobModel
+from scanomatic.models.fixture_models import FixtureModel
 from scanomatic.models.validators.validate import validate
+from scanomatic.util.image_ranges import get_image_indices
 
 from . import proc_effector
 
@@ -43,6 +59,57 @@ All the best,
 Scan-o-Matic"""
 )
 
+FirstPassResult = tuple[Optional[CompileImageAnalysisModel], dict[str, Any]]
+RecordLocation = tuple[int, int]
+
+_worker_fixture_settings: Optional[FixtureSettings] = None
+
+
+def _init_first_pass_worker(fixture_settings: FixtureSettings) -> None:
+    global _worker_fixture_settings
+    _worker_fixture_settings = fixture_settings
+
+
+def _run_first_pass(compile_image_model: CompileImageModel) -> FirstPassResult:
+    """First pass analysis of one image in a worker process
+
+    :return: The analysis, or None if the markers were not detected, and
+        the issues found
+    """
+    assert _worker_fixture_settings is not None
+    issues: dict[str, Any] = {}
+    try:
+        return (
+            first_pass.analyse(
+                compile_image_model,
+                _worker_fixture_settings,
+                issues=issues,
+            ),
+            issues,
+        )
+    except first_pass.MarkerDetectionFailed:
+        return None, issues
+
+
+def _get_image_index(record: Any) -> int:
+    return int(record[CONTENT]["image"][CONTENT]["index"])
+
+
+def get_marker_changes(original: FixtureModel, fixed: FixtureModel) -> str:
+    """Description of how far each marker moved between two analyses"""
+    before, after = (
+        np.column_stack((
+            np.asarray(fixture.orientation_marks_x, dtype=float),
+            np.asarray(fixture.orientation_marks_y, dtype=float),
+        ))
+        for fixture in (original, fixed)
+    )
+    if before.shape != after.shape:
+        return f"{len(before)} markers became {len(after)} markers"
+    return ", ".join(
+        f"({dx:.1f}, {dy:.1f})" for dx, dy in after - before
+    )
+
 
 class CompileProjectEffector(proc_effector.ProcessEffector):
 
@@ -66,6 +133,15 @@ class CompileProjectEffector(proc_effector.ProcessEffector):
         self._fixture_settings: Optional[FixtureSettings] = None
         self._compile_instructions_path: Optional[str] = None
         self._has_mailed_issues = False
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: deque[Future] = deque()
+        self._image_to_submit = 0
+        # Compilation records to fix up by image index
+        self._fix_up_records: dict[
+            int,
+            tuple[RecordLocation, CompileImageAnalysisModel],
+        ] = {}
+        self._fixed_up: dict[RecordLocation, CompileImageAnalysisModel] = {}
         self._allowed_calls['progress'] = self.progress
 
     @property
@@ -119,6 +195,8 @@ class CompileProjectEffector(proc_effector.ProcessEffector):
         )
         self._tweak_path()
         self._load_fixture()
+        if self._compile_job.compile_action is COMPILE_ACTION.FixUp:
+            self._set_fix_up_images()
         self._allow_start = True
 
         if self._fixture_settings is None:
@@ -154,6 +232,75 @@ class CompileProjectEffector(proc_effector.ProcessEffector):
                 dir_path=dir_path,
             )
 
+    def _set_fix_up_images(self):
+        """Set the images to redo in a fix-up of the compilation
+
+        Images with records in the compilation are redone from the image
+        information of the record, other images must be among the images
+        of the job.
+        """
+        index = index_records(self._compile_job.path, _get_image_index)
+        if index is None:
+            self._logger.critical(
+                f"Could not index the compilation {self._compile_job.path}",
+            )
+            self._stopping = True
+            return
+
+        job_images = {image.index: image for image in self._compile_job.images}
+        indices = get_image_indices(
+            self._compile_job.fix_up_images,
+            max(
+                [image_index for _, _, image_index in index]
+                + list(job_images),
+                default=-1,
+            ) + 1,
+        )
+        if indices is None:
+            self._logger.critical(
+                f"Malformed fix-up images '{self._compile_job.fix_up_images}'",
+            )
+            self._stopping = True
+            return
+
+        for offset, length, image_index in index:
+            if image_index not in indices:
+                continue
+            original = load_record(self._compile_job.path, offset, length)
+            if original is not None:
+                self._fix_up_records[image_index] = ((offset, length), original)
+
+        images = {
+            index: image for index, image in job_images.items()
+            if index in indices
+        }
+        images.update(
+            (index, original.image)
+            for index, (_, original) in self._fix_up_records.items()
+        )
+        self._compile_job.images = tuple(
+            images[index] for index in sorted(images)
+        )
+        self._logger.info(
+            "Fixing up images {0} of which {1} are missing in the compilation".format(  # noqa: E501
+                sorted(images),
+                sorted(set(images).difference(self._fix_up_records)),
+            ),
+        )
+
+    def _write_fix_ups(self):
+        if self._fixed_up and not replace_records(
+            self._compile_job.path,
+            self._fixed_up,
+        ):
+            self._logger.critical(
+                f"Could not write fixed up records to {self._compile_job.path}",
+            )
+            return
+        self._logger.info(
+            f"Replaced {len(self._fixed_up)} records of the compilation",
+        )
+
     def _tweak_path(self):
         self._compile_job.path = (
             Paths().get_project_compile_path_from_compile_model(
@@ -166,64 +313,196 @@ class CompileProjectEffector(proc_effector.ProcessEffector):
             return super().__next__()
 
         if self._stopping:
+            self._shutdown_workers()
             raise StopIteration()
         elif self._image_to_analyse < len(self._compile_job.images):
-            self._analyse_image(
-                self._compile_job.images[self._image_to_analyse]
-            )
+            if self._use_workers:
+                self._analyse_image_in_workers()
+            else:
+                self._analyse_image(
+                    self._compile_job.images[self._image_to_analyse]
+                )
             self._image_to_analyse += 1
             return True
+        elif self._compile_job.compile_action is COMPILE_ACTION.FixUp:
+            self._shutdown_workers()
+            self._write_fix_ups()
+            self.enact_stop()
+            raise StopIteration
         elif (
             self._compile_job.compile_action
             is COMPILE_ACTION.AppendAndSpawnAnalysis
             or self._compile_job.compile_action
             is COMPILE_ACTION.InitiateAndSpawnAnalysis
         ):
+            self._shutdown_workers()
             self._spawn_analysis()
             self.enact_stop()
             raise StopIteration
+        elif self._compile_job.incremental_analysis:
+            self._shutdown_workers()
+            self._spawn_analysis(final=False)
+            self.enact_stop()
+            raise StopIteration
         else:
+            self._shutdown_workers()
             self.enact_stop()
             raise StopIteration
 
+    @property
+    def _use_workers(self) -> bool:
+        return (
+            self._compile_job.compile_workers > 1
+            and len(self._compile_job.images) > 1
+        )
+
+    def _clear_new_compilation(self) -> bool:
+        if not self._is_starting_new_compilation:
+            return True
+        try:
+            open(self._compile_job.path, 'w').close()
+        except IOError:
+            self._stopping = True
+            self._logger.critical(
+                f"Could not write to project file {self._compile_job.path}",
+            )
+            return False
+        return True
+
     def _analyse_image(self, compile_image_model: CompileImageModel):
         assert self._fixture_settings is not None
+        if not self._clear_new_compilation():
+            return
+
+        issues: dict[str, Any] = {}
+        try:
+            image_model: Optional[CompileImageAnalysisModel] = (
+                first_pass.analyse(
+                    compile_image_model,
+                    self._fixture_settings,
+                    issues=issues,
+                )
+            )
+        except first_pass.MarkerDetectionFailed:
+            image_model = None
+        except IOError:
+            self._logger.error(
+                "Could not output analysis of {0} to {1}".format(
+                    compile_image_model.path,
+                    self._compile_job.path,
+                ),
+            )
+            return
+        self._output_analysis(compile_image_model, image_model, issues)
+
+    def _analyse_image_in_workers(self):
+        """Output the first pass analysis of the next image
+
+        The images are analysed in worker processes, a few images ahead of
+        the one being output, so that the compilation is still written in
+        the order of the images. Like when analysing in process, images that
+        can't be read are skipped, while any other failure stops the
+        compilation.
+        """
+        assert self._fixture_settings is not None
+        images = self._compile_job.images
+        if self._executor is None:
+            if not self._clear_new_compilation():
+                return
+            workers = min(self._compile_job.compile_workers, len(images))
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_first_pass_worker,
+                initargs=(self._fixture_settings,),
+            )
+            self._image_to_submit = self._image_to_analyse
+            self._logger.info(f"Started {workers} first pass workers")
+
         try:
-            with self._compile_output_filehandle as fh:
-                issues: dict[str, Any] = {}
-                try:
-                    image_model = first_pass.analyse(
-                        compile_image_model,
-                        self._fixture_settings,
-                        issues=issues,
-                    )
-                    if validate(image_model):
-                        dump_to_stream(
-                            image_model,
-                            fh,
-                            as_if_appending=True,
-                        )
-                except first_pass.MarkerDetectionFailed:
-                    self._logger.error(
-                        "Failed to detect the markers on {0} using fixture {1}".format(  # noqa: E501
-                            compile_image_model.path,
-                            self._fixture_settings.model.path
-                        ),
-                    )
-                except IOError:
-                    self._logger.error(
-                        "Could not output analysis of {0} to {1}".format(
-                            compile_image_model.path,
-                            fh.name,
-                        ),
-                    )
-                if issues and not self._has_mailed_issues:
-                    self._mail_issues(issues)
+            while (
+                len(self._pending) < 2 * self._compile_job.compile_workers
+                and self._image_to_submit < len(images)
+            ):
+                self._pending.append(self._executor.submit(
+                    _run_first_pass,
+                    images[self._image_to_submit],
+                ))
+                self._image_to_submit += 1
+        except Exception:
+            self._stopping = True
+            self._logger.exception(
+                "Could not hand images to the first pass workers,"
+                " stopping compilation",
+            )
+            return
 
+        compile_image_model = images[self._image_to_analyse]
+        try:
+            image_model, issues = self._pending.popleft().result()
         except IOError:
-            self._logger.critical(
-                f"Could not write to project file {self._compile_job.path}",
+            self._logger.error(
+                "Could not output analysis of {0} to {1}".format(
+                    compile_image_model.path,
+                    self._compile_job.path,
+                ),
             )
+            return
+        except Exception:
+            self._stopping = True
+            self._logger.exception(
+                f"First pass analysis of {compile_image_model.path} failed,"
+                " stopping compilation",
+            )
+            return
+        self._output_analysis(compile_image_model, image_model, issues)
+
+    def _shutdown_workers(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._pending.clear()
+
+    def _output_analysis(
+        self,
+        compile_image_model: CompileImageModel,
+        image_model: Optional[CompileImageAnalysisModel],
+        issues: dict[str, Any],
+    ):
+        assert self._fixture_settings is not None
+        if image_model is None:
+            self._logger.error(
+                "Failed to detect the markers on {0} using fixture {1}".format(
+                    compile_image_model.path,
+                    self._fixture_settings.model.path
+                ),
+            )
+        elif validate(image_model):
+            if compile_image_model.index in self._fix_up_records:
+                self._set_fixed_up(compile_image_model.index, image_model)
+            elif not append_record(image_model, self._compile_job.path):
+                self._stopping = True
+                self._logger.critical(
+                    "Could not output analysis of {0} to {1}".format(
+                        compile_image_model.path,
+                        self._compile_job.path,
+                    ),
+                )
+        if issues and not self._has_mailed_issues:
+            self._mail_issues(issues)
+
+    def _set_fixed_up(
+        self,
+        index: int,
+        image_model: CompileImageAnalysisModel,
+    ):
+        location, original = self._fix_up_records[index]
+        self._fixed_up[location] = image_model
+        self._logger.info(
+            "Fixed up image {0}, markers moved {1}".format(
+                index,
+                get_marker_changes(original.fixture, image_model.fixture),
+            ),
+        )
 
     def _mail_issues(self, issues: dict[str, Any]):
         self._has_mailed_issues = True
@@ -238,10 +517,17 @@ class CompileProjectEffector(proc_effector.ProcessEffector):
                 f"* Image seems rotated ({issues['rotation']} radians).\n"
                 if 'rotation' in issues else ""
             ) +
-            "* Part of calibrated fixture falls outside image ({0}).\n".format(
-                issues['overflow'] if isinstance(issues['overflow'], str)
-                else "Plate {0}".format(issues["overflow"])
-            ) if 'overflow' in issues else ""
+            (
+                "* Detected markers don't match the fixture markers "
+                f"(distances off by {issues['markers']:.1f} pixels).\n"
+                if 'markers' in issues else ""
+            ) +
+            (
+                "* Part of calibrated fixture falls outside image ({0}).\n".format(  # noqa: E501
+                    issues['overflow'] if isinstance(issues['overflow'], str)
+                    else "Plate {0}".format(issues["overflow"])
+                ) if 'overflow' in issues else ""
+            ) +
             "\n\n"
             "All the best,"
             "\n\n"
@@ -250,23 +536,12 @@ class CompileProjectEffector(proc_effector.ProcessEffector):
         )
 
     @property
-    def _compile_output_filehandle(self):
-        fh_mode = 'r+'
-        if (
-            (
-                self._compile_job.compile_action is COMPILE_ACTION.Initiate
-                or self._compile_job.compile_action
-                is COMPILE_ACTION.InitiateAndSpawnAnalysis
-            ) and self._image_to_analyse == 0
-        ):
-            fh_mode = 'w+'
-
-        try:
-            return open(self._compile_job.path, fh_mode)
-
-        except IOError as e:
-            self._stopping = True
-            raise e
+    def _is_starting_new_compilation(self) -> bool:
+        return (
+            self._compile_job.compile_action is COMPILE_ACTION.Initiate
+            or self._compile_job.compile_action
+            is COMPILE_ACTION.InitiateAndSpawnAnalysis
+        ) and self._image_to_analyse == 0
 
     def enact_stop(self) -> None:
         self._stopping = True
@@ -276,16 +551,23 @@ class CompileProjectEffector(proc_effector.ProcessEffector):
             self._compile_job,
         )
 
-    def _spawn_analysis(self) -> bool:
+    def _spawn_analysis(self, final: bool = True) -> bool:
+        """Request analysis of the compilation
+
+        :param final: If the compilation is complete and the analysis should
+            be followed by feature extraction. Non-final analyses are only
+            requested for incremental analysis of each compile step.
+        """
         assert self._fixture_settings is not None
         analysis_model = AnalysisModelFactory.create(
-            chain=True,
+            chain=final,
             compile_instructions=self._compile_instructions_path,
             compilation=self._compile_job.path,
-            email=self._compile_job.email,
+            email=self._compile_job.email if final else "",
             cell_count_calibration_id=(
                 self._compile_job.cell_count_calibration_id
             ),
+            incremental=self._compile_job.incremental_analysis,
         )
 
         if self._compile_job.overwrite_pinning_matrices:
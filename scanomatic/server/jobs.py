@@ -1,4 +1,4 @@
-from multiprocessing import Pipe
+from multiprocessing import Pipe, Process
 from typing import Union, cast
 
 import scanomatic.io.paths as paths
@@ -15,6 +15,17 @@ from scanomatic.io.logger import get_logger
 from scanomatic.models.factories.rpc_job_factory import RPC_Job_Model_Factory
 
 
+def start_job_process(job_process: Process) -> None:
+    """Start the process of a job
+
+    Jobs start worker processes of their own, which daemonic processes may
+    not have. Job processes are therefore not daemonic, and those still
+    running when the server shuts down are ended by `Jobs.terminate_running`.
+    """
+    job_process.daemon = False
+    job_process.start()
+
+
 class Jobs(SingeltonOneInit):
     def __one_init__(self):
 
@@ -122,6 +133,21 @@ class Jobs(SingeltonOneInit):
 
         self._forcingStop = value
 
+    def terminate_running(self) -> None:
+        """Terminate the job processes started by this server that still run
+
+        Their worker processes are terminated with them.
+        """
+        for job, job_process in self._jobs.items():
+            if (
+                isinstance(job_process, rpc_job.RpcJob)
+                and job_process.is_alive()
+            ):
+                self._logger.warning(
+                    "Terminating job '{0}' ({1})".format(job.id, job.type),
+                )
+                job_process.terminate_with_workers()
+
     def _load_from_file(self):
         jobs = load(self._paths.rpc_jobs)
         for job in cast(
@@ -240,8 +266,7 @@ class Jobs(SingeltonOneInit):
         job_process: rpc_job.RpcJob,
         job: rpc_job_models.RPCjobModel,
     ) -> None:
-        job_process.daemon = True
-        job_process.start()
+        start_job_process(job_process)
         job.pid = job_process.pid
         if job.type is rpc_job_models.JOB_TYPE.Scan:
             self._add_scanner_operations_to_job(job_process)
@@ -178,6 +178,7 @@ class PhenotypeExtractionEffector(proc_effector.ProcessEffector):
             )
         self._phenotype_iterator = self._phenotyper.iterate_extraction(
             self._feature_job.try_keep_qc,
+            workers=self._feature_job.extraction_workers,
         )
         self._iteration_index = 1
         self._logger.info("Starting phenotype extraction")
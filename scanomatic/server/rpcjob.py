@@ -158,3 +158,18 @@ class RpcJob(Process, Fake):
             pipe_effector.sendStatus(pipe_effector.procEffector.status())
         t.join(timeout=1)
         _logger.info("Job completed")
+
+    def terminate_with_workers(self) -> None:
+        """Terminate the job process and the worker processes it started"""
+        try:
+            workers = psutil.Process(self.pid).children(recursive=True)
+        except psutil.NoSuchProcess:
+            workers = []
+        self.terminate()
+        self.join(timeout=5)
+        for worker in workers:
+            try:
+                worker.terminate()
+            except psutil.NoSuchProcess:
+                pass
+        psutil.wait_procs(workers, timeout=5)
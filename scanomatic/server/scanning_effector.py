@@ -318,6 +318,7 @@ class ScannerEffector(proc_effector.ProcessEffector):
                 cell_count_calibration_id=(
                     self._scanning_job.cell_count_calibration_id
                 ),
+                incremental_analysis=self._scanning_job.incremental_analysis,
             )
         )
 
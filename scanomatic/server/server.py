@@ -151,6 +151,7 @@ class Server:
 
         if self._waitForJobsToTerminate:
             self._wait_on_jobs()
+        self._jobs.terminate_running()
 
         self._save_state()
 
@@ -188,7 +189,7 @@ class Server:
         if self._jobs.running:
 
             self.logger.warning(
-                "Jobs will be abandoned, can't wait for ever...",
+                "Jobs will be terminated, can't wait for ever...",
             )
 
     def _get_job_id(self) -> str:
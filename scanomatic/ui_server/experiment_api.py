@@ -363,6 +363,7 @@ def add_routes(app: Flask, rpc_client: _ClientProxy):
             )
         chain_steps = bool(data_object.get('chain', True))
         images = data_object.get('images', [])
+        fix_up_images = data_object.get('fix_up', '')
 
         _logger.info(
             "Attempting to compile on path {0}, as {1} fixture{2} (Chaining: {3}), images {4}".format(  # noqa: E501
@@ -381,9 +382,11 @@ def add_routes(app: Flask, rpc_client: _ClientProxy):
             fixture=fixture,
             is_local=fixture_is_local,
             compile_action=(
-                COMPILE_ACTION.InitiateAndSpawnAnalysis
+                COMPILE_ACTION.FixUp if fix_up_images
+                else COMPILE_ACTION.InitiateAndSpawnAnalysis
                 if chain_steps else COMPILE_ACTION.Initiate
             ),
+            fix_up_images=fix_up_images,
         )
 
         n_images_in_folder = len(dict_model['images'])
@@ -1,161 +1,69 @@
-import glob
-import os
+from base64 import b64encode
+from io import BytesIO
 
 import numpy as np
-
-from scanomatic.generics.purge_importing import ExpiringModule
-from scanomatic.image_analysis.image_basics import load_image_to_numpy
-from scanomatic.io.jsonizer import load
-from scanomatic.io.logger import get_logger
-from scanomatic.io.paths import Paths
-from scanomatic.io.pickler import safe_load
-from scanomatic.models.compile_project_model import CompileImageAnalysisModel
-
-_logger = get_logger("Analysis Utils")
-
-
-def produce_grid_images(
-    path=".",
-    plates=None,
-    image=None,
-    mark_position=None,
-    compilation=None,
-):
-
-    project_path = os.path.join(os.path.dirname(os.path.abspath(path)))
-
-    if plates:
-        plates = [plate_index + 1 for plate_index in plates]
-
-    if compilation:
-        if not os.path.isfile(compilation):
-            raise ValueError(
-                "There's no compilation at {0}".format(compilation),
-            )
+from PIL import Image
+
+
+def get_downscaled_image(im: np.ndarray, max_size: int) -> np.ndarray:
+    """Block mean downscale an image so no side is longer than max_size,
+    stretching the values to 8 bits."""
+    factor = max(1, int(np.ceil(max(im.shape) / max_size)))
+    rows = im.shape[0] // factor
+    cols = im.shape[1] // factor
+    small = im[: rows * factor, : cols * factor].reshape(
+        rows, factor, cols, factor,
+    ).mean(axis=(1, 3))
+    low, high = (small.min(), small.max()) if small.size else (0, 0)
+    if high > low:
+        small = (small - low) * (255. / (high - low))
     else:
-        for compilation_pattern in (
-            Paths().project_compilation_pattern,
-            Paths().project_compilation_from_scanning_pattern,
-            Paths().project_compilation_from_scanning_pattern_old,
-        ):
-            compilations = glob.glob(
-                os.path.join(
-                    os.path.dirname(os.path.abspath(path)),
-                    compilation_pattern.format("*")),
-                )
-
-            if compilations:
-                break
-
-        if not compilations:
-            raise ValueError(
-                "There are no compilations in the parent directory",
-                )
-
-        compilation = compilations[0]
-
-    _logger.info(
-        "Using '{0}' to produce grid images".format(
-            os.path.basename(compilation),
-        )
-    )
-
-    compilation_list: list[CompileImageAnalysisModel] = load(compilation)
-
-    image_path = compilation_list[-1].image.path
-    all_plates = compilation_list[-1].fixture.plates
-    if image is not None:
-        for c in compilation_list:
-            if os.path.basename(c.image.path) == os.path.basename(image):
-                image_path = c.image.path
-                all_plates = c.fixture.plates
-                break
-
-    try:
-        image = load_image_to_numpy(image_path, dtype=np.uint8)
-    except IOError:
-
-        try:
-            image = load_image_to_numpy(
-                os.path.join(project_path, os.path.basename(image_path)),
-                dtype=np.uint8,
+        small = np.zeros_like(small)
+    return small.astype(np.uint8)
+
+
+def make_grid_preview(im, grid, save_grid_name, max_size=800):
+    """Write a grid image with a downscaled plate image
+
+    The plate image is embedded as a PNG and the grid lines are drawn on
+    top in the full resolution coordinates of the plate, so the preview
+    lines up with the grid as used in the analysis.
+
+    :param im: The plate image section the grid was detected on
+    :param grid: The grid or None
+    :param save_grid_name: Path of the svg-file
+    :param max_size: Longest side of the embedded image in pixels
+    """
+    im = np.asarray(im).T
+    small = get_downscaled_image(im, max_size)
+    buffer = BytesIO()
+    Image.fromarray(small).save(buffer, format="PNG")
+    width, height = small.shape[1], small.shape[0]
+    lines = []
+    if grid is not None:
+        grid = np.asarray(grid, dtype=float)
+        lines = [
+            " ".join(f"{x:.1f},{y:.1f}" for x, y in zip(*line))
+            for line in (
+                [grid[:, row, :] for row in range(grid.shape[1])]
+                + [grid[:, :, col] for col in range(grid.shape[2])]
             )
-        except IOError:
-            raise ValueError("Image doesn't exist, can't show gridding")
-
-    _logger.info("Producing grid images for {0}".format(plates))
-
-    for plate in all_plates:
-
-        if plate is not None and plate.index not in plates:
-            continue
-
-        plate_image = image[plate.y1: plate.y2, plate.x1: plate.x2]
-
-        grid_path = os.path.join(
-            path, Paths().grid_pattern.format(plate.index))
-        try:
-            grid = np.load(
-                safe_load(grid_path),
-                allow_pickle=True,
-            )
-        except IOError:
-            _logger.warning("Could not find any grid: " + grid_path)
-            grid = None
-
-        image_path = Paths().experiment_grid_image_pattern.format(plate.index)
-        make_grid_im(
-            plate_image,
-            grid,
-            os.path.join(path, image_path),
-            marked_position=mark_position,
+        ]
+
+    with open(save_grid_name, "w") as fh:
+        fh.write(
+            '<svg xmlns="http://www.w3.org/2000/svg"'
+            ' xmlns:xlink="http://www.w3.org/1999/xlink"'
+            f' width="{width}" height="{height}"'
+            f' viewBox="0 0 {im.shape[1]} {im.shape[0]}">'
+            f'<image width="{im.shape[1]}" height="{im.shape[0]}"'
+            ' preserveAspectRatio="none" image-rendering="pixelated"'
+            ' xlink:href="data:image/png;base64,'
+            f'{b64encode(buffer.getvalue()).decode()}"/>'
         )
-
-
-def make_grid(im, grid_plot, grid, marked_position):
-    x = 0
-    y = 1
-    for row in range(grid.shape[1]):
-
-        grid_plot.plot(
-            grid[x, row, :], -grid[y, row, :] + im.shape[y], 'r-')
-
-    for col in range(grid.shape[2]):
-
-        grid_plot.plot(
-            grid[x, :, col], -grid[y, :, col] + im.shape[y], 'r-')
-
-    if marked_position is None:
-        marked_position = (-1, 0)
-
-    grid_plot.plot(
-        grid[x, marked_position[0], marked_position[1]],
-        grid[y, marked_position[0], marked_position[1]] +
-        im.shape[y],
-        'o', alpha=0.75, ms=10, mfc='none', mec='blue', mew=1,
-    )
-
-
-def make_grid_im(im, grid, save_grid_name, marked_position=None):
-
-    with ExpiringModule("matplotlib", run_code="mod.use('Svg')"):
-        with ExpiringModule("matplotlib.pyplot") as plt:
-
-            grid_image = plt.figure()
-            grid_plot = grid_image.add_subplot(111)
-            grid_plot.imshow(im.T, cmap=plt.cm.gray)
-
-            if grid is not None:
-                make_grid(im, grid_plot, grid, marked_position)
-
-            ax = grid_image.gca()
-            ax.set_xlim(0, im.shape[0])
-            ax.set_ylim(0, im.shape[1])
-            ax.get_xaxis().set_visible(False)
-            ax.get_yaxis().set_visible(False)
-
-            grid_image.savefig(
-                save_grid_name,
-                pad_inches=0.01,
-                format='svg',
-                bbox_inches='tight')
+        for line in lines:
+            fh.write(
+                f'<polyline points="{line}" fill="none" stroke="red"'
+                ' stroke-width="1" vector-effect="non-scaling-stroke"/>'
+            )
+        fh.write('</svg>')
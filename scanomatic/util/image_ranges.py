@@ -0,0 +1,29 @@
+from typing import Optional
+
+
+def get_image_indices(ranges: str, stop: int) -> Optional[set[int]]:
+    """Image indices of a range string such as '0-10,15,20-'
+
+    Ranges include both ends. A range without start begins at the first
+    image and one without end runs to the last image.
+
+    :param ranges: Comma separated indices and ranges
+    :param stop: One more than the index of the last image
+    :return: The indices, None if the string is malformed
+    """
+    indices: set[int] = set()
+    for part in ranges.split(","):
+        bounds = [bound.strip() for bound in part.strip().split("-")]
+        if len(bounds) == 1 and bounds[0]:
+            bounds *= 2
+        if len(bounds) != 2:
+            return None
+        start, end = bounds
+        try:
+            indices.update(range(
+                int(start) if start else 0,
+                int(end) + 1 if end else stop,
+            ))
+        except ValueError:
+            return None
+    return indices
@@ -0,0 +1,43 @@
+from multiprocessing import Pipe, Process
+
+import pytest
+
+from scanomatic.server.jobs import start_job_process
+
+
+def _run_job(connection, target, args):
+    try:
+        connection.send((True, target(*args)))
+    except BaseException as error:
+        connection.send((False, repr(error)))
+    connection.close()
+
+
+@pytest.fixture
+def run_in_job_process():
+    """Run a function in a process started the way the server starts jobs
+
+    The function and its arguments are inherited by the process, its result
+    is sent back and any error is raised as an AssertionError.
+    """
+    def run(target, *args):
+        parent_connection, child_connection = Pipe()
+        process = Process(
+            target=_run_job,
+            args=(child_connection, target, args),
+        )
+        start_job_process(process)
+        child_connection.close()
+        try:
+            if not parent_connection.poll(60):
+                raise AssertionError("Job process did not finish")
+            success, result = parent_connection.recv()
+        finally:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        if not success:
+            raise AssertionError(f"Job process failed: {result}")
+        return result
+
+    return run
@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+
+from scanomatic.data_processing.growth_phenotypes import (
+    Phenotypes,
+    get_chapman_richards_4parameter_extended_curve
+)
+from scanomatic.data_processing.phases.features import VectorPhenotypes
+from scanomatic.data_processing.pheno.extraction import (
+    extract_shared_curve_phenotypes,
+    get_empty_phenotypes,
+    iterate_curve_phenotypes
+)
+from scanomatic.data_processing.pheno.state import PhenotyperSettings
+from scanomatic.data_processing.phenotyper import Phenotyper
+from scanomatic.data_processing.phenotypes import PhenotypeDataType
+from scanomatic.io.shared_arrays import SharedArrays
+
+TIMES = np.arange(73) / 1.5
+SETTINGS = PhenotyperSettings(
+    median_kernel_size=5,
+    gaussian_filter_sigma=1.5,
+    linear_regression_size=5,
+)
+
+
+def _get_plate(rng, rows: int, columns: int) -> np.ndarray:
+    params = (
+        np.array([1.64, -0.1, -2.46, 0.1, 15.18])
+        + rng.normal(0, 0.2, (rows * columns, 5))
+    )
+    plate = np.power(2, np.array([
+        get_chapman_richards_4parameter_extended_curve(TIMES, *p)
+        for p in params
+    ])).reshape(rows, columns, TIMES.size)
+    plate[0, 1] = np.nan
+    return plate
+
+
+@pytest.fixture(scope='module')
+def plate():
+    return _get_plate(np.random.default_rng(0), 3, 4)
+
+
+def _assert_phenotypes_equal(phenotypes, expected):
+    scalars, vectors = phenotypes
+    expected_scalars, expected_vectors = expected
+    assert scalars.keys() == expected_scalars.keys()
+    for phenotype, values in scalars.items():
+        np.testing.assert_allclose(values, expected_scalars[phenotype])
+    assert vectors.keys() == expected_vectors.keys()
+    for phenotype, values in vectors.items():
+        for value, expected_value in zip(
+            values.ravel(),
+            expected_vectors[phenotype].ravel(),
+        ):
+            assert repr(value) == repr(expected_value)
+
+
+def test_iterate_curve_phenotypes(plate):
+    phenotypes = get_empty_phenotypes(
+        plate.shape[:2],
+        PhenotypeDataType.Trusted,
+    )
+    assert list(iterate_curve_phenotypes(
+        plate,
+        TIMES,
+        SETTINGS,
+        phenotypes,
+        0,
+    )) == [4, 8, 12]
+
+    scalars, vectors = phenotypes
+    assert np.isnan(scalars[Phenotypes.GenerationTime][0, 1])
+    assert np.isfinite(scalars[Phenotypes.GenerationTime][1]).all()
+    assert vectors[VectorPhenotypes.PhasesClassifications][1, 1].size == (
+        TIMES.size
+    )
+
+
+def test_extract_shared_curve_phenotypes(plate):
+    expected = get_empty_phenotypes(
+        plate.shape[:2],
+        PhenotypeDataType.Trusted,
+    )
+    for _ in iterate_curve_phenotypes(plate, TIMES, SETTINGS, expected, 0):
+        pass
+
+    shared = SharedArrays(plate.nbytes + 16)
+    try:
+        shared.add(np.zeros(2))
+        _, shared_plate = shared.add(plate)
+        phenotypes = extract_shared_curve_phenotypes(
+            shared_plate,
+            (1, 3),
+            TIMES,
+            SETTINGS,
+            0,
+        )
+    finally:
+        shared.release()
+
+    expected_scalars, expected_vectors = expected
+    _assert_phenotypes_equal(
+        phenotypes,
+        (
+            {
+                phenotype: values[1:3]
+                for phenotype, values in expected_scalars.items()
+            },
+            {
+                phenotype: values[1:3]
+                for phenotype, values in expected_vectors.items()
+            },
+        ),
+    )
+
+
+def _extract(workers: int) -> list[tuple[dict, dict]]:
+    rng = np.random.default_rng(1)
+    raw_growth_data = np.empty((2,), dtype=object)
+    raw_growth_data[0] = _get_plate(rng, 3, 2)
+    raw_growth_data[1] = _get_plate(rng, 2, 3)
+    phenotyper = Phenotyper(raw_growth_data, TIMES)
+    progress = list(phenotyper.iterate_extraction(workers=workers))
+    assert progress[-1] == 1
+    assert progress == sorted(progress)
+    phenotypes = phenotyper._state.phenotypes
+    vector_phenotypes = phenotyper._state.vector_phenotypes
+    assert phenotypes is not None and vector_phenotypes is not None
+    return [
+        (phenotypes[plate], vector_phenotypes[plate])
+        for plate in (0, 1)
+    ]
+
+
+def test_extraction_in_workers_same_as_in_process():
+    in_process = _extract(1)
+    for plate, phenotypes in enumerate(_extract(2)):
+        _assert_phenotypes_equal(phenotypes, in_process[plate])
+
+
+def test_extraction_in_workers_in_job_process(run_in_job_process):
+    in_process = _extract(1)
+    for plate, phenotypes in enumerate(run_in_job_process(_extract, 2)):
+        _assert_phenotypes_equal(phenotypes, in_process[plate])
@@ -0,0 +1,177 @@
+import numpy as np
+import pytest
+from scipy.stats import norm  # type: ignore
+
+from scanomatic.data_processing.growth_phenotypes import (
+    get_chapman_richards_4parameter_extended_curve
+)
+from scanomatic.data_processing.pheno.smoothing import (
+    fit_window_polynomials,
+    get_polynomial_smoothing,
+    get_weighted_polynomial_smoothing
+)
+from scanomatic.data_processing.phenotyper import Phenotyper
+
+TIMES = np.arange(97) / 3
+POWER = 3
+TIME_DIFFS = np.subtract.outer(TIMES, TIMES)
+FILT = np.abs(TIME_DIFFS) < 2.1
+
+
+@pytest.fixture(scope='module')
+def log2_curves():
+    rng = np.random.default_rng(0)
+    params = (
+        np.array([1.64, -0.1, -2.46, 0.1, 15.18])
+        + rng.normal(0, 0.2, (8, 5))
+    )
+    curves = np.array([
+        get_chapman_richards_4parameter_extended_curve(TIMES, *p)
+        for p in params
+    ]) + rng.normal(0, 0.02, (8, TIMES.size))
+    curves[1, 20:27] = np.nan
+    curves[2, 40:60] = np.nan
+    curves[3, ::3] = np.nan
+    curves[4, 10:20] = curves[4, 10]
+    curves[5, 30] = -np.inf
+    curves[6] = np.nan
+    return curves
+
+
+def _get_polyfits(log2_curve):
+    """Fits per window the way the smoothing used to make them"""
+    finite = np.isfinite(log2_curve)
+    for window_filt in FILT:
+        selection = window_filt & finite
+        if not selection.any():
+            yield None, np.nan, np.nan
+            continue
+        p, residuals, _, _, _ = np.polyfit(
+            TIMES[selection],
+            log2_curve[selection],
+            POWER,
+            full=True,
+        )
+        if residuals.size:
+            yield (
+                np.poly1d(p),
+                residuals[0] / selection.sum(),
+                np.var(log2_curve[selection]),
+            )
+        else:
+            yield np.poly1d(p), 0, 1
+
+
+def test_fit_window_polynomials_same_as_polyfit(log2_curves):
+    polynomials = fit_window_polynomials(TIMES, log2_curves, FILT, POWER)
+    for curve, log2_curve in enumerate(log2_curves):
+        expected = list(_get_polyfits(log2_curve))
+        np.testing.assert_allclose(
+            polynomials.residuals[curve],
+            [r for _, r, _ in expected],
+            rtol=1e-6,
+            atol=1e-12,
+        )
+        np.testing.assert_allclose(
+            polynomials.variances[curve],
+            [r0 for _, _, r0 in expected],
+        )
+
+        for window, (p, _, _) in enumerate(expected):
+            times = TIMES[FILT[window]]
+            values = polynomials.evaluate(
+                np.full(times.size, window),
+                times,
+            )[curve]
+            if p is None:
+                assert np.isnan(values).all()
+            else:
+                np.testing.assert_allclose(
+                    values,
+                    p(times),
+                    atol=1e-9,
+                )
+
+
+def test_fit_window_polynomials_with_too_few_values():
+    log2_curve = np.full((1, TIMES.size), np.nan)
+    log2_curve[0, 50] = 1
+    log2_curve[0, 52] = 2
+    polynomials = fit_window_polynomials(TIMES, log2_curve, FILT, POWER)
+
+    np.testing.assert_array_equal(
+        polynomials.counts[0, 43:60],
+        [0, 1, 1] + [2] * 11 + [1, 1, 0],
+    )
+    assert polynomials.residuals[0, 51] == 0
+    assert polynomials.variances[0, 51] == 1
+    np.testing.assert_allclose(
+        polynomials.evaluate(np.array([51, 51]), TIMES[[50, 52]])[0],
+        [1, 2],
+    )
+
+
+def test_polynomial_smoothing_same_as_polyfit(log2_curves):
+    smoothed = get_polynomial_smoothing(
+        TIMES,
+        fit_window_polynomials(TIMES, log2_curves, FILT, POWER),
+    )
+    for log2_curve, smooth_curve in zip(log2_curves, smoothed):
+        np.testing.assert_allclose(
+            smooth_curve,
+            [
+                np.nan if p is None else np.power(2, p(t))
+                for t, (p, _, _) in zip(TIMES, _get_polyfits(log2_curve))
+            ],
+            rtol=1e-9,
+        )
+
+
+def test_weighted_polynomial_smoothing_same_as_per_curve(log2_curves):
+    smoothed = get_weighted_polynomial_smoothing(
+        TIMES,
+        fit_window_polynomials(TIMES, log2_curves, FILT, POWER),
+        FILT,
+        1.5,
+    )
+    for log2_curve, smooth_curve in zip(log2_curves, smoothed):
+        polys, r, r0 = zip(*_get_polyfits(log2_curve))
+        included = np.array([p is not None for p in polys])
+        expected = []
+        for window_filt in FILT:
+            selection = window_filt & included
+            if not selection.any():
+                expected.append(np.nan)
+                continue
+            t = TIMES[selection].mean()
+            w = (
+                norm.pdf(TIMES[selection], loc=t, scale=1.5)
+                * (1 - np.array(r)[selection] / np.array(r0)[selection])
+            )
+            expected.append((w * [
+                np.power(2, p(t)) for p, i in zip(polys, selection) if i
+            ]).sum() / w.sum())
+
+        np.testing.assert_allclose(smooth_curve, expected, rtol=1e-9)
+
+
+def test_weighted_smoothing_of_curve_with_empty_windows():
+    plate = np.power(2, get_chapman_richards_4parameter_extended_curve(
+        TIMES,
+        1.64,
+        -0.1,
+        -2.46,
+        0.1,
+        15.18,
+    ))[None, None].repeat(2, axis=1)
+    plate[0, 1, 20:90] = np.nan
+    raw_growth_data = np.empty((1,), dtype=object)
+    raw_growth_data[0] = plate
+    phenotyper = Phenotyper(raw_growth_data, TIMES)
+
+    phenotyper._poly_smoothen_raw_growth_weighted()
+
+    smooth_plate = phenotyper.smooth_growth_data[0]
+    assert np.isfinite(smooth_plate[0, 0]).all()
+    assert np.isfinite(smooth_plate[0, 1, :20]).all()
+    assert np.isnan(smooth_plate[0, 1, 52:58]).all()
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from scanomatic.data_processing.convolution import (
+    EdgeCondition,
+    get_time_based_gaussian_weighted_means,
+    merge_convolve
+)
+
+TIMES = np.cumsum(np.random.default_rng(0).uniform(0.2, 0.5, 40))
+
+
+@pytest.fixture(scope='module')
+def curves():
+    curves = np.random.default_rng(1).uniform(0, 10, (2, 3, TIMES.size))
+    curves[0, 0, 0] = np.nan
+    curves[0, 1, 10:12] = np.nan
+    curves[0, 2, -2] = np.inf
+    curves[1, 0] = np.nan
+    return curves
+
+
+@pytest.mark.parametrize('edge_condition_mode', (
+    EdgeCondition.Reflect,
+    EdgeCondition.Symmetric,
+    EdgeCondition.Nearest,
+))
+@pytest.mark.parametrize('kernel_size', (3, 5))
+def test_time_based_gaussian_weighted_means_same_as_merge_convolve(
+    curves,
+    edge_condition_mode,
+    kernel_size,
+):
+    means = get_time_based_gaussian_weighted_means(
+        curves,
+        TIMES,
+        sigma=0.5,
+        edge_condition_mode=edge_condition_mode,
+        kernel_size=kernel_size,
+    )
+    for curve, curve_means in zip(
+        curves.reshape(-1, TIMES.size),
+        means.reshape(curves.shape[0] * curves.shape[1], -1),
+    ):
+        np.testing.assert_allclose(
+            curve_means,
+            merge_convolve(
+                curve,
+                TIMES,
+                edge_condition_mode=edge_condition_mode,
+                kernel_size=kernel_size,
+                func_kwargs={'sigma': 0.5},
+            ),
+        )
+
+
+def test_time_based_gaussian_weighted_means_valid_leaves_out_edges(curves):
+    np.testing.assert_array_equal(
+        get_time_based_gaussian_weighted_means(
+            curves,
+            TIMES,
+            edge_condition_mode=EdgeCondition.Valid,
+        ),
+        get_time_based_gaussian_weighted_means(curves, TIMES)[..., 2:-2],
+    )
+
+
+def test_time_based_gaussian_weighted_means_even_kernel(curves):
+    with pytest.raises(ValueError):
+        get_time_based_gaussian_weighted_means(curves, TIMES, kernel_size=4)
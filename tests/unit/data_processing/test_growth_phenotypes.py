@@ -0,0 +1,175 @@
+import numpy as np
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.stats import linregress  # type: ignore
+
+from scanomatic.data_processing.growth_phenotypes import (
+    get_chapman_richards_4parameter_extended_curve,
+    get_derivative,
+    get_derivatives,
+    get_fit_r_square,
+    get_fit_r_square_batch
+)
+
+P0 = np.array([1.64, -0.1, -2.46, 0.1, 15.18])
+TIMES = np.linspace(0, 72, 217)
+
+
+@pytest.fixture(scope='module')
+def log2_curves():
+    rng = np.random.default_rng(0)
+    params = P0 + rng.normal(0, [0.2, 0.2, 0.2, 0.2, 0.3], (40, 5))
+    curves = np.array([
+        get_chapman_richards_4parameter_extended_curve(TIMES, *p)
+        for p in params
+    ]) + rng.normal(0, 0.02, (40, TIMES.size))
+    curves[1, 30:50] = np.nan
+    curves[2, 4:] = np.nan
+    curves[3] = np.nan
+    curves[4] = 0
+    return curves
+
+
+def _assert_batch_fit_matches_single_fits(log2_curves):
+    r_squares, params = get_fit_r_square_batch(TIMES, log2_curves)
+    expected = [get_fit_r_square(TIMES, curve) for curve in log2_curves]
+
+    np.testing.assert_array_equal(
+        r_squares,
+        [r_square for r_square, _ in expected],
+    )
+    np.testing.assert_array_equal(params, [p for _, p in expected])
+
+
+def test_batch_fit_matches_single_fits(log2_curves):
+    _assert_batch_fit_matches_single_fits(log2_curves)
+
+
+def test_batch_fit_matches_single_fits_along_flat_valleys():
+    # Curves like these saturated at poor fits when the batch fit did not
+    # follow leastsq step by step
+    rng = np.random.default_rng(1)
+    params = rng.normal(
+        [1.5, -0.1, -2.5, 0, 15],
+        [0.5, 1, 0.5, 1, 1],
+        (256, 5),
+    )
+    with np.errstate(all='ignore'):
+        log2_curves = np.array([
+            get_chapman_richards_4parameter_extended_curve(TIMES, *p)
+            for p in params
+        ]) + rng.normal(0, 0.02, (256, TIMES.size))
+    _assert_batch_fit_matches_single_fits(log2_curves)
+
+
+def test_batch_fit_unfittable_curves(log2_curves):
+    r_squares, params = get_fit_r_square_batch(TIMES, log2_curves[2:5])
+    np.testing.assert_array_equal(r_squares, [np.inf, np.inf, np.nan])
+    np.testing.assert_array_equal(params[:2], [P0, P0])
+
+
+@pytest.fixture(scope='module')
+def growth_curves(log2_curves):
+    curves = np.power(2, log2_curves[:8])
+    curves[0, 10] = 0
+    curves[0, 30] = np.nan
+    curves[0, 50:52] = np.nan
+    curves[1, :3] = 1
+    return curves
+
+
+def _get_linregress_derivative(curve, regression_size):
+    slopes = []
+    errors = []
+    for times, values in zip(
+        sliding_window_view(TIMES, regression_size),
+        sliding_window_view(np.log2(curve), regression_size),
+    ):
+        finite = np.isfinite(values)
+        if finite.sum() >= regression_size - 1:
+            result = linregress(times[finite], values[finite])
+            slopes.append(result.slope)
+            errors.append(result.stderr)
+        else:
+            slopes.append(np.nan)
+            errors.append(np.nan)
+    return slopes, errors
+
+
+@pytest.mark.parametrize('regression_size', (3, 5))
+def test_derivatives_match_linregress(growth_curves, regression_size):
+    derivatives, errors = get_derivatives(
+        growth_curves.reshape(2, 4, TIMES.size),
+        TIMES,
+        regression_size,
+    )
+    assert derivatives.shape == (2, 4, TIMES.size - regression_size + 1)
+    for curve, curve_derivatives, curve_errors in zip(
+        growth_curves,
+        derivatives.reshape(8, -1),
+        errors.reshape(8, -1),
+    ):
+        expected_derivatives, expected_errors = _get_linregress_derivative(
+            curve,
+            regression_size,
+        )
+        np.testing.assert_allclose(
+            curve_derivatives,
+            expected_derivatives,
+            atol=1e-10,
+        )
+        np.testing.assert_allclose(curve_errors, expected_errors, atol=1e-8)
+
+
+def test_derivative_of_strided_curve(growth_curves):
+    for curve, expected in zip(
+        growth_curves,
+        np.array(get_derivatives(growth_curves, TIMES, 5)).transpose(1, 0, 2),
+    ):
+        np.testing.assert_allclose(
+            get_derivative(
+                sliding_window_view(curve, 5),
+                sliding_window_view(TIMES, 5),
+            ),
+            expected,
+            atol=1e-8,
+        )
+
+
+def _get_least_squares_errors(times, log2_curve, regression_size):
+    errors = []
+    for x, y in zip(
+        sliding_window_view(times, regression_size),
+        sliding_window_view(log2_curve, regression_size),
+    ):
+        x = x - x.mean()
+        design = np.column_stack((x, np.ones_like(x)))
+        residuals = y - design @ np.linalg.lstsq(design, y, rcond=None)[0]
+        errors.append(np.sqrt(
+            (residuals @ residuals) / (regression_size - 2) / (x @ x),
+        ))
+    return errors
+
+
+@pytest.mark.parametrize('noise', (0, 1e-7))
+def test_derivative_errors_of_smooth_curves(noise):
+    times = np.linspace(0, 72, 500)
+    log2_curves = np.array([
+        get_chapman_richards_4parameter_extended_curve(times, *P0),
+        2 + 0.1 * times,
+    ]) + np.random.default_rng(0).normal(0, noise, (2, times.size))
+    _, errors = get_derivatives(np.power(2, log2_curves), times, 5)
+
+    np.testing.assert_allclose(
+        errors[0],
+        _get_least_squares_errors(times, log2_curves[0], 5),
+        rtol=1e-6,
+    )
+    if noise:
+        np.testing.assert_allclose(
+            errors[1],
+            _get_least_squares_errors(times, log2_curves[1], 5),
+            rtol=1e-6,
+        )
+    else:
+        np.testing.assert_allclose(errors[1], 0, atol=1e-12)
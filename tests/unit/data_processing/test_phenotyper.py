@@ -2,8 +2,10 @@ import itertools
 
 import numpy as np
 import pytest
+from scipy.ndimage import median_filter  # type: ignore
 
 from scanomatic.data_processing import phenotyper
+from scanomatic.data_processing.convolution import merge_convolve
 
 
 @pytest.fixture(scope='function')
@@ -107,3 +109,32 @@ class TestMarkingCurve:
         assert data.filter[1, 0] == 0
         assert np.ma.is_masked(data[1, 1])
         assert data.filter[1, 1] == phenotyper.Filter.BadData.value
+
+
+class TestSmoothing:
+
+    def test_median_gauss_same_as_per_curve(self):
+        rng = np.random.default_rng(0)
+        times = np.cumsum(rng.uniform(0.2, 0.5, 50))
+        plate = rng.uniform(100, 1000, (3, 4, times.size))
+        plate[0, 0, 5] = np.nan
+        plate[0, 1, 20:24] = np.nan
+        plate[2, 3] = np.nan
+        raw_growth_data = np.empty((1,), dtype=object)
+        raw_growth_data[0] = plate.copy()
+        pheno = phenotyper.Phenotyper(raw_growth_data, times)
+
+        pheno._smoothen()
+
+        expected = [
+            merge_convolve(
+                median_filter(curve, size=5, mode='reflect'),
+                times,
+                func_kwargs={'sigma': 1.5},
+            )
+            for curve in plate.reshape(-1, times.size)
+        ]
+        np.testing.assert_allclose(
+            pheno.smooth_growth_data[0],
+            np.reshape(expected, plate.shape),
+        )
@@ -0,0 +1,288 @@
+import numpy as np
+import pytest
+
+from scanomatic.image_analysis.analysis_image import (
+    ProjectImage,
+    _get_grayscale_image
+)
+from scanomatic.image_analysis.grid_array import (
+    GridArray,
+    _get_grid_to_im_axis_mapping
+)
+from scanomatic.io.first_pass_results import CompilationResults
+from scanomatic.io.jsonizer import dump
+from scanomatic.models.analysis_model import AnalysisModel
+from scanomatic.models.factories.analysis_factories import AnalysisModelFactory
+from scanomatic.models.factories.compile_project_factory import (
+    CompileImageAnalysisFactory,
+    CompileImageFactory
+)
+
+PINNING = (8, 12)
+CELL_SIZE = 24
+
+
+def _make_plate(seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    im = np.full((PINNING[1] * CELL_SIZE, PINNING[0] * CELL_SIZE), 200.)
+    yy, xx = np.mgrid[:im.shape[0], :im.shape[1]]
+    for centre in np.mgrid[
+        CELL_SIZE // 2:im.shape[0]:CELL_SIZE,
+        CELL_SIZE // 2:im.shape[1]:CELL_SIZE,
+    ].reshape(2, -1).T:
+        im[
+            (yy - centre[0]) ** 2 + (xx - centre[1]) ** 2
+            < rng.uniform(3, 8) ** 2
+        ] = rng.uniform(40, 120)
+    im += rng.normal(0, 3, im.shape)
+    return np.clip(im, 0, 255).astype(np.uint8)
+
+
+def _make_grid_array(im: np.ndarray, model: AnalysisModel) -> GridArray:
+    grid_array = GridArray(0, PINNING, model)
+    _set_grid(grid_array, im)
+    return grid_array
+
+
+def _set_grid(grid_array: GridArray, im: np.ndarray) -> None:
+    grid_array._init_grid_cells(_get_grid_to_im_axis_mapping(PINNING, im))
+    grid_array._grid = (
+        np.mgrid[:im.shape[0] // CELL_SIZE, :im.shape[1] // CELL_SIZE]
+        * CELL_SIZE + CELL_SIZE / 2
+    )
+    grid_array._grid_cell_size = [CELL_SIZE, CELL_SIZE]
+    grid_array._set_grid_cell_corners()
+    grid_array._update_grid_cells()
+
+
+def _image_model(index: int):
+    return CompileImageAnalysisFactory.create(
+        image=CompileImageFactory.create(
+            index=index,
+            path=f"image_{index}.tiff",
+            time_stamp=float(index),
+        ),
+    )
+
+
+def _get_values(grid_array: GridArray) -> dict:
+    return {
+        (cell_features.index, compartment): repr(compartment_features.data)
+        for cell_features in grid_array.features.data
+        for compartment, compartment_features in cell_features.data.items()
+    }
+
+
+@pytest.fixture
+def compilation_results(tmp_path) -> CompilationResults:
+    path = str(tmp_path / "test.project.compilation")
+    dump([_image_model(index) for index in range(2)], path)
+    return CompilationResults(
+        path,
+        scanner_instructions_path=path + ".missing",
+    )
+
+
+def _make_project_image(
+    compilation_results: CompilationResults,
+    grid_images=(0,),
+    chain=True,
+) -> ProjectImage:
+    return ProjectImage(
+        AnalysisModelFactory.create(
+            output_directory="",
+            pinning_matrices=(PINNING,),
+            grid_images=grid_images,
+            chain=chain,
+        ),
+        compilation_results,
+    )
+
+
+def test_load_state_continues_analysis_history(
+    tmp_path,
+    compilation_results: CompilationResults,
+):
+    images = [_make_plate(seed) for seed in range(2)]
+    state_path = str(tmp_path / "analysis.state")
+    reference = _make_grid_array(
+        images[0],
+        AnalysisModelFactory.create(output_directory=""),
+    )
+    project_image = _make_project_image(compilation_results)
+    project_image._grid_arrays[0] = _make_grid_array(
+        images[0],
+        project_image._analysis_model,
+    )
+
+    reference.analyse(images[0], _image_model(0))
+    project_image[0].analyse(images[0], _image_model(0))
+    project_image.save_state(state_path, {0})
+
+    resumed = _make_project_image(compilation_results)
+    assert resumed.load_state(state_path) == ({0}, True)
+    assert resumed[0].has_grid
+    assert resumed[0]._analysis_model is resumed._analysis_model
+    assert resumed.features.data[0] is resumed[0].features
+
+    reference.analyse(images[1], _image_model(1))
+    resumed[0].analyse(images[1], _image_model(1))
+    assert _get_values(resumed[0]) == _get_values(reference)
+
+
+@pytest.mark.parametrize('grid_images', (None, (2,)))
+def test_load_state_ignores_grids_before_gridding_image(
+    tmp_path,
+    compilation_results: CompilationResults,
+    grid_images,
+):
+    state_path = str(tmp_path / "analysis.state")
+    project_image = _make_project_image(
+        compilation_results,
+        grid_images,
+        False,
+    )
+    assert not project_image.is_gridding_image_compiled()
+    project_image._grid_arrays[0] = _make_grid_array(
+        _make_plate(0),
+        project_image._analysis_model,
+    )
+    project_image.save_state(state_path, {0})
+
+    resumed = _make_project_image(compilation_results, grid_images, False)
+    assert resumed.load_state(state_path) == ({0}, False)
+    assert not resumed[0].has_grid
+
+
+@pytest.mark.parametrize('grid_images', (None, (2,)))
+def test_final_analysis_ignores_state_before_gridding_image(
+    tmp_path,
+    compilation_results: CompilationResults,
+    grid_images,
+):
+    state_path = str(tmp_path / "analysis.state")
+    project_image = _make_project_image(
+        compilation_results,
+        grid_images,
+        False,
+    )
+    project_image._grid_arrays[0] = _make_grid_array(
+        _make_plate(0),
+        project_image._analysis_model,
+    )
+    project_image.save_state(state_path, {0})
+
+    final = _make_project_image(compilation_results, grid_images)
+    assert final.load_state(state_path) is None
+    assert not final[0].has_grid
+
+
+def test_load_state_without_state(
+    tmp_path,
+    compilation_results: CompilationResults,
+):
+    project_image = _make_project_image(compilation_results)
+    assert project_image.load_state(str(tmp_path / "missing")) is None
+    assert not project_image[0].has_grid
+
+
+def _fake_detect_grid(self, im, analysis_directory=None, grid_correction=None):
+    if self.index == 1:
+        raise ValueError("Bad plate")
+    _set_grid(self, im)
+    return True
+
+
+def test_detect_grids_one_at_a_time(
+    monkeypatch,
+    compilation_results: CompilationResults,
+):
+    monkeypatch.setattr(GridArray, "detect_grid", _fake_detect_grid)
+    im = _make_plate(0)
+    project_image = ProjectImage(
+        AnalysisModelFactory.create(
+            output_directory="",
+            pinning_matrices=(PINNING, PINNING, PINNING),
+        ),
+        compilation_results,
+    )
+
+    project_image._detect_grids({0: im, 1: im})
+
+    assert project_image._analysis_pool is None
+    assert project_image[0].has_grid
+    assert not project_image[1].has_grid
+    assert not project_image[2].has_grid
+
+
+def test_detect_grids_in_analysis_pool(
+    monkeypatch,
+    compilation_results: CompilationResults,
+):
+    monkeypatch.setattr(GridArray, "detect_grid", _fake_detect_grid)
+    project_image = ProjectImage(
+        AnalysisModelFactory.create(
+            output_directory="",
+            pinning_matrices=(PINNING, PINNING, PINNING),
+            plate_workers=2,
+        ),
+        compilation_results,
+    )
+    originals = [project_image[index] for index in range(3)]
+    pool = project_image._get_analysis_pool()
+    im = pool.share_image(np.stack([_make_plate(0), _make_plate(1)]))
+
+    try:
+        project_image._detect_grids({0: im[0], 1: im[1]})
+
+        assert pool.workers == 2
+        assert project_image[0] is not originals[0]
+        assert project_image[0].has_grid
+        assert (
+            project_image[0]._analysis_model is project_image._analysis_model
+        )
+        assert project_image.features.data[0] is project_image[0].features
+        assert pool.holds_grid_array(0)
+        assert project_image[1] is originals[1]
+        assert not project_image[1].has_grid
+        assert not pool.holds_grid_array(1)
+        assert project_image[2] is originals[2]
+    finally:
+        project_image.close()
+
+
+def test_write_grid_images(
+    tmp_path,
+    compilation_results: CompilationResults,
+):
+    im = _make_plate(0)
+    project_image = ProjectImage(
+        AnalysisModelFactory.create(
+            output_directory=str(tmp_path),
+            pinning_matrices=(PINNING, PINNING),
+        ),
+        compilation_results,
+    )
+    _set_grid(project_image[0], im)
+
+    project_image._write_grid_images({0: im, 1: im})
+
+    gridded = (tmp_path / "grid___origin_plate_1.svg").read_text()
+    assert gridded.count("<polyline") == sum(PINNING)
+    assert 'viewBox="0 0 288 192"' in gridded
+    assert "data:image/png;base64," in gridded
+    not_gridded = (tmp_path / "grid___origin_plate_2.svg").read_text()
+    assert "<polyline" not in not_gridded
+
+
+def test_grayscale_of_color_image():
+    rng = np.random.default_rng(0)
+    im = rng.integers(0, 256, (300, 20, 3), dtype=np.uint8)
+    im[0, 0] = 255
+    gray = _get_grayscale_image(im)
+    assert gray.dtype == np.uint16
+    np.testing.assert_allclose(
+        gray,
+        np.dot(im, [0.299, 0.587, 0.144]),
+        atol=0.52,
+    )
@@ -0,0 +1,120 @@
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from scanomatic.image_analysis.first_pass_image import (
+    FixtureImage,
+    get_marker_order
+)
+from scanomatic.models.factories.fixture_factories import FixtureFactory
+
+REFERENCE = np.array([
+    [300., 400.],
+    [2900., 450.],
+    [1600., 5200.],
+    [250., 3100.],
+    [2700., 4300.],
+])
+
+
+def _move(positions: np.ndarray, rotation: float = 0.02) -> np.ndarray:
+    cos, sin = np.cos(rotation), np.sin(rotation)
+    return positions @ np.array([[cos, sin], [-sin, cos]]) + (40, -25)
+
+
+@pytest.mark.parametrize("markers", (3, 5))
+def test_get_marker_order(markers: int):
+    reference = REFERENCE[:markers]
+    permutation = np.random.default_rng(0).permutation(markers)
+    positions = _move(reference)[permutation]
+
+    order, error = get_marker_order(positions, reference)
+
+    np.testing.assert_array_equal(permutation[order], np.arange(markers))
+    assert error == pytest.approx(0, abs=1e-6)
+
+
+def test_get_marker_order_skips_surplus_markers():
+    positions = np.vstack((
+        [[1500., 2000.], [3000., 5000.]],
+        _move(REFERENCE),
+    ))
+
+    order, error = get_marker_order(positions, REFERENCE)
+
+    np.testing.assert_array_equal(order, np.arange(5) + 2)
+    assert error == pytest.approx(0, abs=1e-6)
+
+
+def test_get_marker_order_matches_best_permutation():
+    rng = np.random.default_rng(1)
+    positions = _move(REFERENCE[:4]) + rng.normal(0, 30, (4, 2))
+    order, error = get_marker_order(positions, REFERENCE[:4])
+
+    def get_error(permutation):
+        return np.sqrt(np.mean(np.square(
+            np.linalg.norm(
+                positions[list(permutation)][:, None]
+                - positions[list(permutation)][None],
+                axis=-1,
+            ) - np.linalg.norm(
+                REFERENCE[:4, None] - REFERENCE[None, :4],
+                axis=-1,
+            ),
+        )) * 16 / 12)
+
+    best = min(itertools.permutations(range(4)), key=get_error)
+    np.testing.assert_array_equal(order, best)
+    assert error == pytest.approx(get_error(best))
+
+
+def _fixture_settings(positions: np.ndarray) -> SimpleNamespace:
+    return SimpleNamespace(model=FixtureFactory.create(
+        orientation_marks_x=positions[:, 0],
+        orientation_marks_y=positions[:, 1],
+    ))
+
+
+def test_set_current_mark_order(monkeypatch):
+    fixture_image = FixtureImage()
+    positions = _move(REFERENCE)[[4, 1, 0, 3, 2]]
+    monkeypatch.setattr(
+        fixture_image,
+        "_reference_fixture_settings",
+        _fixture_settings(REFERENCE),
+    )
+    monkeypatch.setattr(
+        fixture_image,
+        "_current_fixture_settings",
+        _fixture_settings(np.vstack((positions, [[10., 10.]]))),
+    )
+
+    assert fixture_image._set_current_mark_order() == pytest.approx(
+        0,
+        abs=1e-6,
+    )
+    current = fixture_image['current'].model
+    np.testing.assert_allclose(
+        np.column_stack((
+            current.orientation_marks_x,
+            current.orientation_marks_y,
+        )),
+        _move(REFERENCE),
+    )
+
+
+def test_set_current_mark_order_too_few_markers(monkeypatch):
+    fixture_image = FixtureImage()
+    monkeypatch.setattr(
+        fixture_image,
+        "_reference_fixture_settings",
+        _fixture_settings(REFERENCE),
+    )
+    monkeypatch.setattr(
+        fixture_image,
+        "_current_fixture_settings",
+        _fixture_settings(REFERENCE[:2]),
+    )
+    assert fixture_image._set_current_mark_order() is None
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.ndimage import gaussian_filter1d  # type: ignore
+from scipy.signal import convolve2d  # type: ignore
+
+from scanomatic.image_analysis import grayscale_detection
+from scanomatic.image_analysis.grayscale import Grayscale
+
+KODAK = Grayscale(
+    default=True,
+    width=55,
+    length=28.3,
+    lower_than_half_width=350,
+    higher_than_half_width=150,
+    min_width=30,
+    sections=23,
+    targets=[
+        0, 2, 4, 6, 10, 14, 18, 22, 26, 30, 34, 38, 42, 46, 50, 54, 58, 62,
+        66, 70, 74, 78, 82,
+    ],
+)
+STRIP_START = 73
+STRIP_COLUMN = 91
+
+
+@pytest.fixture(scope='module')
+def grayscale_image():
+    rng = np.random.default_rng(0)
+    im = rng.normal(210, 4, (800, 220))
+    im[STRIP_START - 10: STRIP_START + 660, STRIP_COLUMN - 5:] = 20
+    for segment, target in enumerate(KODAK.targets):
+        start = int(round(STRIP_START + segment * KODAK.length))
+        end = int(round(STRIP_START + (segment + 1) * KODAK.length))
+        im[start: end, STRIP_COLUMN: STRIP_COLUMN + 55] = (
+            240 - target * 2.7 + rng.normal(0, 2, (end - start, 55))
+        )
+    return im.clip(0, 255).round()
+
+
+def test_ortho_trimmed_slice_is_centered_on_best_convolution(
+    grayscale_image,
+):
+    im_scaled = grayscale_image / grayscale_image.max() - 0.5
+    kernel = np.array(KODAK.targets).repeat(int(KODAK.length))
+    kernel = kernel.reshape((kernel.size, 1))
+    detection = np.abs(convolve2d(
+        im_scaled,
+        kernel / kernel.max() - 0.5,
+        mode="valid",
+    ))
+    peak = gaussian_filter1d(
+        np.max(detection, axis=0),
+        KODAK.width / 2,
+    ).argmax()
+
+    trimmed = grayscale_detection.get_ortho_trimmed_slice(
+        grayscale_image,
+        KODAK,
+    )
+
+    np.testing.assert_array_equal(
+        trimmed,
+        grayscale_image[
+            :,
+            int(round(peak - KODAK.width / 2)):
+            int(round(peak + KODAK.width / 2)),
+        ],
+    )
+
+
+def test_ortho_trimmed_slice_too_short_image():
+    assert grayscale_detection.get_ortho_trimmed_slice(
+        np.ones((100, 80)),
+        KODAK,
+    ).size == 0
+
+
+def test_local_variances_match_window_variances(grayscale_image):
+    np.testing.assert_allclose(
+        grayscale_detection._get_local_variances(grayscale_image, (16, 33)),
+        np.var(sliding_window_view(grayscale_image, (16, 33)), axis=(-1, -2)),
+        atol=1e-8,
+    )
+
+
+def test_detect_grayscale(grayscale_image):
+    values = grayscale_detection.detect_grayscale(grayscale_image, KODAK)
+
+    np.testing.assert_allclose(
+        values,
+        [240 - target * 2.7 for target in KODAK.targets][::-1],
+        atol=1,
+    )
@@ -7,6 +7,7 @@ import pytest
 from numpy import ndarray
 
 from scanomatic.image_analysis import grid_array as grid_array_module
+from scanomatic.models.analysis_model import COMPARTMENTS
 from scanomatic.models.factories.analysis_factories import AnalysisModelFactory
 
 MockedGridCell = namedtuple('GridCell', ['xy1', 'xy2'])
@@ -141,3 +142,94 @@ class TestGridDetection():
         field would have gotten a value.
         """
         assert bad_grid_array._grid_cell_size is None
+
+
+def test_get_calibration_lookup_only_for_8bit_images():
+    assert grid_array_module._get_calibration_lookup(
+        np.zeros((2, 2)),
+        None,
+    ) is None
+    np.testing.assert_array_equal(
+        grid_array_module._get_calibration_lookup(
+            np.zeros((2, 2), dtype=np.uint8),
+            None,
+        ),
+        np.arange(256),
+    )
+
+
+def test_calibration_lookup_gives_same_analysis_as_polynomial():
+    transpose_polynomial = np.poly1d([1e-5, -3e-3, 0.9, 4])
+    coeffs = AnalysisModelFactory.create().cell_count_calibration
+    rng = np.random.default_rng(0)
+    grid_cells = [
+        grid_array_module.GridCell([[0, 0], (0, 0)], coeffs)
+        for _ in range(2)
+    ]
+    for grid_cell in grid_cells:
+        grid_cell.xy1 = [0, 0]
+        grid_cell.xy2 = [30, 30]
+
+    yy, xx = np.mgrid[:30, :30]
+    for index, radius in enumerate((5, 6, 8)):
+        im = np.full((30, 30), 200.)
+        im[(yy - 15) ** 2 + (xx - 15) ** 2 < radius ** 2] = 80
+        im = np.clip(im + rng.normal(0, 3, im.shape), 0, 255).astype(np.uint8)
+        for grid_cell, image, lookup in (
+            (grid_cells[0], im, None),
+            (
+                grid_cells[1],
+                im,
+                grid_array_module._get_calibration_lookup(
+                    im,
+                    transpose_polynomial,
+                ),
+            ),
+        ):
+            grid_array_module._analyse_grid_cell(
+                grid_cell,
+                image,
+                transpose_polynomial,
+                index,
+                calibration_lookup=lookup,
+            )
+
+        assert grid_cells[1].features.data
+        for compartment, features in grid_cells[0].features.data.items():
+            assert features.data
+            assert repr(features.data) == repr(
+                grid_cells[1].features.data[compartment].data,
+            )
+
+
+def test_analyse_grid_cell_reuses_buffers():
+    grid_cell = grid_array_module.GridCell(
+        [[0, 0], (0, 0)],
+        AnalysisModelFactory.create().cell_count_calibration,
+    )
+    grid_cell.xy1 = [0, 0]
+    grid_cell.xy2 = [30, 30]
+    yy, xx = np.mgrid[:30, :30]
+    im = np.full((30, 30), 200, dtype=np.uint8)
+    im[(yy - 15) ** 2 + (xx - 15) ** 2 < 36] = 80
+    lookup = grid_array_module._get_calibration_lookup(im, None)
+
+    buffers = []
+    for index in range(3):
+        grid_array_module._analyse_grid_cell(
+            grid_cell,
+            im,
+            None,
+            index,
+            calibration_lookup=lookup,
+        )
+        blob = grid_cell.get_item(COMPARTMENTS.Blob)
+        buffers.append((
+            id(grid_cell.source),
+            id(blob.filter_array),
+            id(blob.trash_array),
+            id(blob.old_filter),
+        ))
+        assert not np.shares_memory(grid_cell.source, im)
+
+    assert buffers[1] == buffers[2]
@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+from scipy.ndimage import median_filter  # type: ignore
+from skimage.filters import threshold_otsu  # type: ignore
+
+from scanomatic.image_analysis.grid_array import (
+    GridArray,
+    _get_grid_to_im_axis_mapping
+)
+from scanomatic.image_analysis.grid_cell_batch import (
+    get_median_filtered,
+    get_otsu_thresholds
+)
+from scanomatic.models.analysis_model import MEASURES
+from scanomatic.models.factories.analysis_factories import AnalysisModelFactory
+from scanomatic.models.factories.compile_project_factory import (
+    CompileImageAnalysisFactory,
+    CompileImageFactory
+)
+
+PINNING = (8, 12)
+CELL_SIZE = 24
+
+
+def _make_plate(seed: int, growth: float) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    rows, cols = PINNING
+    im = np.full((cols * CELL_SIZE, rows * CELL_SIZE), 200, dtype=float)
+    yy, xx = np.mgrid[:im.shape[0], :im.shape[1]]
+    radii = np.random.default_rng(0).uniform(0, 7, (cols, rows))
+    for row in range(cols):
+        for col in range(rows):
+            centre = (
+                (row + 0.5) * CELL_SIZE + rng.normal(0, 0.5),
+                (col + 0.5) * CELL_SIZE + rng.normal(0, 0.5),
+            )
+            im[
+                (yy - centre[0]) ** 2 + (xx - centre[1]) ** 2
+                < (radii[row, col] * growth) ** 2
+            ] = 120 - 20 * growth
+    im += rng.normal(0, 3, im.shape)
+    return np.clip(im, 0, 255).astype(np.uint8)
+
+
+def _make_grid_array(im: np.ndarray, batch_analysis: bool) -> GridArray:
+    grid_array = GridArray(
+        0,
+        PINNING,
+        AnalysisModelFactory.create(
+            output_directory="",
+            batch_analysis=batch_analysis,
+        ),
+    )
+    grid_array._init_grid_cells(_get_grid_to_im_axis_mapping(PINNING, im))
+    grid_array._grid = (
+        np.mgrid[:im.shape[0] // CELL_SIZE, :im.shape[1] // CELL_SIZE]
+        * CELL_SIZE + CELL_SIZE / 2
+    )
+    # Offset the grid to have tiles cut by the image edges
+    grid_array._grid[0] += 3
+    grid_array._grid_cell_size = [CELL_SIZE, CELL_SIZE]
+    grid_array._set_grid_cell_corners()
+    grid_array._update_grid_cells()
+    return grid_array
+
+
+def _image_model(index: int):
+    return CompileImageAnalysisFactory.create(
+        image=CompileImageFactory.create(
+            index=index,
+            path="image.tiff",
+            time_stamp=float(index),
+        ),
+    )
+
+
+def _get_values(grid_array: GridArray) -> dict:
+    return {
+        (cell_features.index, compartment): compartment_features.data
+        for cell_features in grid_array.features.data
+        for compartment, compartment_features in cell_features.data.items()
+    }
+
+
+def test_batch_analysis_matches_per_grid_cell_analysis():
+    im = _make_plate(0, 1)
+    per_grid_cell = _make_grid_array(im, False)
+    batch = _make_grid_array(im, True)
+
+    for index, growth in enumerate((1, 1.2, 1.5, 1.5)):
+        im = _make_plate(index, growth)
+        per_grid_cell.analyse(im, _image_model(index))
+        batch.analyse(im, _image_model(index))
+
+        expected = _get_values(per_grid_cell)
+        values = _get_values(batch)
+        assert values.keys() == expected.keys()
+        assert any(expected.values())
+        for key, expected_features in expected.items():
+            assert values[key].keys() == expected_features.keys(), key
+            for measure, value in expected_features.items():
+                if measure is MEASURES.Perimeter:
+                    assert values[key][measure] is None
+                else:
+                    np.testing.assert_allclose(
+                        values[key][measure],
+                        value,
+                        rtol=1e-9,
+                        atol=1e-9,
+                    )
+
+
+@pytest.mark.parametrize("shape", ((4, 24, 24), (3, 1, 5), (2, 13, 7)))
+def test_get_median_filtered(shape: tuple[int, int, int]):
+    stack = np.random.default_rng(0).integers(0, 9, shape).astype(float)
+    np.testing.assert_array_equal(
+        get_median_filtered(stack),
+        median_filter(stack, size=(1, 3, 3), mode="nearest"),
+    )
+
+
+def test_get_otsu_thresholds():
+    rng = np.random.default_rng(0)
+    stack = np.concatenate((
+        rng.normal(100, 30, (5, 24, 24)),
+        np.full((1, 24, 24), 7.0),
+        rng.integers(0, 3, (2, 24, 24)),
+    ))
+    stack[-1, 0, 0] = np.inf
+    thresholds, valid = get_otsu_thresholds(stack)
+    np.testing.assert_array_equal(
+        valid,
+        [True, True, True, True, True, True, True, False],
+    )
+    np.testing.assert_array_equal(
+        thresholds[:-1],
+        [threshold_otsu(tile) for tile in stack[:-1]],
+    )
@@ -0,0 +1,143 @@
+from typing import Optional
+
+import numpy as np
+import pytest
+from PIL import Image, TiffImagePlugin
+
+from scanomatic.image_analysis import image_basics
+from scanomatic.models.analysis_model import IMAGE_ROTATIONS
+
+
+@pytest.fixture
+def image_16bit() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 2 ** 16, (40, 30), dtype=np.uint16)
+
+
+@pytest.fixture
+def image_path(tmp_path, image_16bit) -> str:
+    path = str(tmp_path / "scan.tiff")
+    Image.fromarray(image_16bit).save(path)
+    return path
+
+
+def test_8bit_from_16bit_is_rounded_scaling():
+    data = np.arange(2 ** 16, dtype=np.uint16).reshape(256, 256)
+    np.testing.assert_array_equal(
+        image_basics.get_8bit_from_16bit(data),
+        image_basics.round_to_8bit(
+            image_basics.scale_16bit_to_8bit_range(data),
+        ),
+    )
+
+
+@pytest.mark.parametrize("orientation,transpose", (
+    (IMAGE_ROTATIONS.Portrait, False),
+    (IMAGE_ROTATIONS.Landscape, True),
+))
+def test_load_image_to_8bit(
+    image_path: str,
+    image_16bit: np.ndarray,
+    orientation: IMAGE_ROTATIONS,
+    transpose: bool,
+):
+    im = image_basics.load_image_to_numpy(
+        image_path,
+        orientation,
+        dtype=np.uint8,
+    )
+    expected = image_basics.round_to_8bit(
+        image_basics.scale_16bit_to_8bit_range(image_16bit),
+    )
+    np.testing.assert_array_equal(im, expected.T if transpose else expected)
+
+
+@pytest.mark.parametrize("orientation", (
+    IMAGE_ROTATIONS.Portrait,
+    IMAGE_ROTATIONS.Landscape,
+))
+def test_load_image_regions(image_path: str, orientation: IMAGE_ROTATIONS):
+    regions = [
+        (slice(2, 10), slice(5, 20)),
+        (slice(15, None), slice(0, 4)),
+    ]
+    full = image_basics.load_image_to_numpy(
+        image_path,
+        orientation,
+        dtype=np.uint8,
+    )
+    expected = np.zeros_like(full)
+    for region in regions:
+        expected[region] = full[region]
+
+    np.testing.assert_array_equal(
+        image_basics.load_image_to_numpy(
+            image_path,
+            orientation,
+            dtype=np.uint8,
+            regions=regions,
+        ),
+        expected,
+    )
+
+
+def test_load_image_without_valid_regions_loads_all(image_path: str):
+    np.testing.assert_array_equal(
+        image_basics.load_image_to_numpy(
+            image_path,
+            dtype=np.uint8,
+            regions=[(slice(5, 5), slice(0, 10))],
+        ),
+        image_basics.load_image_to_numpy(image_path, dtype=np.uint8),
+    )
+
+
+@pytest.mark.parametrize("compression,strips", (
+    (None, 1),
+    (None, 3),
+    ("tiff_lzw", 1),
+))
+def test_read_box_of_tiff(
+    tmp_path,
+    monkeypatch,
+    compression: Optional[str],
+    strips: int,
+):
+    # The libtiff writer splits images in strips of about 64 kB
+    monkeypatch.setattr(TiffImagePlugin, "WRITE_LIBTIFF", strips > 1)
+    im = np.arange(400 * 200, dtype=np.uint16).reshape(400, 200)
+    path = str(tmp_path / "scan.tiff")
+    Image.fromarray(im).save(path, compression=compression)
+    with Image.open(path) as image:
+        assert len(image.tile) == strips  # type: ignore
+        np.testing.assert_array_equal(
+            image_basics._read_box(image, path, (5, 150, 25, 333)),
+            im[150:333, 5:25],
+        )
+
+
+def test_uncompressed_tiff_regions_are_read_without_decoding(
+    image_path: str,
+    image_16bit: np.ndarray,
+    monkeypatch,
+):
+    def fail(*args, **kwargs):
+        raise AssertionError("Image should not be decoded")
+
+    monkeypatch.setattr(Image.Image, "load", fail)
+    with Image.open(image_path) as im:
+        np.testing.assert_array_equal(
+            image_basics._read_uncompressed_box(im, image_path, (3, 4, 9, 30)),
+            image_16bit[4:30, 3:9],
+        )
+
+
+def test_compressed_tiff_is_not_read_directly(tmp_path, image_16bit):
+    path = str(tmp_path / "scan.tiff")
+    Image.fromarray(image_16bit).save(path, compression="tiff_lzw")
+    with Image.open(path) as im:
+        assert image_basics._read_uncompressed_box(
+            im,
+            path,
+            (0, 0, 10, 10),
+        ) is None
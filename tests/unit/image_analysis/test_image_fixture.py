@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from scipy.signal import fftconvolve  # type: ignore
+
+from scanomatic.image_analysis import image_fixture
+from scanomatic.image_analysis.image_fixture import FixtureImage, convolve_same
+
+MARKER_POSITIONS = [(60, 50), (260, 330), (150, 200)]
+
+
+@pytest.fixture(scope='module')
+def marker():
+    marker = np.zeros((40, 40), dtype=np.uint8)
+    marker[5:35, 5:35] = 255
+    marker[12:28, 12:28] = 0
+    marker[17:23, 17:23] = 255
+    return marker
+
+
+@pytest.fixture(scope='module')
+def marker_image(marker):
+    rng = np.random.default_rng(42)
+    im = rng.normal(60, 30, (320, 400)).clip(0, 255)
+    for _ in range(10):
+        row, col = rng.integers(0, 290), rng.integers(0, 370)
+        im[row: row + rng.integers(5, 30), col: col + rng.integers(5, 30)] = 230
+    for row, col in MARKER_POSITIONS:
+        im[row - 20: row + 20, col - 20: col + 20] = marker
+    return im.astype(np.uint8)
+
+
+def test_convolve_same_is_fftconvolve_same():
+    rng = np.random.default_rng(0)
+    image = rng.normal(size=(31, 24))
+    for kernel_shape in ((5, 8), (6, 3)):
+        kernel = rng.normal(size=kernel_shape)
+        np.testing.assert_allclose(
+            convolve_same(image, kernel),
+            fftconvolve(image, kernel, mode='same'),
+            atol=1e-10,
+        )
+
+
+def test_convolve_same_caches_kernel_transform():
+    image_fixture._kernel_cache.clear()
+    kernel = np.ones((3, 3))
+    convolve_same(np.zeros((10, 10)), kernel)
+    convolve_same(np.ones((10, 10)), kernel)
+    assert len(image_fixture._kernel_cache) == 1
+
+
+@pytest.mark.parametrize('downscale', (1, 4))
+def test_find_pattern(marker, marker_image, downscale):
+    fixture_image = FixtureImage(marker_image, marker, 1.0)
+    cols, rows = fixture_image.find_pattern(3, downscale=downscale)
+    np.testing.assert_allclose(
+        sorted(zip(rows, cols)),
+        sorted(MARKER_POSITIONS),
+        atol=1,
+    )
+
+
+def test_coarse_search_finds_same_markers_as_full_search(
+    marker,
+    marker_image,
+):
+    fixture_image = FixtureImage(marker_image, marker, 1.0)
+    full = fixture_image.find_pattern(3, downscale=1)
+    coarse = fixture_image.find_pattern(3, downscale=4)
+    np.testing.assert_allclose(
+        sorted(zip(*full)),
+        sorted(zip(*coarse)),
+        atol=0.01,
+    )
@@ -0,0 +1,87 @@
+from threading import Event
+
+import numpy as np
+import pytest
+
+from scanomatic.image_analysis.image_prefetch import ImagePrefetcher
+
+
+class Loader:
+    def __init__(self, size: int = 100):
+        self.size = size
+        self.loaded: list[str] = []
+
+    def __call__(self, path: str):
+        self.loaded.append(path)
+        if path == "broken":
+            return None
+        return np.full((self.size,), len(self.loaded), dtype=np.uint8)
+
+
+@pytest.fixture
+def loader():
+    return Loader()
+
+
+def test_get_returns_none_if_not_prefetched(loader: Loader):
+    prefetcher = ImagePrefetcher(loader, 2, 1000)
+    assert prefetcher.get("a") is None
+    prefetcher.close()
+    assert loader.loaded == []
+
+
+def test_prefetch_loads_upcoming_images(loader: Loader):
+    prefetcher = ImagePrefetcher(loader, 2, 1000)
+    prefetcher.prefetch(["a", "b", "c"])
+    assert prefetcher.get("a") is not None
+    prefetcher.prefetch(["b", "c"])
+    assert prefetcher.get("b") is not None
+    assert prefetcher.get("c") is not None
+    assert prefetcher.get("c") is None
+    prefetcher.close()
+    assert loader.loaded == ["a", "b", "c"]
+
+
+def test_prefetch_only_loads_one_until_image_size_known(loader: Loader):
+    prefetcher = ImagePrefetcher(loader, 3, 1000)
+    prefetcher.prefetch(["a", "b", "c"])
+    prefetcher.get("a")
+    assert loader.loaded == ["a"]
+    prefetcher.prefetch(["b", "c", "d"])
+    assert all(prefetcher.get(path) is not None for path in "bcd")
+    prefetcher.close()
+    assert loader.loaded == ["a", "b", "c", "d"]
+
+
+def test_prefetch_respects_memory_limit(loader: Loader):
+    prefetcher = ImagePrefetcher(loader, 5, 250)
+    prefetcher.prefetch(["a"])
+    prefetcher.get("a")
+    prefetcher.prefetch(["b", "c", "d", "e"])
+    assert [prefetcher.get(path) is not None for path in "bcde"] == [
+        True, True, False, False,
+    ]
+    prefetcher.close()
+    assert loader.loaded == ["a", "b", "c"]
+
+
+def test_prefetch_drops_images_no_longer_upcoming():
+    release = Event()
+
+    def blocking_loader(path: str):
+        release.wait()
+        return np.zeros((1,))
+
+    prefetcher = ImagePrefetcher(blocking_loader, 1, 1000)
+    prefetcher.prefetch(["a"])
+    prefetcher.prefetch(["b"])
+    release.set()
+    assert prefetcher.get("a") is None
+    prefetcher.close()
+
+
+def test_failed_image_gives_none(loader: Loader):
+    prefetcher = ImagePrefetcher(loader, 1, 1000)
+    prefetcher.prefetch(["broken"])
+    assert prefetcher.get("broken") is None
+    prefetcher.close()
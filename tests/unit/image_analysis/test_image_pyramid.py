@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from scanomatic.image_analysis import image_basics, image_pyramid
+from scanomatic.image_analysis.image_pyramid import ImagePyramid
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    image_pyramid.clear_cache()
+    yield
+    image_pyramid.clear_cache()
+
+
+@pytest.fixture
+def image_path(tmp_path) -> str:
+    path = str(tmp_path / "scan.tiff")
+    Image.fromarray(
+        np.arange(64 * 48, dtype=np.uint8).reshape(64, 48),
+    ).save(path)
+    return path
+
+
+def test_halve_integer_image():
+    im = np.array([
+        [0, 1, 10, 10, 7],
+        [1, 1, 10, 11, 7],
+        [5, 5, 5, 5, 7],
+    ], dtype=np.uint8)
+    halved = image_pyramid.halve(im)
+    assert halved.dtype == np.uint8
+    np.testing.assert_array_equal(halved, [[1, 10]])
+
+
+def test_halve_does_not_overflow():
+    halved = image_pyramid.halve(np.full((2, 2), 255, dtype=np.uint8))
+    np.testing.assert_array_equal(halved, [[255]])
+
+
+def test_halve_float_image():
+    im = np.array([[0, 1], [1, 1]], dtype=float)
+    np.testing.assert_allclose(image_pyramid.halve(im), [[0.75]])
+
+
+@pytest.mark.parametrize("scale,expected", (
+    (1, 0),
+    (0.5, 1),
+    (0.25, 2),
+    (1 / 16, 4),
+    (1 / 32, None),
+    (0.3, None),
+    (2, None),
+    (0, None),
+))
+def test_get_downscale_level(scale, expected):
+    assert image_pyramid.get_downscale_level(scale) == expected
+
+
+def test_pyramid_levels():
+    pyramid = ImagePyramid(np.zeros((100, 60), dtype=np.uint8), levels=3)
+    assert pyramid.shape == (100, 60)
+    assert [pyramid.get_level(level).shape for level in (1, 2, 3)] == [
+        (50, 30),
+        (25, 15),
+        (12, 7),
+    ]
+    with pytest.raises(ValueError):
+        pyramid.get_level(4)
+
+
+def test_scaling_by_power_of_two_uses_cached_pyramid(
+    image_path: str,
+    monkeypatch,
+):
+    im = image_basics.Quick_Scale_To_im(path=image_path, scale=0.25)
+    assert im.shape == (16, 12)
+    assert image_pyramid.get_cached_pyramid(image_path) is not None
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Image should not be loaded again")
+
+    monkeypatch.setattr(image_basics, "load_image_to_numpy", fail)
+    np.testing.assert_array_equal(
+        image_basics.Quick_Scale_To_im(path=image_path, scale=0.25),
+        im,
+    )
+    assert image_basics.Quick_Scale_To_im(
+        path=image_path,
+        scale=0.5,
+    ).shape == (32, 24)
+
+
+def test_cached_pyramid_is_only_used_for_its_image(image_path: str):
+    im = image_basics.load_image_to_numpy(image_path, dtype=np.uint8)
+    image_basics.Quick_Scale_To_im(path=image_path, im=im, scale=0.5)
+    assert image_pyramid.get_cached_pyramid(image_path, im) is not None
+
+    other = np.zeros_like(im)
+    np.testing.assert_array_equal(
+        image_basics.Quick_Scale_To_im(path=image_path, im=other, scale=0.5),
+        np.zeros((32, 24)),
+    )
+    assert image_pyramid.get_cached_pyramid(image_path, im) is None
+
+
+@pytest.mark.parametrize("scale", (0.5, 0.25, 1 / 16))
+def test_scale_offset_locates_scaled_pixels(scale: float):
+    block = int(1 / scale)
+    im = np.zeros((64, 64), dtype=np.uint8)
+    im[2 * block: 3 * block, block: 2 * block] = 255
+    scaled = image_basics.Quick_Scale_To_im(im=im, scale=scale)
+
+    position = np.array(np.unravel_index(scaled.argmax(), scaled.shape))
+    np.testing.assert_allclose(
+        position / scale + image_basics.get_scale_offset(scale),
+        [2.5 * block - 0.5, 1.5 * block - 0.5],
+    )
+
+
+def test_interpolated_scales_have_no_offset():
+    assert image_basics.get_scale_offset(0.3) == 0
+    assert image_basics.get_scale_offset(1) == 0
+
+
+def test_changed_image_is_not_taken_from_cache(image_path: str):
+    image_basics.Quick_Scale_To_im(path=image_path, scale=0.5)
+    Image.fromarray(np.zeros((32, 32), dtype=np.uint8)).save(image_path)
+    assert image_basics.Quick_Scale_To_im(
+        path=image_path,
+        scale=0.5,
+    ).shape == (16, 16)
+
+
+def test_other_scales_are_interpolated():
+    im = image_basics.Quick_Scale_To_im(
+        im=np.zeros((30, 30), dtype=np.uint8),
+        scale=0.3,
+    )
+    assert im.shape == (9, 9)
@@ -0,0 +1,223 @@
+import time
+
+import numpy as np
+import pytest
+
+from scanomatic.image_analysis.grid_array import (
+    GridArray,
+    _get_grid_to_im_axis_mapping
+)
+from scanomatic.image_analysis.plate_analysis_pool import (
+    PlateAnalysisError,
+    PlateAnalysisPool
+)
+from scanomatic.models.factories.analysis_factories import AnalysisModelFactory
+from scanomatic.models.factories.compile_project_factory import (
+    CompileImageAnalysisFactory,
+    CompileImageFactory
+)
+
+PINNING = (8, 12)
+CELL_SIZE = 24
+
+
+def _make_plate(seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    rows, cols = PINNING
+    im = np.full((cols * CELL_SIZE, rows * CELL_SIZE), 200, dtype=float)
+    yy, xx = np.mgrid[:im.shape[0], :im.shape[1]]
+    for row in range(cols):
+        for col in range(rows):
+            centre = (
+                (row + 0.5) * CELL_SIZE,
+                (col + 0.5) * CELL_SIZE,
+            )
+            radius = rng.uniform(3, 8)
+            im[
+                (yy - centre[0]) ** 2 + (xx - centre[1]) ** 2 < radius ** 2
+            ] = rng.uniform(40, 120)
+    im += rng.normal(0, 3, im.shape)
+    return np.clip(im, 0, 255).astype(np.uint8)
+
+
+def _make_grid_array(index: int, im: np.ndarray) -> GridArray:
+    grid_array = GridArray(
+        index,
+        PINNING,
+        AnalysisModelFactory.create(output_directory=""),
+    )
+    _set_grid(grid_array, im)
+    return grid_array
+
+
+def _set_grid(grid_array: GridArray, im: np.ndarray) -> None:
+    grid_array._init_grid_cells(_get_grid_to_im_axis_mapping(PINNING, im))
+    grid_array._grid = (
+        np.mgrid[:im.shape[0] // CELL_SIZE, :im.shape[1] // CELL_SIZE]
+        * CELL_SIZE + CELL_SIZE / 2
+    )
+    grid_array._grid_cell_size = [CELL_SIZE, CELL_SIZE]
+    grid_array._set_grid_cell_corners()
+    grid_array._update_grid_cells()
+
+
+def _get_values(grid_array: GridArray) -> dict:
+    return {
+        cell_features.index: {
+            compartment: repr(compartment_features.data)
+            for compartment, compartment_features in cell_features.data.items()
+        }
+        for cell_features in grid_array.features.data
+    }
+
+
+def _image_model(index: int):
+    return CompileImageAnalysisFactory.create(
+        image=CompileImageFactory.create(
+            index=index,
+            path="image.tiff",
+            time_stamp=float(index),
+        ),
+    )
+
+
+@pytest.fixture
+def pool():
+    pool = PlateAnalysisPool(2)
+    yield pool
+    pool.close()
+
+
+def test_pooled_analysis_matches_serial_analysis(pool: PlateAnalysisPool):
+    images = [
+        np.stack([_make_plate(3 * seed + plate) for plate in range(3)])
+        for seed in range(2)
+    ]
+    serial = [_make_grid_array(index, images[0][index]) for index in range(3)]
+    pooled = [_make_grid_array(index, images[0][index]) for index in range(3)]
+    for grid_array in pooled:
+        pool.set_grid_array(grid_array)
+
+    for image_index, im in enumerate(images):
+        for index, grid_array in enumerate(serial):
+            grid_array.analyse(im[index], _image_model(image_index))
+
+        shared = pool.share_image(im)
+        features = pool.analyse(
+            {index: shared[index, ::-1][::-1] for index in range(3)},
+            _image_model(image_index),
+        )
+        assert list(features) == [0, 1, 2]
+        for index, grid_array in enumerate(pooled):
+            grid_array.set_features(features[index])
+
+        for serial_array, pooled_array in zip(serial, pooled):
+            assert _get_values(serial_array) == _get_values(pooled_array)
+
+
+def test_get_grid_array_keeps_analysis_history(pool: PlateAnalysisPool):
+    images = [_make_plate(seed) for seed in range(2)]
+    serial = _make_grid_array(0, images[0])
+    pool.set_grid_array(_make_grid_array(0, images[0]))
+
+    serial.analyse(images[0], _image_model(0))
+    pool.analyse({0: pool.share_image(images[0])}, _image_model(0))
+    pooled = pool.get_grid_array(0)
+    assert pooled is not None
+
+    serial.analyse(images[1], _image_model(1))
+    pooled.analyse(images[1], _image_model(1))
+    assert _get_values(serial) == _get_values(pooled)
+
+
+def test_get_grid_array_of_unknown_plate(pool: PlateAnalysisPool):
+    assert pool.get_grid_array(3) is None
+
+
+def test_analysis_requires_shared_sections(pool: PlateAnalysisPool):
+    im = _make_plate(0)
+    pool.set_grid_array(_make_grid_array(0, im))
+    pool.share_image(im)
+    with pytest.raises(PlateAnalysisError):
+        pool.analyse({0: im}, _image_model(0))
+
+
+def test_analysis_reports_worker_errors(pool: PlateAnalysisPool):
+    shared = pool.share_image(_make_plate(0))
+    with pytest.raises(PlateAnalysisError):
+        pool.analyse({0: shared}, _image_model(0))
+
+
+def test_clear_features_clears_adopted_features(pool: PlateAnalysisPool):
+    im = _make_plate(0)
+    pool.set_grid_array(_make_grid_array(0, im))
+    features = pool.analyse({0: pool.share_image(im)}, _image_model(0))
+    grid_array = _make_grid_array(0, im)
+    grid_array.set_features(features[0])
+    assert any(
+        compartment_features.data
+        for cell_features in grid_array.features.data
+        for compartment_features in cell_features.data.values()
+    )
+    grid_array.clear_features()
+    assert not any(
+        compartment_features.data
+        for cell_features in grid_array.features.data
+        for compartment_features in cell_features.data.values()
+    )
+
+
+def _fake_detect_grid(self, im, analysis_directory=None, grid_correction=None):
+    if self.index == 1:
+        time.sleep(60)
+    elif self.index == 2:
+        raise ValueError("Bad plate")
+    _set_grid(self, im)
+    return True
+
+
+def test_detect_grids_replaces_hung_workers(monkeypatch):
+    monkeypatch.setattr(GridArray, "detect_grid", _fake_detect_grid)
+    pool = PlateAnalysisPool(2)
+    try:
+        shared = pool.share_image(
+            np.stack([_make_plate(plate) for plate in range(3)]),
+        )
+        model = AnalysisModelFactory.create(output_directory="")
+        hung_worker = pool._processes[1]
+        gridded = pool.detect_grids(
+            {index: GridArray(index, PINNING, model) for index in range(3)},
+            {index: shared[index] for index in range(3)},
+            None,
+            1,
+        )
+
+        assert list(gridded) == [0]
+        assert not hung_worker.is_alive()
+        assert gridded[0].has_grid
+        assert pool.holds_grid_array(0)
+        assert not pool.holds_grid_array(1)
+        assert not pool.holds_grid_array(2)
+
+        pool.set_grid_array(_make_grid_array(1, shared[1]))
+        features = pool.analyse(
+            {index: shared[index] for index in (0, 1)},
+            _image_model(0),
+        )
+        assert list(features) == [0, 1]
+    finally:
+        pool.close()
+
+
+def _analyse_in_pool() -> list[int]:
+    im = _make_plate(0)
+    pool = PlateAnalysisPool(2)
+    try:
+        pool.set_grid_array(_make_grid_array(0, im))
+        return list(pool.analyse({0: pool.share_image(im)}, _image_model(0)))
+    finally:
+        pool.close()
+
+
+def test_pool_in_job_process(run_in_job_process):
+    assert run_in_job_process(_analyse_in_pool) == [0]
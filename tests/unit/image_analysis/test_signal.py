@@ -1,5 +1,6 @@
 import numpy as np
 from scanomatic.image_analysis import signal
+from scanomatic.image_analysis.grayscale import Grayscale
 
 
 class TestGetSignalEdges:
@@ -87,3 +88,44 @@ class TestGetSignalEdges:
 
         assert len(edges) == 24
         assert not np.isfinite(edges).any()
+
+
+class TestGetBestOffset:
+
+    def test_finds_offset_of_regular_spikes(self):
+        spikes = np.zeros((100,), dtype=bool)
+        spikes[3::10] = True
+        spikes[50] = True
+
+        assert signal.get_best_offset(9, spikes, frequency=10) == 3
+
+    def test_no_spikes_returns_none(self):
+        assert signal.get_best_offset(3, np.array([])) is None
+
+
+class TestGetSignalData:
+
+    def test_deltas_to_expected_spikes(self):
+        grayscale = Grayscale(
+            default=False,
+            width=10.0,
+            length=10.0,
+            lower_than_half_width=10.0,
+            higher_than_half_width=10.0,
+            min_width=5.0,
+            sections=2,
+            targets=[0, 10],
+        )
+        spikes = np.zeros((20,), dtype=bool)
+        spikes[[1, 9, 15, 19]] = True
+
+        deltas, observed, index_map = signal.get_signal_data(
+            np.zeros((20,)),
+            spikes,
+            grayscale,
+            delta_threshold=2,
+        )
+
+        np.testing.assert_array_equal(observed, [1, 9, 15, 19])
+        np.testing.assert_array_equal(index_map, [0, 1, 1, 2])
+        np.testing.assert_array_equal(deltas, [1, 1, np.nan, 1])
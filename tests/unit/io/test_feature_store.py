@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+import pytest
+
+from scanomatic.io.feature_store import FeatureStore
+from scanomatic.models.analysis_model import COMPARTMENTS, MEASURES
+from scanomatic.models.factories.analysis_factories import (
+    AnalysisFeaturesFactory
+)
+
+SHAPES = [(2, 3), None]
+
+
+def _get_features(image_index: int):
+    def cell(x: int, y: int):
+        value = 100 * image_index + 10 * y + x
+        return AnalysisFeaturesFactory.create(
+            index=(x, y),
+            data={
+                COMPARTMENTS.Blob: AnalysisFeaturesFactory.create(data={
+                    MEASURES.Sum: value,
+                    MEASURES.IQR: (value, value + 1),
+                    MEASURES.Perimeter: None,
+                }),
+                COMPARTMENTS.Background: AnalysisFeaturesFactory.create(data={
+                    MEASURES.Mean: -value,
+                }),
+            },
+        )
+
+    return AnalysisFeaturesFactory.create(
+        index=image_index,
+        shape=(2,),
+        data=(
+            AnalysisFeaturesFactory.create(
+                index=0,
+                shape=SHAPES[0],
+                data=[cell(x, y) for y in range(2) for x in range(3)],
+            ),
+            None,
+        ),
+    )
+
+
+def _write(store: FeatureStore, image_indices):
+    for image_index in image_indices:
+        store.write(image_index, image_index / 2, _get_features(image_index))
+
+
+@pytest.mark.parametrize("compressed", (False, True))
+def test_write_and_read(tmp_path, compressed: bool):
+    directory = str(tmp_path)
+    store = FeatureStore.create(directory, SHAPES, 2, compressed)
+    _write(store, range(3))
+    store.flush()
+
+    loaded = FeatureStore.load(directory)
+    assert loaded is not None
+    assert loaded.columns == ["Background_Mean", "Blob_IQR", "Blob_Sum"]
+    np.testing.assert_allclose(loaded.times, [0, 0.5, 1])
+
+    blob = loaded.read(COMPARTMENTS.Blob, MEASURES.Sum)
+    assert blob is not None
+    assert blob[1] is None
+    assert blob[0].shape == (2, 3, 3)
+    np.testing.assert_allclose(blob[0][1, 2], [12, 112, 212])
+
+    iqr = loaded.read(COMPARTMENTS.Blob, MEASURES.IQR)
+    assert iqr is not None
+    assert iqr[0].shape == (2, 3, 3, 2)
+    np.testing.assert_allclose(iqr[0][0, 1, 2], [201, 202])
+
+    assert loaded.read(COMPARTMENTS.Blob, MEASURES.Perimeter) is None
+
+
+def test_complete_chunks_are_written_before_flush(tmp_path):
+    directory = str(tmp_path)
+    store = FeatureStore.create(directory, SHAPES, 2)
+    _write(store, (3, 2, 1))
+    column = os.path.join(FeatureStore.get_directory(directory), "Blob_Sum")
+    assert os.listdir(column) == ["chunk_1.npy"]
+
+
+def test_continue_writing_loaded_store(tmp_path):
+    directory = str(tmp_path)
+    store = FeatureStore.create(directory, SHAPES, 2)
+    _write(store, (0,))
+    store.flush()
+
+    loaded = FeatureStore.load(directory, chunk_size=5, compressed=True)
+    assert loaded is not None
+    _write(loaded, (1, 3))
+    loaded.flush()
+
+    blob = loaded.read(COMPARTMENTS.Background, MEASURES.Mean)
+    assert blob is not None
+    np.testing.assert_allclose(loaded.times, [0, 0.5, 1.5])
+    np.testing.assert_allclose(blob[0][0, 0], [0, -100, -300])
+
+
+def test_remove(tmp_path):
+    directory = str(tmp_path)
+    assert not FeatureStore.remove(directory)
+    FeatureStore.create(directory, SHAPES).flush()
+    assert FeatureStore.exists(directory)
+    assert FeatureStore.remove(directory)
+    assert FeatureStore.load(directory) is None
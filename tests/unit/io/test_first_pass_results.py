@@ -0,0 +1,155 @@
+import pytest
+
+from scanomatic.io import first_pass_results
+from scanomatic.io.first_pass_results import CompilationResults
+from scanomatic.io.jsonizer import append_record, dump
+from scanomatic.models.factories.compile_project_factory import (
+    CompileImageAnalysisFactory,
+    CompileImageFactory
+)
+from scanomatic.models.factories.fixture_factories import (
+    FixtureFactory,
+    FixturePlateFactory
+)
+
+
+@pytest.fixture
+def compilation(tmp_path) -> str:
+    path = str(tmp_path / "test.project.compilation")
+    dump(
+        [
+            CompileImageAnalysisFactory.create(
+                image=CompileImageFactory.create(
+                    index=index,
+                    path=f"image_{index}.tiff",
+                    time_stamp=time_stamp,
+                ),
+            )
+            for index, time_stamp in enumerate((20., 0., 10.))
+        ],
+        path,
+    )
+    return path
+
+
+def _get_results(compilation: str, **kwargs) -> CompilationResults:
+    return CompilationResults(
+        compilation,
+        scanner_instructions_path=compilation + ".missing",
+        **kwargs,
+    )
+
+
+def _get_all_paths(results: CompilationResults) -> list[str]:
+    paths: list[str] = []
+    while True:
+        model = results.get_next_image_model()
+        if model is None:
+            return paths
+        paths.append(model.image.path)
+
+
+@pytest.mark.parametrize("oldest_first,expected", (
+    (False, ["image_0.tiff", "image_2.tiff", "image_1.tiff"]),
+    (True, ["image_1.tiff", "image_2.tiff", "image_0.tiff"]),
+))
+def test_get_next_image_model_order(
+    compilation: str,
+    oldest_first: bool,
+    expected: list[str],
+):
+    results = _get_results(compilation, oldest_first=oldest_first)
+    assert [
+        model.image.path for model in results.get_upcoming_image_models(5)
+    ] == expected
+    assert _get_all_paths(results) == expected
+
+
+def test_get_upcoming_image_models_does_not_use_models(compilation: str):
+    results = _get_results(compilation)
+    assert len(results.get_upcoming_image_models(2)) == 2
+    assert results.get_upcoming_image_models(0) == []
+    assert len(_get_all_paths(results)) == 3
+
+
+def test_skip_image_models(compilation: str):
+    results = _get_results(compilation, oldest_first=True)
+    # Images are re-indexed in time order
+    results.skip_image_models({0, 1})
+    assert _get_all_paths(results) == ["image_0.tiff"]
+    assert results.total_number_of_images == 3
+
+
+@pytest.fixture
+def record_compilation(tmp_path) -> str:
+    path = str(tmp_path / "test.project.compilation")
+    for index, time_stamp in enumerate((20., 0., 10.)):
+        append_record(
+            CompileImageAnalysisFactory.create(
+                image=CompileImageFactory.create(
+                    index=index,
+                    path=f"image_{index}.tiff",
+                    time_stamp=time_stamp,
+                ),
+                fixture=FixtureFactory.create(
+                    plates=[FixturePlateFactory.create(index=1)],
+                ),
+            ),
+            path,
+        )
+    return path
+
+
+def test_load_compilation_with_record_per_line(record_compilation: str):
+    results = _get_results(record_compilation, oldest_first=True)
+    assert _get_all_paths(results) == [
+        "image_1.tiff", "image_2.tiff", "image_0.tiff",
+    ]
+
+
+def test_images_are_loaded_when_asked_for(
+    record_compilation: str,
+    monkeypatch,
+):
+    loaded = []
+
+    def load_record(path, offset, length):
+        loaded.append(offset)
+        return original_load_record(path, offset, length)
+
+    original_load_record = first_pass_results.load_record
+    monkeypatch.setattr(first_pass_results, "load_record", load_record)
+    results = _get_results(record_compilation)
+    assert len(results) == 3
+    assert loaded == []
+
+    model = results.get_next_image_model()
+    assert model is not None
+    assert model.image.path == "image_0.tiff"
+    assert model.image.index == 2
+    assert model.fixture.plates[0].index == 0
+    assert len(loaded) == 1
+
+
+def test_changing_image_model_does_not_change_compilation(
+    record_compilation: str,
+):
+    results = _get_results(record_compilation)
+    model = results[0]
+    assert model is not None
+    model.image.path = "changed.tiff"
+    model.fixture.plates[0].index = 5
+    reloaded = results[0]
+    assert reloaded is not None and reloaded is not model
+    assert reloaded.image.path == "image_1.tiff"
+    assert reloaded.fixture.plates[0].index == 0
+
+
+def test_recycle(record_compilation: str):
+    results = _get_results(record_compilation, oldest_first=True)
+    results.get_next_image_model()
+    results.get_next_image_model()
+    results.recycle()
+    assert _get_all_paths(results) == [
+        "image_1.tiff", "image_2.tiff", "image_0.tiff",
+    ]
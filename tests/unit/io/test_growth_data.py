@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from scanomatic.io.growth_data import GrowthDataStore
+from scanomatic.io.image_data import ImageData
+
+
+def _get_plates(image_index: int, shapes) -> list:
+    return [
+        None if shape is None
+        else np.arange(np.prod(shape), dtype=float).reshape(shape)
+        + 100 * image_index
+        for shape in shapes
+    ]
+
+
+def test_write_and_load(tmp_path):
+    directory = str(tmp_path)
+    shapes = [(2, 3), (2, 3)]
+    store = GrowthDataStore.create(directory, shapes, 3)
+    for image_index in range(3):
+        store.write(image_index, image_index * 0.5, _get_plates(
+            image_index,
+            shapes,
+        ))
+    store.flush()
+
+    loaded = GrowthDataStore.load(directory)
+    assert loaded is not None
+    assert loaded.plate_shapes == shapes
+    np.testing.assert_allclose(loaded.times, [0, 0.5, 1])
+    plates = loaded.get_plates()
+    assert plates.shape == (2, 2, 3, 3)
+    np.testing.assert_allclose(plates[1, :, :, 2], _get_plates(2, shapes)[1])
+
+
+def test_load_without_store(tmp_path):
+    assert not GrowthDataStore.exists(str(tmp_path))
+    assert GrowthDataStore.load(str(tmp_path)) is None
+
+
+def test_write_beyond_expected_images(tmp_path):
+    directory = str(tmp_path)
+    shapes = [(2, 2)]
+    store = GrowthDataStore.create(directory, shapes, 1)
+    for image_index in range(3):
+        store.write(image_index, image_index, _get_plates(image_index, shapes))
+    store.flush()
+
+    loaded = GrowthDataStore.load(directory, writable=True)
+    assert loaded is not None
+    np.testing.assert_allclose(loaded.times, [0, 1, 2])
+    loaded.write(3, 3, _get_plates(3, shapes))
+    np.testing.assert_allclose(
+        loaded.get_plates()[0, 0, 0],
+        [0, 100, 200, 300],
+    )
+
+
+def test_only_written_images_are_read(tmp_path):
+    shapes = [(1, 1)]
+    store = GrowthDataStore.create(str(tmp_path), shapes, 4)
+    store.write(3, 3, _get_plates(3, shapes))
+    store.write(1, 1, _get_plates(1, shapes))
+    np.testing.assert_allclose(store.times, [1, 3])
+    np.testing.assert_allclose(store.get_plates()[0, 0, 0], [100, 300])
+
+
+def test_plates_with_different_pinning(tmp_path):
+    shapes = [(2, 3), None, (4, 6)]
+    store = GrowthDataStore.create(str(tmp_path), shapes, 2)
+    for image_index in range(2):
+        store.write(image_index, image_index, _get_plates(image_index, shapes))
+
+    plates = store.get_plates()
+    assert plates.dtype == object
+    assert plates[1] is None
+    assert plates[0].shape == (2, 3, 2)
+    assert plates[2].shape == (4, 6, 2)
+    np.testing.assert_allclose(plates[0][..., 1], _get_plates(1, shapes)[0])
+
+
+@pytest.mark.parametrize("shapes", ([(2, 3), (2, 3)], [(2, 3), None]))
+def test_read_image_data_and_time_matches_image_files(tmp_path, shapes):
+    store_directory = tmp_path / "store"
+    files_directory = tmp_path / "files"
+    store_directory.mkdir()
+    files_directory.mkdir()
+    store = GrowthDataStore.create(str(store_directory), shapes, 2)
+    for image_index in range(2):
+        plates = _get_plates(image_index, shapes)
+        store.write(image_index, image_index, plates)
+        np.save(
+            str(files_directory / f"image_{image_index}_data.npy"),
+            plates,
+        )
+    np.save(str(files_directory / "time_data.npy"), np.arange(2.))
+    store.flush()
+
+    times, data = ImageData.read_image_data_and_time(str(store_directory))
+    expected_times, expected_data = ImageData.read_image_data_and_time(
+        str(files_directory),
+    )
+    np.testing.assert_allclose(times, expected_times)
+    assert data is not None
+    assert expected_data is not None
+    assert len(data) == len(expected_data)
+    for plate, expected_plate in zip(data, expected_data):
+        if expected_plate is None:
+            assert plate is None
+        else:
+            np.testing.assert_allclose(plate, expected_plate)
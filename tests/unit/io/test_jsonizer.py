@@ -477,6 +477,122 @@ def test_dump_to_stream_appending_first_normal(fixture: FixtureModel):
     assert all(isinstance(m, FixtureModel) for m in models)
 
 
+def _get_fixture_names(models) -> list[str]:
+    assert all(isinstance(m, FixtureModel) for m in models)
+    return [m.name for m in models]
+
+
+def _named(fixture: FixtureModel, name: str) -> FixtureModel:
+    model = jsonizer.copy(fixture)
+    model.name = name
+    return model
+
+
+def test_append_record(tmp_path, fixture: FixtureModel):
+    path = tmp_path / 'my.file'
+    assert jsonizer.append_record(_named(fixture, "a"), path)
+    assert jsonizer.append_record(_named(fixture, "b"), str(path))
+    assert len(path.read_text().splitlines()) == 2
+    assert _get_fixture_names(jsonizer.load_records(path)) == ["a", "b"]
+
+
+def test_append_record_converts_legacy_layout(
+    tmp_path,
+    fixture: FixtureModel,
+):
+    path = tmp_path / 'my.file'
+    jsonizer.dump([_named(fixture, "a"), _named(fixture, "b")], path)
+    assert _get_fixture_names(jsonizer.load_records(path)) == ["a", "b"]
+    assert jsonizer.append_record(_named(fixture, "c"), path)
+    assert len(path.read_text().splitlines()) == 3
+    assert _get_fixture_names(jsonizer.load_records(path)) == [
+        "a", "b", "c",
+    ]
+
+
+def test_append_record_converts_legacy_layout_with_trailing_newline(
+    tmp_path,
+    fixture: FixtureModel,
+):
+    path = tmp_path / 'my.file'
+    path.write_text(
+        jsonizer.dumps([_named(fixture, "a"), _named(fixture, "b")]) + "\n",
+    )
+    assert jsonizer.append_record(_named(fixture, "c"), path)
+    assert len(path.read_text().splitlines()) == 3
+    assert _get_fixture_names(jsonizer.load_records(path)) == [
+        "a", "b", "c",
+    ]
+
+
+def test_append_record_removes_torn_record(tmp_path, fixture: FixtureModel):
+    path = tmp_path / 'my.file'
+    jsonizer.append_record(_named(fixture, "a"), path)
+    with open(path, 'a') as fh:
+        fh.write(jsonizer.dumps(_named(fixture, "b"))[:20])
+    assert _get_fixture_names(jsonizer.load_records(path)) == ["a"]
+    assert jsonizer.append_record(_named(fixture, "c"), path)
+    assert _get_fixture_names(jsonizer.load_records(path)) == ["a", "c"]
+
+
+def test_append_record_keeps_corrupt_legacy_file(
+    tmp_path,
+    fixture: FixtureModel,
+):
+    path = tmp_path / 'my.file'
+    path.write_text(jsonizer.dumps([fixture])[:-5])
+    assert not jsonizer.append_record(fixture, path)
+    assert path.read_text() == jsonizer.dumps([fixture])[:-5]
+
+
+def test_load_records_missing_file(tmp_path):
+    assert jsonizer.load_records(tmp_path / 'my.file') is None
+
+
+def _get_name(record) -> str:
+    return record[jsonizer.CONTENT]["name"]
+
+
+def test_index_records(tmp_path, fixture: FixtureModel):
+    path = tmp_path / 'my.file'
+    for name in ("a", "b"):
+        jsonizer.append_record(_named(fixture, name), path)
+    with open(path, 'a') as fh:
+        fh.write(jsonizer.dumps(_named(fixture, "c"))[:20])
+
+    index = jsonizer.index_records(path, _get_name)
+    assert index is not None
+    assert [name for _, _, name in index] == ["a", "b"]
+    assert _get_fixture_names([
+        jsonizer.load_record(path, offset, length)
+        for offset, length, _ in reversed(index)
+    ]) == ["b", "a"]
+
+
+def test_index_records_legacy_layout(tmp_path, fixture: FixtureModel):
+    path = tmp_path / 'my.file'
+    jsonizer.dump([_named(fixture, "a"), _named(fixture, "b")], path)
+    assert jsonizer.index_records(path, _get_name) is None
+
+
+def test_replace_records(tmp_path, fixture: FixtureModel):
+    path = tmp_path / 'my.file'
+    for name in ("a", "b", "c"):
+        jsonizer.append_record(_named(fixture, name), path)
+    index = jsonizer.index_records(path, _get_name)
+    assert index is not None
+
+    assert jsonizer.replace_records(path, {
+        (offset, length): _named(fixture, name.upper())
+        for offset, length, name in index if name != "b"
+    })
+    assert _get_fixture_names(jsonizer.load_records(path)) == ["A", "b", "C"]
+
+
+def test_index_records_missing_file(tmp_path):
+    assert jsonizer.index_records(tmp_path / 'my.file', _get_name) is None
+
+
 def test_purge_non_existing(tmp_path, fixture: FixtureModel):
     assert jsonizer.purge(fixture, tmp_path / 'no-file') is False
 
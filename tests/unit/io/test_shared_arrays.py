@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from scanomatic.io.shared_arrays import SharedArrays, read_shared_array
+
+
+def test_arrays_are_packed_after_each_other():
+    first = np.arange(6, dtype=np.int16).reshape(2, 3)
+    second = np.linspace(0, 1, 4)
+    shared = SharedArrays(first.nbytes + second.nbytes)
+    try:
+        first_copy, shared_first = shared.add(first)
+        _, shared_second = shared.add(second)
+        np.testing.assert_equal(first_copy, first)
+        del first_copy
+        assert shared_first == (shared.name, 0, (2, 3), first.dtype.str)
+        assert shared_second[1] == first.nbytes
+        np.testing.assert_equal(read_shared_array(shared_first), first)
+        np.testing.assert_equal(read_shared_array(shared_second), second)
+        np.testing.assert_equal(
+            read_shared_array(shared_first, slice(1, 2)),
+            first[1:2],
+        )
+    finally:
+        shared.release()
+
+
+def test_adding_beyond_size_raises():
+    shared = SharedArrays(8)
+    try:
+        shared.add(np.zeros(1))
+        with pytest.raises(ValueError):
+            shared.add(np.zeros(1))
+        shared.clear()
+        shared.add(np.ones(1))
+    finally:
+        shared.release()
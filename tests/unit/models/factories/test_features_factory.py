@@ -13,3 +13,10 @@ class TestFeaturesFactory:
     def test_try_keep_qc_setting_in_dict_form(self):
         m = FeaturesFactory.create(try_keep_qc=True)
         assert FeaturesFactory.to_dict(m).get('try_keep_qc')
+
+    def test_extraction_workers_setting_in_dict_form(self):
+        m = FeaturesFactory.create(extraction_workers=4)
+        assert FeaturesFactory.to_dict(m).get('extraction_workers') == 4
+        assert FeaturesFactory.create(
+            **FeaturesFactory.to_dict(m),
+        ).extraction_workers == 4
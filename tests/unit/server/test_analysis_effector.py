@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+from scanomatic.server.analysis_effector import acquire_lock, release_lock
+
+
+def test_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / "analysis.lock")
+    assert acquire_lock(path)
+    with open(path) as fh:
+        assert fh.read() == str(os.getpid())
+    assert not acquire_lock(path)
+
+    release_lock(path)
+    assert not os.path.exists(path)
+    assert acquire_lock(path)
+
+
+def test_lock_of_ended_process_is_taken_over(tmp_path):
+    path = str(tmp_path / "analysis.lock")
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    with open(path, 'w') as fh:
+        fh.write(str(process.pid))
+
+    assert acquire_lock(path)
+    with open(path) as fh:
+        assert fh.read() == str(os.getpid())
+
+
+def test_release_lock_without_lock(tmp_path):
+    release_lock(str(tmp_path / "analysis.lock"))
@@ -0,0 +1,182 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from scanomatic.image_analysis import first_pass
+from scanomatic.io.jsonizer import load_records
+from scanomatic.models.compile_project_model import COMPILE_ACTION
+from scanomatic.models.factories.compile_project_factory import (
+    CompileImageAnalysisFactory,
+    CompileProjectFactory
+)
+from scanomatic.models.factories.fixture_factories import FixtureFactory
+from scanomatic.models.factories.rpc_job_factory import RPC_Job_Model_Factory
+from scanomatic.server import compile_effector
+from scanomatic.server.compile_effector import CompileProjectEffector
+
+FAILING_IMAGE = 3
+
+
+def _analyse(compile_image_model, fixture_settings, issues):
+    # Later images finish first to check the compilation is kept in order
+    time.sleep(0.01 * (6 - compile_image_model.index))
+    if compile_image_model.index == FAILING_IMAGE:
+        raise first_pass.MarkerDetectionFailed()
+    return CompileImageAnalysisFactory.create(
+        image=compile_image_model,
+        fixture=FixtureFactory.create(
+            orientation_marks_x=[10., 20.],
+            orientation_marks_y=[30., 40.],
+        ),
+    )
+
+
+def _analyse_fixed(compile_image_model, fixture_settings, issues):
+    return CompileImageAnalysisFactory.create(
+        image=compile_image_model,
+        fixture=FixtureFactory.create(
+            name="fixed",
+            orientation_marks_x=[12., 20.],
+            orientation_marks_y=[30., 39.],
+        ),
+    )
+
+
+def _get_effector(
+    compile_action: COMPILE_ACTION,
+    path: str,
+    **kwargs,
+) -> CompileProjectEffector:
+    effector = CompileProjectEffector(RPC_Job_Model_Factory.create(
+        content_model=CompileProjectFactory.create(
+            compile_action=compile_action,
+            images=[
+                {'path': f"test_{index:04d}_{index}.0.tiff", 'index': index}
+                for index in range(6)
+            ],
+            path=path,
+            **kwargs,
+        ),
+    ))
+    effector._fixture_settings = SimpleNamespace(  # type: ignore
+        model=SimpleNamespace(path="fixture"),
+    )
+    effector._running = True
+    return effector
+
+
+def _run(effector: CompileProjectEffector) -> None:
+    with pytest.raises(StopIteration):
+        while True:
+            next(effector)
+
+
+@pytest.mark.parametrize("compile_workers", (1, 3))
+def test_compilation_is_written_in_image_order(
+    tmp_path,
+    monkeypatch,
+    compile_workers: int,
+):
+    monkeypatch.setattr(first_pass, "analyse", _analyse)
+    monkeypatch.setattr(compile_effector, "validate", lambda model: True)
+    path = str(tmp_path / "test.project.compilation")
+    effector = _get_effector(
+        COMPILE_ACTION.Initiate,
+        path,
+        compile_workers=compile_workers,
+    )
+
+    for _ in range(6):
+        assert next(effector)
+    assert effector.progress == 1
+
+    records = load_records(path)
+    assert records is not None
+    assert [record.image.index for record in records] == [0, 1, 2, 4, 5]
+    effector._shutdown_workers()
+
+
+def _analyse_crashing(compile_image_model, fixture_settings, issues):
+    if compile_image_model.index == FAILING_IMAGE:
+        raise RuntimeError("Worker crashed")
+    return _analyse_fixed(compile_image_model, fixture_settings, issues)
+
+
+def test_worker_failure_stops_compilation(tmp_path, monkeypatch):
+    monkeypatch.setattr(first_pass, "analyse", _analyse_crashing)
+    monkeypatch.setattr(compile_effector, "validate", lambda model: True)
+    path = str(tmp_path / "test.project.compilation")
+    effector = _get_effector(
+        COMPILE_ACTION.Initiate,
+        path,
+        compile_workers=3,
+    )
+
+    _run(effector)
+
+    records = load_records(path)
+    assert records is not None
+    assert [record.image.index for record in records] == [0, 1, 2]
+
+
+def _compile_in_workers(path: str) -> list[int]:
+    effector = _get_effector(COMPILE_ACTION.Initiate, path, compile_workers=3)
+    _run(effector)
+    records = load_records(path)
+    assert records is not None
+    return [record.image.index for record in records]
+
+
+def test_compilation_workers_in_job_process(
+    tmp_path,
+    monkeypatch,
+    run_in_job_process,
+):
+    monkeypatch.setattr(first_pass, "analyse", _analyse)
+    monkeypatch.setattr(compile_effector, "validate", lambda model: True)
+    monkeypatch.setattr(CompileProjectEffector, "_mail", lambda *args: None)
+    path = str(tmp_path / "test.project.compilation")
+
+    assert run_in_job_process(_compile_in_workers, path) == [0, 1, 2, 4, 5]
+
+
+def test_fix_up_redoes_selected_images(tmp_path, monkeypatch):
+    monkeypatch.setattr(first_pass, "analyse", _analyse)
+    monkeypatch.setattr(compile_effector, "validate", lambda model: True)
+    monkeypatch.setattr(CompileProjectEffector, "_mail", lambda *args: None)
+    path = str(tmp_path / "test.project.compilation")
+    _run(_get_effector(COMPILE_ACTION.Initiate, path))
+
+    monkeypatch.setattr(first_pass, "analyse", _analyse_fixed)
+    effector = _get_effector(
+        COMPILE_ACTION.FixUp,
+        path,
+        fix_up_images="1-1,3",
+    )
+    effector._set_fix_up_images()
+    assert [
+        image.index for image in effector._compile_job.images
+    ] == [1, 3]
+    _run(effector)
+
+    records = load_records(path)
+    assert records is not None
+    assert [
+        (record.image.index, record.fixture.name) for record in records
+    ] == [
+        (0, ""), (1, "fixed"), (2, ""), (4, ""), (5, ""), (3, "fixed"),
+    ]
+
+
+def test_get_marker_changes():
+    assert compile_effector.get_marker_changes(
+        FixtureFactory.create(
+            orientation_marks_x=[10., 20.],
+            orientation_marks_y=[30., 40.],
+        ),
+        FixtureFactory.create(
+            orientation_marks_x=[12., 20.],
+            orientation_marks_y=[30., 39.5],
+        ),
+    ) == "(2.0, 0.0), (0.0, -0.5)"
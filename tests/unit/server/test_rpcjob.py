@@ -0,0 +1,44 @@
+import time
+from multiprocessing import Pipe, Process
+from types import SimpleNamespace
+
+import psutil
+
+from scanomatic.server.jobs import start_job_process
+from scanomatic.server.rpcjob import RpcJob
+
+
+def _is_running(process: psutil.Process) -> bool:
+    try:
+        return process.status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+class _JobWithWorker(RpcJob):
+    def run(self):
+        worker = Process(target=time.sleep, args=(60,))
+        worker.start()
+        time.sleep(60)
+
+
+def test_terminate_with_workers():
+    parent_pipe, child_pipe = Pipe()
+    job = _JobWithWorker(
+        SimpleNamespace(id="job", pid=None),
+        None,
+        parent_pipe,
+        child_pipe,
+    )
+    start_job_process(job)
+    job_process = psutil.Process(job.pid)
+    deadline = time.time() + 10
+    while not job_process.children() and time.time() < deadline:
+        time.sleep(0.05)
+    workers = job_process.children()
+    assert workers
+
+    job.terminate_with_workers()
+
+    assert not job.is_alive()
+    assert not any(_is_running(worker) for worker in workers)
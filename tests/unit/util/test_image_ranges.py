@@ -0,0 +1,18 @@
+import pytest
+
+from scanomatic.util.image_ranges import get_image_indices
+
+
+@pytest.mark.parametrize("ranges,expected", (
+    ("0-3,7", {0, 1, 2, 3, 7}),
+    (" 2 - 4 , 9", {2, 3, 4, 9}),
+    ("5-", {5, 6, 7}),
+    ("-2", {0, 1, 2}),
+    ("-", set(range(8))),
+    ("", None),
+    ("1-a", None),
+    ("1-2-3", None),
+    ("1,,2", None),
+))
+def test_get_image_indices(ranges, expected):
+    assert get_image_indices(ranges, 8) == expected